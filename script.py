@@ -1,112 +1,210 @@
+import time
+_INICIO_IMPORTACAO = time.perf_counter()
 import pandas as pd
 import os
 from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side, NamedStyle
 from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.utils import get_column_letter
-import time
+from openpyxl.formatting.rule import FormulaRule
+import sys
+import logging
+import json
+import argparse
+import functools
+import hashlib
+import pickle
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import tracemalloc
+import bisect
+from collections import Counter
 from datetime import datetime
-import difflib
 import re
+import unicodedata
 import numpy as np
-from docx import Document
-from docx.oxml.ns import qn
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.shared import Pt, RGBColor, Inches
-import matplotlib.pyplot as plt
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+try:
+    import yaml
+except ImportError:  # arquivo de configuração só em JSON
+    yaml = None
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from openpyxl.chart import BarChart, PieChart, LineChart, Reference
-from openpyxl.chart.label import DataLabelList
+# matplotlib, sklearn, docx e os gráficos do openpyxl são importados nas
+# funções que os usam: execuções sem gráficos, sem relatório ou sem
+# agrupamento semântico não pagam o custo de carregá-los.
+
+# Os gráficos só são gravados em arquivo; o backend Agg dispensa Tk/Qt.
+os.environ.setdefault("MPLBACKEND", "Agg")
+# Gráficos PNG do relatório e gráficos nativos das planilhas.
+GERAR_GRAFICOS = os.environ.get("ANALISE_KW_GRAFICOS", "1") not in ("0", "false", "nao", "não")
 
 # =============================================================================
 # Funções Auxiliares
 # =============================================================================
 
-def print_status(message):
-    print(f"[STATUS] {message}")
-    time.sleep(1)
+LOGGER = logging.getLogger("analise_kw")
+if not LOGGER.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("[STATUS] %(message)s"))
+    LOGGER.addHandler(_handler)
+    LOGGER.setLevel(logging.INFO)
+    LOGGER.propagate = False
 
-def get_column_index(ws, column_name):
-    for cell in ws[1]:
-        if cell.value == column_name:
-            return cell.column
-    return None
-
-def adjust_column_width(ws):
-    for col in ws.columns:
-        max_length = 0
-        column = get_column_letter(col[0].column)
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = max_length + 2
-        ws.column_dimensions[column].width = adjusted_width
-
-def apply_header_style(ws):
-    header_fill = PatternFill(start_color="000066", end_color="000066", fill_type="solid")
-    header_font = Font(color="FFFFFF", size=12, bold=True)
-    for cell in ws[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal="center")
-
-def apply_content_style(ws):
-    content_font = Font(size=10)
-    for row in ws.iter_rows(min_row=2):
-        for cell in row:
-            cell.font = content_font
-
-def apply_heatmap(ws, column_idx, values):
-    values = pd.Series(values).dropna().sort_values()
-    if values.empty:
-        return
+def print_status(message):
+    LOGGER.info(message)
 
-    total = len(values)
-    red_threshold = int(total * 0.25)
-    orange_threshold = int(total * 0.55)
-    yellow_threshold = int(total * 0.85)
-
-    red_max = values.iloc[red_threshold - 1] if red_threshold > 0 else values.min()
-    orange_max = values.iloc[orange_threshold - 1] if orange_threshold > 0 else values.min()
-    yellow_max = values.iloc[yellow_threshold - 1] if yellow_threshold > 0 else values.min()
-
-    red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-    orange_fill = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    green_fill = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-
-    white_font = Font(color="FFFFFF", size=10)
-    black_font = Font(color="000000", size=10)
-
-    for row in ws.iter_rows(min_row=2, min_col=column_idx, max_col=column_idx):
-        for cell in row:
-            if cell.value is not None and not pd.isna(cell.value):
-                val = float(cell.value)
-                if val <= red_max:
-                    cell.fill = red_fill
-                    cell.font = white_font
-                elif val <= orange_max:
-                    cell.fill = orange_fill
-                    cell.font = white_font
-                elif val <= yellow_max:
-                    cell.fill = yellow_fill
-                    cell.font = black_font
-                else:
-                    cell.fill = green_fill
-                    cell.font = black_font
+def _formatar_duracao(segundos):
+    if segundos < 60:
+        return f"{segundos:.1f}s"
+    return f"{int(segundos // 60)}m{int(segundos % 60):02d}s"
 
-def fuzzy_match(str1, str2, threshold=0.8):
-    return difflib.SequenceMatcher(None, str1.lower(), str2.lower()).ratio() >= threshold
+# =============================================================================
+# Instrumentação de Desempenho
+# =============================================================================
 
-def carregar_cidades_brasil():
+# tracemalloc deixa a execução cerca de 4x mais lenta; ligue apenas para investigar
+# o pico de memória por fase (tempos, pico de RSS e tamanho da saída são sempre medidos)
+MEDIR_MEMORIA = False
+DESEMPENHO = []
+_picos_abertos = []
+_medicoes_abertas = []
+
+def registrar_saida(caminho):
+    """Atribui o arquivo às medições abertas neste processo e devolve o caminho.
+
+    Quem grava uma saída registra o próprio caminho; listar a pasta misturaria
+    os arquivos de fases que rodam em paralelo.
+    """
+    for medicao in _medicoes_abertas:
+        medicao.arquivos.add(caminho)
+    return caminho
+
+def _pico_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+class MedicaoDesempenho:
+    """Mede tempo de parede, tempo de CPU, pico de memória e arquivos gerados.
+
+    Medições podem ser aninhadas (uma fase chamando um criar_planilha_*): o pico
+    do tracemalloc é zerado ao abrir cada medição e repassado à medição externa
+    ao fechar, então cada uma registra o próprio pico. Os arquivos são os
+    informados a `registrar_saida` enquanto a medição está aberta. O resultado
+    vai para DESEMPENHO, usado na seção "Desempenho" do XML e no desempenho.json.
+    """
+
+    def __init__(self, etapa, tipo="fase"):
+        self.etapa = etapa
+        self.tipo = tipo
+        self.arquivos = set()
+        self.memoria_inicial = 0
+        if tracemalloc.is_tracing():
+            atual, pico = tracemalloc.get_traced_memory()
+            if _picos_abertos:
+                _picos_abertos[-1] = max(_picos_abertos[-1], pico)
+            tracemalloc.reset_peak()
+            self.memoria_inicial = atual
+        _picos_abertos.append(0)
+        _medicoes_abertas.append(self)
+        self.inicio_parede = time.perf_counter()
+        self.inicio_cpu = time.process_time()
+
+    def finalizar(self, linhas=None):
+        tempo_parede = time.perf_counter() - self.inicio_parede
+        tempo_cpu = time.process_time() - self.inicio_cpu
+        pico = _picos_abertos.pop()
+        if self in _medicoes_abertas:
+            _medicoes_abertas.remove(self)
+        if tracemalloc.is_tracing():
+            pico = max(pico, tracemalloc.get_traced_memory()[1])
+            if _picos_abertos:
+                _picos_abertos[-1] = max(_picos_abertos[-1], pico)
+        arquivos_gerados = {
+            os.path.basename(caminho): os.path.getsize(caminho) for caminho in self.arquivos if os.path.isfile(caminho)
+        }
+        registro = {
+            "Etapa": self.etapa,
+            "Tipo": self.tipo,
+            "TempoParede_s": round(tempo_parede, 3),
+            "TempoCPU_s": round(tempo_cpu, 3),
+            "PicoMemoria_MB": round(pico / (1024 * 1024), 2) if tracemalloc.is_tracing() else None,
+            "AlocadoNaEtapa_MB": round(max(pico - self.memoria_inicial, 0) / (1024 * 1024), 2) if tracemalloc.is_tracing() else None,
+            "PicoRSS_MB": _pico_rss_mb(),
+            "Linhas": linhas,
+            "TamanhoSaida_KB": round(sum(arquivos_gerados.values()) / 1024, 1),
+            "Arquivos": sorted(arquivos_gerados),
+        }
+        DESEMPENHO.append(registro)
+        return registro
+
+def medir_desempenho(funcao):
+    """Registra uma medição por chamada de um criar_planilha_*.
+
+    As linhas são as do primeiro DataFrame recebido.
+    """
+    @functools.wraps(funcao)
+    def wrapper(*args, **kwargs):
+        dataframes = [a for a in list(args) + list(kwargs.values()) if isinstance(a, pd.DataFrame)]
+        medicao = MedicaoDesempenho(funcao.__name__, tipo="planilha")
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            medicao.finalizar(len(dataframes[0]) if dataframes else None)
+    return wrapper
+
+def salvar_desempenho_json(caminho, projeto, data):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump({"Projeto": projeto, "Data": data, "ImportacaoModulo_s": TEMPO_IMPORTACAO, "Etapas": DESEMPENHO}, arquivo, ensure_ascii=False, indent=2)
+
+class ProgressoFase:
+    """Relata o andamento de uma fase sem bloquear a execução.
+
+    Cada `avancar` mostra a etapa atual, as linhas processadas, o tempo decorrido
+    e, quando o total de etapas é conhecido, a estimativa de tempo restante (ETA).
+    `concluir` fecha a fase com o tempo total e a vazão em linhas/s.
+    """
+
+    def __init__(self, descricao, total_etapas=None):
+        self.descricao = descricao
+        self.total_etapas = total_etapas
+        self.etapas = 0
+        self.linhas = 0
+        self.medicao = MedicaoDesempenho(descricao.split(":")[0], tipo="fase")
+        self.inicio = time.perf_counter()
+        print_status(f"Iniciando {descricao}...")
+
+    def avancar(self, mensagem, linhas=0):
+        self.etapas += 1
+        self.linhas += linhas
+        decorrido = time.perf_counter() - self.inicio
+        partes = [mensagem, f"{linhas} linhas", f"{_formatar_duracao(decorrido)} decorridos"]
+        if self.total_etapas:
+            partes[0] = f"[{self.etapas}/{self.total_etapas}] {mensagem}"
+            restante = decorrido / self.etapas * max(self.total_etapas - self.etapas, 0)
+            partes.append(f"ETA {_formatar_duracao(restante)}")
+        print_status(" | ".join(partes))
+
+    def concluir(self, mensagem, linhas=None):
+        if linhas is not None:
+            self.linhas = linhas
+        decorrido = time.perf_counter() - self.inicio
+        taxa = self.linhas / decorrido if decorrido > 0 else 0
+        self.medicao.finalizar(self.linhas)
+        print_status(f"{mensagem} ({_formatar_duracao(decorrido)} | {self.linhas} linhas | {taxa:,.0f} linhas/s)")
+        return decorrido
+
+def carregar_cidades_brasil(caminho='cidades_brasil.xlsx'):
     try:
-        cidades_df = pd.read_excel('cidades_brasil.xlsx')
+        cidades_df = ler_excel_com_cache(caminho)
         return cidades_df['CIDADE'].str.lower().str.strip().tolist()
     except FileNotFoundError:
         print_status("Erro: Arquivo 'cidades_brasil.xlsx' não encontrado na pasta do script!")
@@ -118,6 +216,59 @@ def carregar_cidades_brasil():
         print_status(f"Erro ao carregar cidades: {str(e)}")
         raise
 
+def normalizar_texto(texto):
+    """Converte para minúsculas e remove acentos ("São Paulo" -> "sao paulo")."""
+    texto = unicodedata.normalize("NFKD", str(texto).strip().lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+def construir_indice_cidades(cidades):
+    """Monta o índice usado no filtro geográfico.
+
+    Cidades de uma palavra vão para um dicionário (busca por hash) e cidades com
+    várias palavras ("rio de janeiro") vão para uma trie de tokens, onde a chave
+    "" de um nó guarda o nome da cidade que termina ali. As chaves são sem acento;
+    os valores mantêm o nome como veio da planilha.
+    """
+    simples = {}
+    compostas = {}
+    for cidade in cidades:
+        tokens = normalizar_texto(cidade).split()
+        if not tokens:
+            continue
+        if len(tokens) == 1:
+            simples[tokens[0]] = cidade
+            continue
+        no = compostas
+        for token in tokens:
+            no = no.setdefault(token, {})
+        no[""] = cidade
+    return {"simples": simples, "compostas": compostas}
+
+def encontrar_cidade(tokens, indice_cidades):
+    """Retorna a primeira cidade presente na lista de tokens (ou None).
+
+    Percorre os tokens uma vez; em cada posição tenta o nome composto mais longo
+    na trie antes de consultar o conjunto de cidades simples.
+    """
+    simples = indice_cidades["simples"]
+    compostas = indice_cidades["compostas"]
+    for i, token in enumerate(tokens):
+        no = compostas.get(token)
+        encontrada = None
+        j = i + 1
+        while no is not None:
+            if "" in no:
+                encontrada = no[""]
+            if j >= len(tokens):
+                break
+            no = no.get(tokens[j])
+            j += 1
+        if encontrada:
+            return encontrada
+        if token in simples:
+            return simples[token]
+    return None
+
 def mapear_objetivo(intent):
     intent = str(intent).lower()
     if "informational" in intent:
@@ -132,7 +283,11 @@ def mapear_objetivo(intent):
         return "Outro"
 
 # Funções para o Relatório
+GERAR_RELATORIO = os.environ.get("ANALISE_KW_RELATORIO", "1") not in ("0", "false", "nao", "não")
+
 def add_title(doc, text):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt, RGBColor
     title = doc.add_heading(text, level=1)
     title.style.font.name = 'Arial'
     title.style.font.size = Pt(16)
@@ -140,104 +295,776 @@ def add_title(doc, text):
     title.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
 def add_subtitle(doc, text):
+    from docx.shared import Pt, RGBColor
     subtitle = doc.add_heading(text, level=2)
     subtitle.style.font.name = 'Arial'
     subtitle.style.font.size = Pt(14)
     subtitle.style.font.color.rgb = RGBColor(0, 102, 204)
 
 def add_paragraph(doc, text):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
     p = doc.add_paragraph(text)
     p.style.font.name = 'Arial'
     p.style.font.size = Pt(12)
     p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
 
-def add_image(doc, image_path, width=Inches(5)):
-    doc.add_picture(image_path, width=width)
+def add_image(doc, image_path, width=None):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Inches
+    if not os.path.exists(image_path):  # gráficos desativados
+        return
+    doc.add_picture(image_path, width=width or Inches(5))
     last_paragraph = doc.paragraphs[-1]
     last_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
 # =============================================================================
-# Mapeamento da Jornada e Tipologia
+# Motor de Escrita das Planilhas
+# =============================================================================
+
+HEADER_FILL = PatternFill(start_color="000066", end_color="000066", fill_type="solid")
+HEADER_FONT = Font(color="FFFFFF", size=12, bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal="center")
+CONTENT_FONT = Font(size=10)
+
+# Faixas do heatmap, da menor para a maior: até 25%, 55%, 85% e acima
+HEATMAP_ESTILOS = [
+    (PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid"), Font(color="FFFFFF", size=10)),
+    (PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid"), Font(color="FFFFFF", size=10)),
+    (PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid"), Font(color="000000", size=10)),
+    (PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid"), Font(color="000000", size=10)),
+]
+
+# "condicional" grava 4 regras de formatação condicional por aba (custo fixo e o
+# Excel recolore se os volumes forem editados); "celulas" pinta célula a célula
+HEATMAP_MODO = "condicional"
+HEATMAP_QUANTIS = [0.25, 0.55, 0.85]
+
+def calcular_limites_heatmap(values):
+    values = pd.to_numeric(pd.Series(values), errors="coerce").dropna()
+    if values.empty:
+        return None
+    # Mesmo posto de sempre: o valor na posição int(n * q) - 1 da lista ordenada
+    ordenados = np.sort(values.to_numpy(dtype=float))
+    return [float(ordenados[max(int(len(ordenados) * q) - 1, 0)]) for q in HEATMAP_QUANTIS]
+
+def aplicar_heatmap_condicional(ws, col_idx, total_linhas, limites):
+    """Registra o heatmap da coluna `col_idx` como formatação condicional nativa."""
+    letra = get_column_letter(col_idx)
+    intervalo = f"{letra}2:{letra}{total_linhas + 1}"
+    celula = f"{letra}2"
+    red_max, orange_max, yellow_max = limites
+    condicoes = [
+        f"{celula}<={red_max}",
+        f"{celula}<={orange_max}",
+        f"{celula}<={yellow_max}",
+        f"{celula}>{yellow_max}",
+    ]
+    # Células vazias ou com texto ficam sem cor, como no modo "celulas"
+    for condicao, (fill, font) in zip(condicoes, HEATMAP_ESTILOS):
+        regra = FormulaRule(formula=[f"AND(ISNUMBER({celula}),{condicao})"], stopIfTrue=True,
+                            fill=fill, font=Font(color=font.color))
+        ws.conditional_formatting.add(intervalo, regra)
+
+# Limites para a estimativa de largura das colunas
+LARGURA_MAXIMA_COLUNA = 80
+AMOSTRA_LARGURA_COLUNAS = 50000
+
+def calcular_larguras_colunas(df):
+    """Estima a largura de cada coluna a partir do próprio DataFrame.
+
+    Usa o maior comprimento em texto de cada coluna (vetorizado), calculado sobre
+    uma amostra fixa quando a aba passa de AMOSTRA_LARGURA_COLUNAS linhas e
+    limitado a LARGURA_MAXIMA_COLUNA.
+    """
+    if len(df) > AMOSTRA_LARGURA_COLUNAS:
+        df = df.sample(n=AMOSTRA_LARGURA_COLUNAS, random_state=0)
+    larguras = []
+    for col_idx, col in enumerate(df.columns):
+        comprimentos = df.iloc[:, col_idx].astype(str).str.len()
+        max_length = len(str(col))
+        if not comprimentos.empty and pd.notna(comprimentos.max()):
+            max_length = max(max_length, int(comprimentos.max()))
+        larguras.append(min(max_length + 2, LARGURA_MAXIMA_COLUNA))
+    return larguras
+
+# Estilos nomeados das abas: registrados uma vez por Workbook e aplicados por
+# nome, sem recalcular os índices de fonte e preenchimento a cada célula
+ESTILO_CABECALHO = "Cabeçalho"
+ESTILO_CONTEUDO = "Conteúdo"
+ESTILOS_HEATMAP = [f"Heatmap {i}" for i in range(1, len(HEATMAP_ESTILOS) + 1)]
+
+def _registrar_estilos(wb):
+    if ESTILO_CABECALHO in wb.named_styles:
+        return
+    wb.add_named_style(NamedStyle(name=ESTILO_CABECALHO, fill=HEADER_FILL, font=HEADER_FONT, alignment=HEADER_ALIGNMENT))
+    wb.add_named_style(NamedStyle(name=ESTILO_CONTEUDO, font=CONTENT_FONT))
+    for nome, (fill, font) in zip(ESTILOS_HEATMAP, HEATMAP_ESTILOS):
+        wb.add_named_style(NamedStyle(name=nome, fill=fill, font=font))
+
+def _nova_celula(ws, valor, estilo):
+    cell = WriteOnlyCell(ws, value=valor)
+    cell.style = estilo
+    return cell
+
+def aplicar_larguras_colunas(ws, df):
+    for col_idx, largura in enumerate(calcular_larguras_colunas(df), start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = largura
+
+def escrever_aba(wb, titulo, df, volume_col=None):
+    """Cria a aba `titulo` e grava `df` linha a linha, já formatado.
+
+    Cabeçalho, fonte do conteúdo, heatmap da coluna de volume e largura das
+    colunas são definidos enquanto as linhas são enviadas, então a aba funciona
+    em um Workbook(write_only=True) sem nenhuma passada extra sobre as células.
+    """
+    ws = wb.create_sheet(titulo)
+    aplicar_larguras_colunas(ws, df)
+    _registrar_estilos(wb)
+    ws.append([_nova_celula(ws, col, ESTILO_CABECALHO) for col in df.columns])
+
+    volume_idx = list(df.columns).index(volume_col) if volume_col is not None and volume_col in df.columns else None
+    limites = calcular_limites_heatmap(df[volume_col]) if volume_idx is not None else None
+    if limites and HEATMAP_MODO == "condicional":
+        aplicar_heatmap_condicional(ws, volume_idx + 1, len(df), limites)
+        limites = None
+
+    for valores in dataframe_to_rows(df, index=False, header=False):
+        linha = [_nova_celula(ws, valor, ESTILO_CONTEUDO) for valor in valores]
+        if limites:
+            valor = valores[volume_idx]
+            if valor is not None and not pd.isna(valor):
+                faixa = bisect.bisect_left(limites, float(valor))
+                linha[volume_idx].style = ESTILOS_HEATMAP[faixa]
+        ws.append(linha)
+    return ws
+
+# =============================================================================
+# Normalização das Palavras-Chave
 # =============================================================================
 
-def get_etapa_da_jornada(intent):
-    intent = str(intent).strip().lower()
-    if intent == "informational":
-        return "Conscientização"
-    elif intent in ["transactional", "transacional"]:
-        return "Decisão"
-    elif intent == "commercial":
-        return "Consideração"
-    elif intent == "navegacional":
-        return "Fidelização"
+# Marcas combinantes (acentos soltos pelo NFKD) do plano básico do Unicode.
+REGEX_COMBINANTES = re.compile("[" + re.escape("".join(chr(c) for c in range(0x10000) if unicodedata.combining(chr(c)))) + "]")
+
+def _tokenizar(buffer, total):
+    """Divide `total` textos unidos por NUL em (tokens, tokens por texto) com um único split."""
+    if total == 0:
+        return np.array([], dtype=object), np.zeros(0, dtype=np.intp)
+    partes = np.array(buffer.replace("\0", " \0 ").split(), dtype=object)
+    separador = (pd.Series(partes, dtype=object) == "\0").to_numpy()
+    fins = np.r_[np.flatnonzero(separador), len(partes)]
+    return partes[~separador], np.diff(np.r_[-1, fins]) - 1
+
+def _juntar_tokens(tokens, linha, total):
+    """Junta com espaço os tokens de cada linha (`linha` em ordem crescente)."""
+    if total == 0:
+        return np.array([], dtype=object)
+    partes = np.empty(len(tokens) + total - 1, dtype=object)
+    partes[:] = "\0"
+    partes[np.arange(len(tokens)) + linha] = tokens
+    return np.array([texto.strip() for texto in " ".join(partes).split("\0")], dtype=object)
+
+class PalavrasNormalizadas:
+    """Palavras-chave normalizadas uma única vez por execução.
+
+    `texto` traz cada palavra em minúsculas, sem acentos e com espaços simples;
+    os tokens de todas as palavras ficam num único array `tokens`, e os da
+    linha i estão em tokens[offsets[i]:offsets[i + 1]]; `num_tokens` é o número
+    de tokens por linha. `grafia` devolve a forma com acento de cada token
+    sem acento, para exibir termos (ex.: nomes de clusters). As linhas seguem
+    os rótulos do índice da Series de origem, então qualquer recorte do
+    DataFrame é alinhado com `linhas(df)`.
+    """
+
+    def __init__(self, keywords):
+        inicio = time.perf_counter()
+        self.index = keywords.index
+        # Minúsculas, NFKD e remoção dos acentos num único buffer, em C.
+        minusculas = "\0".join(keywords.fillna("").astype(str).tolist()).lower()
+        buffer = REGEX_COMBINANTES.sub("", unicodedata.normalize("NFKD", minusculas))
+        self.tokens, self.num_tokens = _tokenizar(buffer, len(keywords))
+        self.offsets = np.r_[0, np.cumsum(self.num_tokens)]
+        self.texto = _juntar_tokens(self.tokens, np.repeat(np.arange(len(keywords)), self.num_tokens), len(keywords))
+        self.grafia = self._grafias(*_tokenizar(minusculas, len(keywords)))
+        print_status(f"Palavras normalizadas: {len(self.texto)} palavras, {len(self.tokens)} tokens ({_formatar_duracao(time.perf_counter() - inicio)}).")
+
+    def _grafias(self, tokens_originais, quantidades):
+        # Compara token a token com o texto só em minúsculas; linhas em que o
+        # NFKD mudou o número de tokens ficam de fora.
+        iguais = quantidades == self.num_tokens
+        sem_acento = self.tokens[np.repeat(iguais, self.num_tokens)]
+        com_acento = tokens_originais[np.repeat(iguais, quantidades)]
+        diferentes = sem_acento != com_acento
+        # Invertido para que a primeira grafia encontrada prevaleça.
+        return dict(zip(sem_acento[diferentes][::-1], com_acento[diferentes][::-1]))
+
+    def linhas(self, df):
+        """Posições das linhas de `df` (mesmos rótulos de índice) nos arrays normalizados."""
+        posicoes = self.index.get_indexer(df.index)
+        if (posicoes < 0).any():
+            raise KeyError("Linhas fora das palavras normalizadas.")
+        return posicoes
+
+    def textos(self, df):
+        return pd.Series(self.texto[self.linhas(df)], index=df.index, dtype=object)
+
+    def contagem(self, df):
+        return pd.Series(self.num_tokens[self.linhas(df)], index=df.index)
+
+    def tokens_por_linha(self, df):
+        """Lista de tokens de cada linha de `df`, na ordem das linhas."""
+        inicios, fins = self.offsets[:-1], self.offsets[1:]
+        return [self.tokens[inicios[i]:fins[i]].tolist() for i in self.linhas(df)]
+
+    def recorte(self, linhas):
+        """Tokens e offsets só das posições `linhas`, na ordem dada."""
+        quantidades = self.num_tokens[linhas]
+        offsets = np.r_[0, np.cumsum(quantidades)]
+        posicoes = np.repeat(self.offsets[linhas] - offsets[:-1], quantidades) + np.arange(offsets[-1])
+        return self.tokens[posicoes], offsets
+
+# =============================================================================
+# Agrupamento de Variações (MinHash/LSH)
+# =============================================================================
+
+# Variações de uma mesma palavra-chave (plural, acento, erro de digitação,
+# ordem das palavras) são agrupadas pela similaridade de Jaccard estimada
+# entre os shingles de caracteres. Só as duplas que caem no mesmo balde de
+# LSH são comparadas, então o custo é quase linear no número de palavras.
+# Desligado por padrão: juntar palavras muda as contagens das fases seguintes.
+AGRUPAR_VARIACOES = os.environ.get("ANALISE_KW_VARIACOES", "0") in ("1", "true", "sim")
+# Jaccard mínimo (estimado) entre os bigramas de caracteres de duas variações.
+# É baixo porque só filtra candidatos: uma letra a mais ou a menos numa
+# palavra curta já derruba o Jaccard, e a confirmação é feita palavra a
+# palavra (ver `AgrupadorVariacoes._confirmar`).
+LIMIAR_VARIACOES = 0.6
+# Conectivos ignorados ao comparar variações ("receita de bolo" ~ "receita bolo").
+CONECTIVOS_VARIACOES = frozenset([
+    "a", "o", "as", "os", "e", "de", "da", "do", "das", "dos", "em", "no", "na", "nos", "nas",
+    "para", "pra", "por", "com", "um", "uma",
+])
+
+class AgrupadorVariacoes:
+    """Agrupa variações de palavras-chave por MinHash e LSH."""
+
+    NUM_PERMUTACOES = 64
+    BANDAS = 16
+    TAMANHO_SHINGLE = 2
+    TAMANHO_BLOCO = 100000
+
+    def __init__(self, limiar=LIMIAR_VARIACOES, random_state=42):
+        self.limiar = limiar
+        # Hash multiplicativo (a * x + b) >> 32, com aritmética módulo 2**64.
+        rng = np.random.default_rng(random_state)
+        self.a = rng.integers(0, np.iinfo(np.uint64).max, self.NUM_PERMUTACOES, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self.b = rng.integers(0, np.iinfo(np.uint64).max, self.NUM_PERMUTACOES, dtype=np.uint64, endpoint=True)
+
+    def _textos_base(self, tokens, offsets):
+        # Sem conectivos ("de", "para"), no singular ("sociais" -> "social",
+        # "receitas" -> "receita") e com as palavras em ordem alfabética:
+        # "Receitas de Bolo" e "bolo receita" viram "bolo receita". Os tokens
+        # já vêm sem acento; números e siglas ("24", "sp") são mantidos.
+        total = len(offsets) - 1
+        linha = np.repeat(np.arange(total), np.diff(offsets))
+        # As regras valem por token, então rodam só no vocabulário distinto.
+        codigos, vocabulario = pd.factorize(pd.Series(tokens, dtype=object))
+        vocabulario = pd.Series(vocabulario, dtype=object)
+        tamanhos = vocabulario.str.len().to_numpy()
+        singular = vocabulario.where(~((tamanhos > 3) & vocabulario.str.endswith("s").to_numpy()), vocabulario.str[:-1])
+        for sufixo, troca in (("ais", "al"), ("eis", "el"), ("ois", "ol"), ("oes", "ao"), ("ns", "m")):
+            irregular = (tamanhos > 4) & vocabulario.str.endswith(sufixo).to_numpy()
+            singular = singular.where(~irregular, vocabulario.str[:-len(sufixo)] + troca)
+        codigos_base, vocabulario_base = pd.factorize(singular, sort=True)
+        conectivo = vocabulario.isin(CONECTIVOS_VARIACOES).to_numpy()[codigos]
+        so_conectivos = np.bincount(linha, weights=~conectivo, minlength=total) == 0
+        manter = ~conectivo | so_conectivos[linha]
+        ordem_token = codigos_base[codigos][manter]
+        linha = linha[manter]
+        ordem = np.lexsort((ordem_token, linha))
+        textos = _juntar_tokens(np.asarray(vocabulario_base, dtype=object)[ordem_token[ordem]], linha[ordem], total)
+        return [(" " + texto + " ").ljust(self.TAMANHO_SHINGLE) for texto in textos]
+
+    def _assinaturas(self, textos):
+        """MinHash dos shingles de caracteres, calculado em blocos de textos."""
+        assinaturas = np.empty((len(textos), self.NUM_PERMUTACOES), dtype=np.uint32)
+        for inicio in range(0, len(textos), self.TAMANHO_BLOCO):
+            bloco = textos[inicio:inicio + self.TAMANHO_BLOCO]
+            # Cada shingle vira um inteiro com os code points (21 bits cada).
+            k = self.TAMANHO_SHINGLE
+            codigos = np.frombuffer("".join(bloco).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+            tamanhos = np.fromiter((len(t) for t in bloco), dtype=np.intp, count=len(bloco))
+            fins = np.cumsum(tamanhos)
+            valido = np.ones(len(codigos) - k + 1, dtype=bool)
+            for j in range(1, k):
+                valido[fins[:-1] - j] = False
+            shingles = np.zeros(len(codigos) - k + 1, dtype=np.uint64)
+            for j in range(k):
+                shingles |= codigos[j:len(codigos) - k + 1 + j] << np.uint64(21 * (k - 1 - j))
+            shingles = shingles[valido]
+            inicios = np.r_[0, np.cumsum(tamanhos - (k - 1))[:-1]]
+            hashes = np.empty(len(shingles), dtype=np.uint64)
+            for p in range(self.NUM_PERMUTACOES):
+                np.multiply(shingles, self.a[p], out=hashes)
+                hashes += self.b[p]
+                hashes >>= np.uint64(32)
+                assinaturas[inicio:inicio + len(bloco), p] = np.minimum.reduceat(hashes.astype(np.uint32), inicios)
+        return assinaturas
+
+    def _candidatos(self, assinaturas, posicao):
+        """Pares (texto, melhor texto do balde) em cada banda de LSH.
+
+        Dentro de um balde, todo texto é ligado ao de menor `posicao`, que é
+        o único candidato a canônica daquele balde.
+        """
+        total = len(assinaturas)
+        linhas_por_banda = self.NUM_PERMUTACOES // self.BANDAS
+        pares = []
+        for banda in range(self.BANDAS):
+            bloco = assinaturas[:, banda * linhas_por_banda:(banda + 1) * linhas_por_banda]
+            chave = np.zeros(total, dtype=np.uint64)
+            for coluna in range(linhas_por_banda):
+                chave = chave * np.uint64(1000003) ^ bloco[:, coluna]
+            ordem = np.lexsort((posicao, chave))
+            inicio_balde = np.r_[True, chave[ordem[1:]] != chave[ordem[:-1]]]
+            primeiro = ordem[np.maximum.accumulate(np.where(inicio_balde, np.arange(total), 0))]
+            mesmo_balde = ~inicio_balde
+            pares.append(primeiro[mesmo_balde].astype(np.int64) * total + ordem[mesmo_balde])
+        pares = np.sort(np.concatenate(pares))
+        pares = pares[np.r_[True, pares[1:] != pares[:-1]][:len(pares)]]
+        return pares // total, pares % total
+
+    @staticmethod
+    def _confirmar(texto_a, texto_b):
+        """Os textos base diferem numa única palavra, por uma única letra.
+
+        Vale inserção, remoção, troca ou inversão de duas letras vizinhas
+        ("corida" ~ "corrida", "sociall" ~ "social"), só em palavras com 4 ou
+        mais letras: "bolo" e "bola" continuam separadas.
+        """
+        restantes_a, restantes_b = Counter(texto_a.split()), Counter(texto_b.split())
+        restantes_a, restantes_b = list((restantes_a - restantes_b).elements()), list((restantes_b - restantes_a).elements())
+        if len(restantes_a) != 1 or len(restantes_b) != 1:
+            return False
+        x, y = sorted((restantes_a[0], restantes_b[0]), key=len)
+        if len(x) < 4 or len(y) - len(x) > 1:
+            return False
+        inicio = 0
+        while inicio < len(x) and x[inicio] == y[inicio]:
+            inicio += 1
+        if len(x) < len(y):
+            return x[inicio:] == y[inicio + 1:]
+        return x[inicio + 1:] == y[inicio + 1:] or (x[inicio + 2:] == y[inicio + 2:] and x[inicio:inicio + 2] == y[inicio:inicio + 2][::-1])
+
+    def agrupar(self, tokens, offsets, prioridade=None):
+        """Retorna, para cada palavra, a posição da canônica do seu grupo.
+
+        As palavras chegam tokenizadas (ver `PalavrasNormalizadas.recorte`).
+        `prioridade` é a ordem de preferência das palavras (a primeira é a
+        melhor canônica). Cada grupo é uma estrela em volta da canônica: uma
+        palavra só entra se for parecida com ela, o que evita que cadeias de
+        vizinhos ("a b" ~ "a b c" ~ "b c") juntem termos sem relação.
+        """
+        from scipy import sparse
+        total = len(offsets) - 1
+        if total == 0:
+            return np.arange(0)
+        if prioridade is None:
+            prioridade = np.arange(total)
+        # Palavras que viram o mesmo texto base são sempre variações entre si,
+        # então o MinHash é calculado uma vez por texto.
+        codigos, textos = pd.factorize(pd.Series(self._textos_base(tokens, offsets), dtype=object))
+        assinaturas = self._assinaturas(list(textos))
+
+        # Cada texto é representado pela sua palavra de maior prioridade.
+        prioridade = np.asarray(prioridade)
+        posicao = np.empty(total, dtype=np.intp)
+        posicao[prioridade] = np.arange(total)
+        posicao_texto = np.full(len(textos), total, dtype=np.intp)
+        np.minimum.at(posicao_texto, codigos, posicao)
+        melhor_linha = prioridade[posicao_texto]
+
+        a, b = self._candidatos(assinaturas, posicao_texto)
+        # Confirma cada candidato pela fração de minhashes iguais (Jaccard estimado).
+        similares = np.concatenate([
+            np.count_nonzero(assinaturas[a[i:i + self.TAMANHO_BLOCO]] == assinaturas[b[i:i + self.TAMANHO_BLOCO]], axis=1)
+            >= self.limiar * self.NUM_PERMUTACOES
+            for i in range(0, len(a), self.TAMANHO_BLOCO)
+        ] or [np.zeros(0, dtype=bool)])
+        # Erro de digitação muda letras, não palavras: a dupla precisa ter o
+        # mesmo número de palavras e os mesmos números ("iphone 14" ≠ "iphone 15",
+        # "dentista 24 horas" ≠ "dentista 24 horas sp").
+        base = pd.Series(textos, dtype=object)
+        forma = pd.factorize(base.str.split().str.len().astype(str) + "|" + base.str.findall(r"\S*\d\S*").str.join(" "))[0]
+        similares &= forma[a] == forma[b]
+        a, b = a[similares], b[similares]
+        confirmados = np.fromiter((self._confirmar(textos[x], textos[y]) for x, y in zip(a, b)), dtype=bool, count=len(a))
+        a, b = a[confirmados], b[confirmados]
+        vizinhos = sparse.csr_matrix(
+            (np.ones(len(a) * 2, dtype=bool), (np.r_[a, b], np.r_[b, a])), shape=(len(textos), len(textos))
+        )
+
+        ordem_textos = np.argsort(posicao_texto, kind="stable")
+        centro = np.arange(len(textos))
+        atribuido = np.zeros(len(textos), dtype=bool)
+        for t in ordem_textos[np.diff(vizinhos.indptr)[ordem_textos] > 0]:
+            if atribuido[t]:
+                continue
+            membros = vizinhos.indices[vizinhos.indptr[t]:vizinhos.indptr[t + 1]]
+            membros = membros[~atribuido[membros]]
+            centro[membros] = t
+            atribuido[membros] = True
+            atribuido[t] = True
+        return melhor_linha[centro[codigos]]
+
+def agrupar_variacoes(df, volume_col, normalizadas):
+    """Agrupa as variações e escolhe uma palavra canônica por grupo.
+
+    A canônica é a de maior volume (empate: a mais curta, depois a ordem
+    alfabética) e mantém o próprio volume: variações próximas costumam trazer
+    a mesma demanda, então somá-las a contaria várias vezes. A soma do grupo
+    aparece só na aba "Variações". Retorna o DataFrame só com as canônicas, a
+    coluna "Keyword Canônica" alinhada a `df` e a tabela da aba "Variações".
+    """
+    keywords = df["Keyword"].fillna("").astype(str)
+    volumes = df[volume_col].fillna(-1).to_numpy() if volume_col else np.zeros(len(df))
+    prioridade = np.lexsort((keywords.to_numpy(), keywords.str.len().to_numpy(), -volumes))
+    grupos = AgrupadorVariacoes().agrupar(*normalizadas.recorte(normalizadas.linhas(df)), prioridade)
+    canonica = pd.Series(keywords.to_numpy()[grupos], index=df.index, name="Keyword Canônica")
+    canonicos_df = df[grupos == np.arange(len(df))]
+
+    tamanho_grupo = pd.Series(grupos, index=df.index).map(pd.Series(grupos).value_counts())
+    com_variacao = tamanho_grupo > 1
+    colunas = ["Keyword", volume_col] if volume_col else ["Keyword"]
+    variacoes_df = df.loc[com_variacao, colunas].copy()
+    variacoes_df.insert(0, "Keyword Canônica", canonica[com_variacao])
+    variacoes_df["Variações no Grupo"] = tamanho_grupo[com_variacao]
+    if volume_col:
+        soma = df[volume_col].groupby(grupos).sum(min_count=1)
+        variacoes_df["Volume do Grupo"] = soma.reindex(grupos[com_variacao.to_numpy()]).to_numpy()
+        variacoes_df = variacoes_df.assign(_ordem=volumes[grupos][com_variacao.to_numpy()]).sort_values(
+            by=["_ordem", "Keyword Canônica", volume_col], ascending=[False, True, False], kind="mergesort"
+        ).drop(columns="_ordem")
     else:
-        return "Sem Jornada Definida"
-
-def get_tipologia_sugerida(row):
-    intent = str(row.get('Intent', '')).strip().lower()
-    serp = str(row.get('SERP Features', '')).strip().lower()
-
-    if intent == "informational":
-        if "featured snippets" in serp:
-            return "Artigo de Blog"
-        elif "instant answer" in serp:
-            return "Artigo de Blog (respostas rápidas)"
-        elif any(term in serp for term in ["video", "featured video", "video carousel"]):
-            return "Guia"
-        elif any(term in serp for term in ["image", "image pack"]):
-            return "Infográfico"
-        elif "people also ask" in serp:
-            return "FAQs"
-        elif "knowledge panel" in serp:
-            return "Artigo de Blog (definições amplas)"
-        elif any(term in serp for term in ["news", "top stories"]):
-            return "Notícias do Setor"
-        else:
-            return "Análise Manual"
-    elif intent in ["transactional", "transacional"]:
-        if any(term in serp for term in ["shopping ads", "ads top", "ads bottom", "ads middle"]):
-            return "Página de Produto/Serviço (otimizadas para conversão)"
-        elif any(term in serp for term in ["hotel pack", "flights", "recipes", "jobs"]):
-            return "Página de Produto/Serviço"
-        elif "buying guide" in serp:
-            return "Página de Produto/Serviço"
-        elif any(term in serp for term in ["popular products", "related products", "organic carousel"]):
-            return "Página de Produto/Serviço"
-        elif any(term in serp for term in ["address pack", "twitter carousel"]):
-            return "Página de Produto/Serviço"
-        else:
-            return "Análise Manual"
-    elif intent == "commercial":
-        if any(term in serp for term in ["featured reviews", "video carousel"]):
-            return "Comparativo"
-        elif "buying guide" in serp:
-            return "Comparativo"
-        elif "discussions and forums" in serp:
-            return "Comparativo"
-        elif any(term in serp for term in ["brands", "explore", "related searches", "related products"]):
-            return "Comparativo"
-        elif "questions and answers" in serp:
-            return "FAQs"
-        else:
-            return "Análise Manual"
-    elif intent == "navegacional":
-        if "sitelinks" in serp:
-            return "Documentação"
-        elif "knowledge panel" in serp:
-            return "Blog de Atualizações"
-        elif any(term in serp for term in ["twitter", "twitter carousel"]):
-            return "Blog de Atualizações"
-        elif any(term in serp for term in ["find results on", "address pack"]):
-            return "Página de Suporte"
-        else:
-            return "Análise Manual"
+        variacoes_df = variacoes_df.sort_values(by=["Keyword Canônica", "Keyword"], kind="mergesort")
+    return canonicos_df, canonica, variacoes_df
+
+# =============================================================================
+# Matriz de SERP Features
+# =============================================================================
+
+def encontrar_coluna_serp(df):
+    for col in df.columns:
+        if col.strip().lower() == "serp features":
+            return col
+    return None
+
+class MatrizSerp:
+    """Matriz esparsa palavra-chave × SERP Feature, montada uma vez por execução.
+
+    As linhas seguem os rótulos do índice do DataFrame de origem (0..n-1 após o
+    concat), então qualquer recorte ou reordenação dele pode ser alinhado com
+    `para(df)`. As features são os itens separados por vírgula da coluna,
+    comparados por igualdade após strip/minúsculo: "video" não casa com
+    "video carousel".
+    """
+
+    def __init__(self, df):
+        from scipy import sparse
+        serp_col = encontrar_coluna_serp(df)
+        self.coluna_origem = serp_col
+        self.vocabulario = []
+        self.colunas = {}
+        if not serp_col:
+            self.matriz = sparse.csr_matrix((len(df), 0), dtype=bool)
+            return
+        codigos, unicos = pd.factorize(df[serp_col])
+        itens_por_unico = []
+        for valor in unicos:
+            itens = {}
+            for token in str(valor).split(','):
+                token = token.strip()
+                if token:
+                    itens.setdefault(token.lower(), token)
+            itens_por_unico.append(itens)
+        # Vocabulário em ordem alfabética; o nome exibido é a primeira grafia vista.
+        nomes = {}
+        for itens in itens_por_unico:
+            for chave, nome in itens.items():
+                nomes.setdefault(chave, nome)
+        for chave in sorted(nomes):
+            self.colunas[chave] = len(self.vocabulario)
+            self.vocabulario.append(nomes[chave])
+        indptr = [0]
+        indices = []
+        for itens in itens_por_unico:
+            indices.extend(sorted(self.colunas[chave] for chave in itens))
+            indptr.append(len(indices))
+        # Uma linha vazia extra no fim recebe os valores ausentes (código -1).
+        indptr.append(len(indices))
+        por_unico = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=bool), indices, indptr),
+            shape=(len(unicos) + 1, len(self.vocabulario)),
+        )
+        codigos = np.where(codigos < 0, len(unicos), codigos)
+        matriz = por_unico[codigos]
+        # Reordena as linhas pelos rótulos do índice.
+        ordem = np.empty(len(df), dtype=np.intp)
+        ordem[df.index.to_numpy()] = np.arange(len(df))
+        self.matriz = matriz[ordem].tocsr()
+
+    def para(self, df):
+        """Linhas da matriz alinhadas às linhas de `df` (mesmos rótulos de índice)."""
+        return self.matriz[df.index.to_numpy()]
+
+    def mascaras(self, features, df):
+        """{feature: máscara booleana das linhas de `df` que têm a feature}."""
+        alinhada = self.para(df).tocsc()
+        mascaras = {}
+        for feature in features:
+            mascara = np.zeros(len(df), dtype=bool)
+            j = self.colunas.get(feature.strip().lower())
+            if j is not None:
+                mascara[alinhada.indices[alinhada.indptr[j]:alinhada.indptr[j + 1]]] = True
+            mascaras[feature] = mascara
+        return mascaras
+
+# =============================================================================
+# Mapeamento da Jornada e Tipologia
+# =============================================================================
+
+# Regras avaliadas em ordem; vale a primeira que casar. O intent é comparado
+# por igualdade (minúsculo, sem espaços nas pontas) e as SERP Features pela
+# presença do item na MatrizSerp.
+REGRAS_JORNADA = [
+    (("informational",), "Conscientização"),
+    (("transactional", "transacional"), "Decisão"),
+    (("commercial",), "Consideração"),
+    (("navegacional",), "Fidelização"),
+]
+JORNADA_PADRAO = "Sem Jornada Definida"
+
+REGRAS_TIPOLOGIA = [
+    (("informational",), ("featured snippets",), "Artigo de Blog"),
+    (("informational",), ("instant answer",), "Artigo de Blog (respostas rápidas)"),
+    (("informational",), ("video", "featured video", "video carousel"), "Guia"),
+    (("informational",), ("image", "image pack"), "Infográfico"),
+    (("informational",), ("people also ask",), "FAQs"),
+    (("informational",), ("knowledge panel",), "Artigo de Blog (definições amplas)"),
+    (("informational",), ("news", "top stories"), "Notícias do Setor"),
+    (("transactional", "transacional"), ("shopping ads", "ads top", "ads bottom", "ads middle"), "Página de Produto/Serviço (otimizadas para conversão)"),
+    (("transactional", "transacional"), ("hotel pack", "flights", "recipes", "jobs"), "Página de Produto/Serviço"),
+    (("transactional", "transacional"), ("buying guide",), "Página de Produto/Serviço"),
+    (("transactional", "transacional"), ("popular products", "related products", "organic carousel"), "Página de Produto/Serviço"),
+    (("transactional", "transacional"), ("address pack", "twitter carousel"), "Página de Produto/Serviço"),
+    (("commercial",), ("featured reviews", "video carousel"), "Comparativo"),
+    (("commercial",), ("buying guide",), "Comparativo"),
+    (("commercial",), ("discussions and forums",), "Comparativo"),
+    (("commercial",), ("brands", "explore", "related searches", "related products"), "Comparativo"),
+    (("commercial",), ("questions and answers",), "FAQs"),
+    (("navegacional",), ("sitelinks",), "Documentação"),
+    (("navegacional",), ("knowledge panel",), "Blog de Atualizações"),
+    (("navegacional",), ("twitter", "twitter carousel"), "Blog de Atualizações"),
+    (("navegacional",), ("find results on", "address pack"), "Página de Suporte"),
+]
+TIPOLOGIA_PADRAO = "Análise Manual"
+
+def _fatorar_normalizado(df, coluna):
+    """Fatora a coluna e normaliza só os valores distintos (str, minúsculo, sem
+    espaços nas pontas), do mesmo jeito que str(valor) trataria cada linha."""
+    if coluna not in df.columns:
+        return np.zeros(len(df), dtype=np.intp), pd.Series([""])
+    codigos, unicos = pd.factorize(df[coluna], use_na_sentinel=False)
+    return codigos, pd.Series([str(valor).strip().lower() for valor in unicos], dtype=object)
+
+def _selecionar(condicoes, valores, padrao):
+    # np.select sobre o número da regra e só depois o texto: evita arrays de strings numpy.
+    indice = np.select(condicoes, np.arange(len(valores)), default=len(valores))
+    return np.array(valores + [padrao], dtype=object)[indice]
+
+def mapear_jornada_e_tipologia(df, matriz_serp):
+    """Aplica as tabelas de regras a todas as linhas de uma vez.
+
+    Retorna dois arrays (etapa da jornada, tipologia sugerida) alinhados às
+    linhas de `df`.
+    """
+    codigos_intent, intents_unicos = _fatorar_normalizado(df, 'Intent')
+    def intent_em(intents):
+        return intents_unicos.isin(intents).to_numpy()[codigos_intent]
+    contem = matriz_serp.mascaras({termo for _, termos, _ in REGRAS_TIPOLOGIA for termo in termos}, df)
+
+    jornada = _selecionar(
+        [intent_em(intents) for intents, _ in REGRAS_JORNADA],
+        [etapa for _, etapa in REGRAS_JORNADA],
+        JORNADA_PADRAO,
+    )
+    tipologia = _selecionar(
+        [intent_em(intents) & np.logical_or.reduce([contem[t] for t in termos]) for intents, termos, _ in REGRAS_TIPOLOGIA],
+        [tipo for _, _, tipo in REGRAS_TIPOLOGIA],
+        TIPOLOGIA_PADRAO,
+    )
+    return jornada, tipologia
+
+# =============================================================================
+# Função para Separação por Intent
+# =============================================================================
+
+INTENTS = ['Informational', 'Transactional', 'Commercial', 'Navigational']
+
+class IndiceIntents:
+    """Índice multi-rótulo da coluna Intent, montado em uma passada.
+
+    Guarda uma permutação global das linhas (volume decrescente, depois
+    Keyword) e, nessa ordem, uma máscara booleana por intent e outra para as
+    linhas sem intent. Valores como "informational, transactional" marcam os
+    dois intents. Cada aba é então um `take` das posições selecionadas.
+    """
+
+    def __init__(self, df, volume_col, intents=INTENTS):
+        ordenacao = ([volume_col] if volume_col else []) + ['Keyword']
+        self.ordem = df.reset_index(drop=True).sort_values(
+            by=ordenacao, ascending=[False] * (len(ordenacao) - 1) + [True], kind="mergesort"
+        ).index.to_numpy()
+        codigos, unicos = pd.factorize(df['Intent'])
+        codigos = codigos[self.ordem]
+        rotulos = [{item.strip().lower() for item in str(valor).split(',')} for valor in unicos]
+        self.mascaras = {}
+        for intent in intents:
+            por_unico = np.array([intent.lower() in itens for itens in rotulos] + [False], dtype=bool)
+            self.mascaras[intent] = por_unico[codigos]
+        self.sem_intent = codigos < 0
+
+    def posicoes(self, intent=None):
+        """Posições (iloc) das linhas do intent, já ordenadas; None para "Sem Intent"."""
+        mascara = self.sem_intent if intent is None else self.mascaras[intent]
+        return self.ordem[mascara]
+
+def criar_planilha_intents(folder_name, combined_df, volume_col):
+    fase = ProgressoFase("Fase 2: Separando por intenção de busca", total_etapas=len(INTENTS) + 1)
+    wb_intent = Workbook(write_only=True)
+    escrever_aba(wb_intent, "Visao Geral", combined_df, volume_col)
+
+    indice = IndiceIntents(combined_df, volume_col)
+    intent_counts = {}
+    for intent in INTENTS:
+        intent_df = combined_df.take(indice.posicoes(intent))
+        intent_counts[intent] = len(intent_df)
+        escrever_aba(wb_intent, intent, intent_df, volume_col)
+        fase.avancar(f"Aba criada para Intent: {intent}", len(intent_df))
+
+    no_intent_df = combined_df.take(indice.posicoes())
+    escrever_aba(wb_intent, "Sem Intent", no_intent_df, volume_col)
+    fase.avancar("Aba criada para: Sem Intent", len(no_intent_df))
+
+    intents_filename = os.path.join(folder_name, "Intents.xlsx")
+    wb_intent.save(registrar_saida(intents_filename))
+    fase.concluir("Fase 2 concluída: Planilha 'Intents.xlsx' gerada!", len(combined_df))
+    return intent_counts
+
+# =============================================================================
+# Função para Separação por SERP Features
+# =============================================================================
+
+def criar_planilha_serp_features(folder_name, combined_df, volume_col, matriz_serp):
+    fase = ProgressoFase("Fase 3: Separando por SERP Features")
+    wb_serp = Workbook(write_only=True)
+    escrever_aba(wb_serp, "Visao Geral", combined_df, volume_col)
+
+    serp_counts = {}
+    if matriz_serp.coluna_origem:
+        # Em CSC, as linhas de cada feature já estão listadas: custo O(nnz).
+        por_feature = matriz_serp.para(combined_df).tocsc()
+        por_feature.sort_indices()
+        fase.total_etapas = len(matriz_serp.vocabulario)
+        for j, feature in enumerate(matriz_serp.vocabulario):
+            posicoes = por_feature.indices[por_feature.indptr[j]:por_feature.indptr[j + 1]]
+            feature_df = combined_df.iloc[posicoes]
+            if volume_col:
+                feature_df = feature_df.sort_values(by=[volume_col], ascending=False)
+            serp_counts[feature] = len(feature_df)
+            if not feature_df.empty:
+                escrever_aba(wb_serp, feature, feature_df, volume_col)
+            fase.avancar(f"Aba criada para SERP Feature: {feature}", len(feature_df))
     else:
-        return "Análise Manual"
+        print_status("Aviso: Coluna 'SERP Features' não encontrada. Pulando separação por SERP Features.")
+    serp_features_filename = os.path.join(folder_name, "SERP Features.xlsx")
+    wb_serp.save(registrar_saida(serp_features_filename))
+    fase.concluir("Fase 3 concluída: Planilha 'SERP Features.xlsx' gerada!", len(combined_df))
+    return serp_counts
+
+# =============================================================================
+# Função para CTR por Posição
+# =============================================================================
+
+# Faixa de CTR (mínimo, máximo) por posição orgânica. Pode ser substituída por
+# um CSV com as colunas Posicao, Min e Max (ver CURVA_CTR_ARQUIVO), em fração
+# (0.25) ou em porcentagem (25).
+CTR_POR_POSICAO = {
+    1: (0.25, 0.35), 2: (0.15, 0.20), 3: (0.10, 0.15), 4: (0.07, 0.10), 5: (0.05, 0.07),
+    6: (0.04, 0.06), 7: (0.03, 0.05), 8: (0.02, 0.04), 9: (0.02, 0.03), 10: (0.01, 0.02)
+}
+CURVA_CTR_ARQUIVO = os.environ.get("ANALISE_KW_CURVA_CTR", "curva_ctr.csv")
+
+def carregar_curva_ctr(caminho=CURVA_CTR_ARQUIVO):
+    """Lê a curva de CTR do CSV, se existir; senão usa CTR_POR_POSICAO."""
+    if not caminho or not os.path.exists(caminho):
+        return CTR_POR_POSICAO
+    try:
+        curva = pd.read_csv(caminho, sep=None, engine="python")
+        curva.columns = [str(c).strip().lower() for c in curva.columns]
+        curva = curva.rename(columns={"posição": "posicao", "mínimo": "min", "máximo": "max", "minimo": "min", "maximo": "max"})
+        taxas = curva[["min", "max"]].apply(lambda col: pd.to_numeric(col.astype(str).str.rstrip("%").str.replace(",", "."), errors="raise"))
+        if (taxas > 1).any().any():
+            taxas = taxas / 100
+        posicoes = curva["posicao"].astype(int)
+    except Exception as e:
+        print_status(f"Erro ao ler a curva de CTR '{caminho}': {str(e)}")
+        raise
+    if posicoes.duplicated().any() or (taxas["min"] > taxas["max"]).any() or curva.empty:
+        raise ValueError(f"Curva de CTR inválida em '{caminho}': posições repetidas, vazia ou mínimo maior que máximo.")
+    ctr_rates = {int(pos): (float(mn), float(mx)) for pos, mn, mx in sorted(zip(posicoes, taxas["min"], taxas["max"]))}
+    print_status(f"Curva de CTR carregada de '{caminho}' ({len(ctr_rates)} posições).")
+    return ctr_rates
+
+def calcular_matriz_ctr(volumes, ctr_rates):
+    """Cliques mínimos e máximos por posição: duas matrizes linhas × posições de inteiros."""
+    volumes = np.asarray(volumes, dtype=float)[:, None]
+    taxas = np.array(list(ctr_rates.values()), dtype=float)
+    return np.trunc(volumes * taxas[:, 0]).astype(np.int64), np.trunc(volumes * taxas[:, 1]).astype(np.int64)
+
+def formatar_ctr_para_planilha(ctr_export_df, ctr_rates):
+    """Troca as colunas numéricas Min/Max pelo texto "min - max" exibido na planilha."""
+    planilha_df = ctr_export_df.drop(columns=[c for pos in ctr_rates for c in (f'Posicao {pos} Min', f'Posicao {pos} Max')])
+    for pos, (min_rate, max_rate) in ctr_rates.items():
+        planilha_df[f'Posicao {pos} ({int(min_rate*100)}%-{int(max_rate*100)}%)'] = (
+            ctr_export_df[f'Posicao {pos} Min'].astype(str) + " - " + ctr_export_df[f'Posicao {pos} Max'].astype(str)
+        )
+    return planilha_df
+
+def criar_planilha_ctr_por_posicao(folder_name, combined_df, volume_col, ctr_rates):
+    fase = ProgressoFase("Fase 5: Calculando CTR por posição")
+    if not volume_col:
+        print_status("Aviso: Nenhuma coluna de volume encontrada. Pulando Fase 5.")
+        fase.concluir("Fase 5 ignorada", 0)
+        return pd.DataFrame()
+
+    ctr_df = combined_df[(combined_df[volume_col] > 0) & (combined_df[volume_col].notna())]
+    ctr_export_df = ctr_df[['Keyword', volume_col, 'Intent', 'Trend']].copy()
+    minimos, maximos = calcular_matriz_ctr(ctr_df[volume_col].to_numpy(), ctr_rates)
+    for k, pos in enumerate(ctr_rates):
+        ctr_export_df[f'Posicao {pos} Min'] = minimos[:, k]
+        ctr_export_df[f'Posicao {pos} Max'] = maximos[:, k]
+    wb_ctr = Workbook(write_only=True)
+    escrever_aba(wb_ctr, "CTR por Posicao", formatar_ctr_para_planilha(ctr_export_df, ctr_rates), volume_col)
+    ctr_filename = os.path.join(folder_name, "CTR por Posicao.xlsx")
+    wb_ctr.save(registrar_saida(ctr_filename))
+    fase.concluir("Fase 5 concluída: Planilha 'CTR por Posicao.xlsx' gerada!", len(ctr_export_df))
+    return ctr_export_df
 
 # =============================================================================
 # Função para Estratégia com Palavras-Chave
 # =============================================================================
 
+@medir_desempenho
 def criar_planilha_palavras_por_estrategia(folder_name, objective, combined_df):
     print_status("Criando a planilha 'Palavras por Estratégia.xlsx'...")
 
@@ -275,40 +1102,278 @@ def criar_planilha_palavras_por_estrategia(folder_name, objective, combined_df):
     if objetivo_selecionado != "Outro":
         estrategia_df = estrategia_df[estrategia_df["Objetivo"] == objetivo_selecionado]
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Palavras por Estratégia"
-    for r in dataframe_to_rows(estrategia_df, index=False, header=True):
-        ws.append(r)
-
-    volume_col_index = get_column_index(ws, "Volume")
-    if volume_col_index and not estrategia_df['Volume'].dropna().empty:
-        apply_heatmap(ws, volume_col_index, estrategia_df['Volume'])
-
-    apply_header_style(ws)
-    apply_content_style(ws)
-    adjust_column_width(ws)
-    wb.save(os.path.join(folder_name, "Palavras por Estratégia.xlsx"))
+    wb = Workbook(write_only=True)
+    escrever_aba(wb, "Palavras por Estratégia", estrategia_df, "Volume")
+    wb.save(registrar_saida(os.path.join(folder_name, "Palavras por Estratégia.xlsx")))
     print_status("Planilha 'Palavras por Estratégia.xlsx' criada com sucesso!")
     return estrategia_df, objetivo_selecionado
 
+# =============================================================================
+# Armazém de Features TF-IDF
+# =============================================================================
+
+TFIDF_MAX_FEATURES = 5000
+# Acima deste número de palavras o vocabulário é ajustado numa amostra e a
+# matriz é montada em blocos.
+TFIDF_AMOSTRA_VOCABULARIO = 200000
+
+class ArmazemTfidf:
+    """Matriz TF-IDF das palavras-chave, calculada uma vez por execução.
+
+    Recebe o texto já normalizado (`PalavrasNormalizadas.textos`), por isso o
+    vetorizador não converte para minúsculas de novo; `grafia` devolve os
+    acentos aos nomes dos termos. As linhas seguem a ordem
+    da série recebida e `linhas(df)` recorta as
+    linhas de qualquer subconjunto dela pelo índice. Com o cache de entrada
+    ativo, a matriz (.npz) e o vocabulário (.npy) ficam em CACHE_DIR, com
+    nome dado pelo hash das palavras-chave e dos parâmetros, e uma nova
+    execução sobre as mesmas palavras não vetoriza de novo.
+    """
+
+    TAMANHO_BLOCO = 50000
+
+    def __init__(self, keywords, max_features=TFIDF_MAX_FEATURES, grafia=None):
+        textos = keywords.fillna("").astype(str)
+        self.indice = textos.index
+        h = hashlib.blake2b(f"{max_features}|{CACHE_VERSAO}|".encode("utf-8"), digest_size=20)
+        for inicio in range(0, len(textos), self.TAMANHO_BLOCO):
+            h.update("\0".join(textos.iloc[inicio:inicio + self.TAMANHO_BLOCO]).encode("utf-8", "surrogatepass"))
+            h.update(b"\1")
+        self.chave = h.hexdigest()
+        if not self._carregar():
+            self._vetorizar(textos, max_features)
+            self._gravar()
+        if grafia:
+            self.nomes = np.array([grafia.get(nome, nome) for nome in self.nomes], dtype=str)
+
+    def _arquivos(self):
+        return (os.path.join(CACHE_DIR, f"tfidf-{self.chave}.npz"), os.path.join(CACHE_DIR, f"tfidf-{self.chave}.npy"))
+
+    def _carregar(self):
+        if not CACHE_ATIVO:
+            return False
+        matriz, vocabulario = self._arquivos()
+        if not (os.path.exists(matriz) and os.path.exists(vocabulario)):
+            return False
+        try:
+            from scipy import sparse
+            self.X = sparse.load_npz(matriz).tocsr()
+            self.nomes = np.load(vocabulario, allow_pickle=False)
+        except Exception as e:
+            print_status(f"Aviso: cache TF-IDF inválido ({e}); vetorizando de novo.")
+            return False
+        for caminho in (matriz, vocabulario):
+            os.utime(caminho)
+        print_status(f"TF-IDF carregado do cache: {self.X.shape[0]} palavras × {self.X.shape[1]} termos.")
+        return True
+
+    def _vetorizar(self, textos, max_features):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        inicio = time.perf_counter()
+        grande = len(textos) > TFIDF_AMOSTRA_VOCABULARIO
+        vectorizer = TfidfVectorizer(max_features=max_features, stop_words=None, lowercase=False, dtype=np.float32 if grande else np.float64)
+        if grande:
+            from scipy import sparse
+            amostra = np.sort(np.random.default_rng(42).choice(len(textos), TFIDF_AMOSTRA_VOCABULARIO, replace=False))
+            vectorizer.fit(textos.iloc[amostra])
+            self.X = sparse.vstack([
+                vectorizer.transform(textos.iloc[i:i + self.TAMANHO_BLOCO]) for i in range(0, len(textos), self.TAMANHO_BLOCO)
+            ]).tocsr()
+        else:
+            self.X = vectorizer.fit_transform(textos)
+        self.nomes = vectorizer.get_feature_names_out().astype(str)
+        print_status(f"TF-IDF calculado: {self.X.shape[0]} palavras × {self.X.shape[1]} termos ({_formatar_duracao(time.perf_counter() - inicio)}).")
+
+    def _gravar(self):
+        if not CACHE_ATIVO:
+            return
+        matriz, vocabulario = self._arquivos()
+        try:
+            from scipy import sparse
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _gravar_atomico(matriz, lambda destino: _gravar_binario(destino, lambda f: sparse.save_npz(f, self.X)))
+            _gravar_atomico(vocabulario, lambda destino: _gravar_binario(destino, lambda f: np.save(f, self.nomes, allow_pickle=False)))
+        except Exception as e:
+            print_status(f"Aviso: não foi possível gravar o TF-IDF no cache: {e}")
+
+    def linhas(self, df):
+        """Linhas da matriz correspondentes às linhas de `df` (mesmos rótulos de índice)."""
+        posicoes = self.indice.get_indexer(df.index)
+        if (posicoes < 0).any():
+            raise KeyError("Linhas fora do armazém TF-IDF.")
+        return self.X[posicoes]
+
+# =============================================================================
+# Motor de Agrupamento Semântico
+# =============================================================================
+
+# Até este número de palavras o agrupamento usa KMeans completo (n_init=10),
+# como antes. Acima dele o MiniBatchKMeans treina numa amostra e atribui os
+# grupos em blocos.
+LIMITE_KMEANS_COMPLETO = 20000
+AGRUPAMENTO_SEGUNDOS = float(os.environ.get("ANALISE_KW_AGRUPAMENTO_SEGUNDOS", "120"))
+# Memória que o agrupamento pode alocar além da matriz TF-IDF já carregada:
+# a amostra de treino, os blocos de atribuição, centros e somas por grupo são
+# dimensionados para que a estimativa de pico fique abaixo deste valor.
+AGRUPAMENTO_MEMORIA_MB = float(os.environ.get("ANALISE_KW_AGRUPAMENTO_MEMORIA_MB", "1024"))
+# Desligado, não há TF-IDF nem KMeans (e o sklearn não é importado): os grupos
+# semânticos do planejamento ficam vazios e o Top 100 usa um único grupo.
+AGRUPAMENTO_SEMANTICO = os.environ.get("ANALISE_KW_AGRUPAMENTO", "1") not in ("0", "false", "nao", "não")
+
+class MotorAgrupamento:
+    """Agrupa linhas de uma matriz TF-IDF com orçamento de tempo e memória.
+
+    `agrupar` devolve os rótulos (um inteiro por linha) e, para cada grupo,
+    os termos de maior TF-IDF médio. Sem `n_grupos`, o k é escolhido entre 2 e
+    `max_grupos` pelo maior silhouette (cosseno) numa amostra. O prazo é
+    verificado entre inicializações, lotes e blocos; esgotado, o treino para
+    e os rótulos saem do melhor modelo obtido até ali.
+    """
+
+    TAMANHO_BLOCO = 50000
+    TAMANHO_LOTE = 4096
+    AMOSTRA_SILHUETA = 3000
+    EPOCAS = 3
+
+    def __init__(self, segundos=None, memoria_mb=None, random_state=42):
+        # Lidos na criação, não na definição, para valer o que a configuração da execução definir.
+        self.segundos = AGRUPAMENTO_SEGUNDOS if segundos is None else segundos
+        self.memoria_mb = AGRUPAMENTO_MEMORIA_MB if memoria_mb is None else memoria_mb
+        self.random_state = random_state
+
+    def agrupar(self, X, nomes, n_grupos=None, max_grupos=10, n_termos=2):
+        inicio = time.perf_counter()
+        self.prazo = inicio + self.segundos
+        rng = np.random.default_rng(self.random_state)
+        total = X.shape[0]
+        grande = total > LIMITE_KMEANS_COMPLETO
+
+        if n_grupos is None:
+            amostra = np.sort(rng.choice(total, min(total, self.AMOSTRA_SILHUETA), replace=False))
+            n_grupos = self._escolher_k(X[amostra], max_grupos)
+
+        if grande:
+            rotulos, somas = self._agrupar_em_blocos(X, n_grupos, rng)
+        else:
+            rotulos = self._kmeans_completo(X, n_grupos)
+            somas = (self._indicador(rotulos, n_grupos) @ X).toarray()
+
+        termos = [[nomes[idx] for idx in somas[g].argsort()[-n_termos:][::-1]] for g in range(n_grupos)]
+        print_status(f"Agrupamento: {total} palavras em {n_grupos} grupos ({'MiniBatchKMeans' if grande else 'KMeans'}, {_formatar_duracao(time.perf_counter() - inicio)}).")
+        return rotulos, termos
+
+    @staticmethod
+    def _indicador(rotulos, n_grupos):
+        from scipy import sparse
+        return sparse.csr_matrix((np.ones(len(rotulos)), (rotulos, np.arange(len(rotulos)))), shape=(n_grupos, len(rotulos)))
+
+    def _escolher_k(self, X_amostra, max_grupos):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.metrics import silhouette_score
+        candidatos = range(2, max(2, min(max_grupos, X_amostra.shape[0] - 1)) + 1)
+        melhor_k, melhor_nota = candidatos[0], -1.0
+        for k in candidatos:
+            if time.perf_counter() > self.prazo:
+                print_status(f"Aviso: orçamento de tempo esgotado na escolha de k; usando k={melhor_k}.")
+                break
+            rotulos = MiniBatchKMeans(n_clusters=k, n_init=3, random_state=self.random_state).fit_predict(X_amostra)
+            if len(set(rotulos)) < 2:
+                continue
+            nota = silhouette_score(X_amostra, rotulos, metric="cosine", random_state=self.random_state)
+            if nota > melhor_nota:
+                melhor_k, melhor_nota = k, nota
+        return melhor_k
+
+    def _kmeans_completo(self, X, n_grupos, n_init=10):
+        """KMeans com `n_init` inicializações, uma por vez para checar o prazo.
+
+        Com o mesmo RandomState passado adiante, o resultado é o mesmo de
+        KMeans(n_init=10); a primeira inicialização sempre roda.
+        """
+        from sklearn.cluster import KMeans
+        estado = np.random.RandomState(self.random_state)
+        melhor = None
+        for tentativa in range(n_init):
+            if melhor is not None and time.perf_counter() > self.prazo:
+                print_status(f"Aviso: orçamento de tempo do agrupamento esgotado após {tentativa} inicialização(ões) do KMeans.")
+                break
+            modelo = KMeans(n_clusters=n_grupos, n_init=1, random_state=estado).fit(X)
+            if melhor is None or modelo.inertia_ < melhor.inertia_:
+                melhor = modelo
+        return melhor.labels_
+
+    def _dimensionar(self, X, n_grupos):
+        """Linhas da amostra de treino e do bloco de atribuição que cabem no orçamento.
+
+        Estimativa: ~12 bytes por valor não nulo da matriz esparsa, mais as
+        distâncias de cada linha a cada centro; centros (com as cópias do
+        MiniBatchKMeans) e somas por grupo são fixos.
+        """
+        nnz_por_linha = max(1.0, X.nnz / max(1, X.shape[0]))
+        por_linha = 12 * nnz_por_linha + 8 + 8 * n_grupos
+        fixo = 4 * 8 * n_grupos * X.shape[1] + self.TAMANHO_LOTE * por_linha
+        disponivel = self.memoria_mb * 1024 * 1024 - fixo
+        minimo = n_grupos * 10
+        if disponivel < minimo * por_linha:
+            print_status(f"Aviso: orçamento de memória do agrupamento ({self.memoria_mb:.0f} MB) abaixo do mínimo; "
+                         f"usando {minimo} linhas de treino.")
+        linhas_treino = min(X.shape[0], max(int(disponivel / por_linha), minimo))
+        linhas_bloco = max(min(self.TAMANHO_BLOCO, int(disponivel / por_linha)), 1000)
+        return linhas_treino, linhas_bloco
+
+    def _agrupar_em_blocos(self, X, n_grupos, rng):
+        from sklearn.cluster import MiniBatchKMeans
+        linhas_treino, linhas_bloco = self._dimensionar(X, n_grupos)
+        treino = np.sort(rng.choice(X.shape[0], linhas_treino, replace=False))
+        X_treino = X[treino]
+        modelo = MiniBatchKMeans(n_clusters=n_grupos, batch_size=self.TAMANHO_LOTE, n_init=3, random_state=self.random_state)
+        modelo.partial_fit(X_treino[rng.choice(X_treino.shape[0], min(X_treino.shape[0], max(self.TAMANHO_LOTE, 3 * n_grupos)), replace=False)])
+        # Reserva, no prazo do treino, o tempo de atribuir os grupos a todas
+        # as linhas, estimado num bloco pequeno.
+        inicio_medida = time.perf_counter()
+        amostra = min(X.shape[0], 1000)
+        modelo.predict(X[:amostra])
+        prazo_treino = self.prazo - (time.perf_counter() - inicio_medida) * X.shape[0] / amostra
+        interrompido = False
+        for _ in range(self.EPOCAS):
+            ordem = rng.permutation(X_treino.shape[0])
+            for inicio in range(0, len(ordem), self.TAMANHO_LOTE):
+                if time.perf_counter() > prazo_treino:
+                    interrompido = True
+                    break
+                modelo.partial_fit(X_treino[ordem[inicio:inicio + self.TAMANHO_LOTE]])
+            if interrompido:
+                print_status("Aviso: orçamento de tempo do agrupamento esgotado; usando o modelo treinado até aqui.")
+                break
+        del X_treino
+
+        # Toda linha precisa de um grupo; passado o prazo, só avisa uma vez.
+        rotulos = np.empty(X.shape[0], dtype=np.int32)
+        somas = np.zeros((n_grupos, X.shape[1]), dtype=np.float64)
+        avisado = False
+        for inicio in range(0, X.shape[0], linhas_bloco):
+            if not avisado and time.perf_counter() > self.prazo:
+                print_status(f"Aviso: prazo do agrupamento excedido na atribuição ({inicio} de {X.shape[0]} linhas atribuídas).")
+                avisado = True
+            X_bloco = X[inicio:inicio + linhas_bloco]
+            rotulos_bloco = modelo.predict(X_bloco)
+            rotulos[inicio:inicio + len(rotulos_bloco)] = rotulos_bloco
+            somas += (self._indicador(rotulos_bloco, n_grupos) @ X_bloco).toarray()
+        return rotulos, somas
+
 # =============================================================================
 # Função para Planejamento de Crescimento
 # =============================================================================
 
-def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atual, crescimento_mensal, meses_planejamento, palavras_por_mes, objective, cidades_brasil):
+@medir_desempenho
+def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atual, crescimento_mensal, meses_planejamento, palavras_por_mes, objective, indice_cidades, ctr_rates=CTR_POR_POSICAO, armazem_tfidf=None, palavras_normalizadas=None):
     print_status("Criando a planilha 'Planejamento de Crescimento.xlsx'...")
     output_path = os.path.join(folder_name, "Planejamento de Crescimento.xlsx")
 
-    ctr_rates = {
-        1: (0.25, 0.35), 2: (0.15, 0.20), 3: (0.10, 0.15), 4: (0.07, 0.10), 5: (0.05, 0.07),
-        6: (0.04, 0.06), 7: (0.03, 0.05), 8: (0.02, 0.04), 9: (0.02, 0.03), 10: (0.01, 0.02)
-    }
-
     crescimento_absoluto = volume_atual * (crescimento_mensal / 100)
     acessos_alvo = volume_atual + crescimento_absoluto
-    volume_min_por_palavra = crescimento_absoluto / (palavras_por_mes * ctr_rates[10][0])
-    volume_max_por_palavra = crescimento_absoluto / (palavras_por_mes * ctr_rates[1][1])
+    volume_min_por_palavra = crescimento_absoluto / (palavras_por_mes * ctr_rates[max(ctr_rates)][0])
+    volume_max_por_palavra = crescimento_absoluto / (palavras_por_mes * ctr_rates[min(ctr_rates)][1])
 
     dados_calculo = [
         ["Volume Atual (mensal)", volume_atual],
@@ -338,16 +1403,22 @@ def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atu
         palavras_df = palavras_df[palavras_df["Objetivo"] == objetivo_selecionado]
 
     palavras_df["Keyword"] = palavras_df["Keyword"].fillna("").astype(str)
-
-    # Filtro de cidades menos restritivo (apenas palavras exatas de cidades)
-    palavras_df = palavras_df[~palavras_df["Keyword"].str.lower().apply(
-        lambda x: any(cidade in x.split() for cidade in cidades_brasil)
-    )]
-
-    print_status(f"Linhas após filtro de cidades: {len(palavras_df)}")
+    if palavras_normalizadas is None:
+        palavras_normalizadas = PalavrasNormalizadas(palavras_df["Keyword"])
+
+    # Filtro de cidades por tokens exatos (inclui nomes compostos e ignora acentos)
+    cidade_encontrada = pd.Series(
+        [encontrar_cidade(tokens, indice_cidades) for tokens in palavras_normalizadas.tokens_por_linha(palavras_df)],
+        index=palavras_df.index, dtype=object,
+    )
+    palavras_cidades = palavras_df[cidade_encontrada.notna()].copy()
+    palavras_cidades["Cidade"] = cidade_encontrada[cidade_encontrada.notna()]
+    palavras_df = palavras_df[cidade_encontrada.isna()]
+
+    print_status(f"Linhas após filtro de cidades: {len(palavras_df)} ({len(palavras_cidades)} excluídas por cidade)")
     if palavras_df.empty:
         print_status("Aviso: O DataFrame está vazio após o filtro de cidades!")
-        return None, None, None, None, None, None, None, None
+        return None
 
     volume_col = None
     for col in palavras_df.columns:
@@ -356,7 +1427,7 @@ def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atu
             break
     if not volume_col:
         print_status("Erro: Nenhuma coluna de volume encontrada no DataFrame!")
-        return None, None, None, None, None, None, None, None
+        return None
 
     sort_columns = [volume_col]
     if "Competitive Density" in palavras_df.columns:
@@ -379,7 +1450,7 @@ def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atu
         meses.append(mes_df)
 
     # Segmentação por comprimento
-    palavras_df["Comprimento"] = palavras_df["Keyword"].apply(lambda x: len(str(x).strip().split()))
+    palavras_df["Comprimento"] = palavras_normalizadas.contagem(palavras_df)
     cauda_curta = palavras_df[palavras_df["Comprimento"] <= 2][colunas_selecao]
     cauda_media = palavras_df[palavras_df["Comprimento"] == 3][colunas_selecao]
     cauda_longa = palavras_df[palavras_df["Comprimento"] >= 4][colunas_selecao]
@@ -388,12 +1459,12 @@ def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atu
     total_grupos = max(2, palavras_por_mes // 2)  # Garantir pelo menos 2 grupos
     total_palavras_semantico = min(len(palavras_df), total_grupos * 20)  # Aumentar para 20 por grupo
     palavras_semantico = palavras_df.head(total_palavras_semantico).copy()  # Criar uma cópia explícita
-    if len(palavras_semantico) >= 10:
-        vectorizer = TfidfVectorizer(max_features=5000, stop_words=None)
-        X = vectorizer.fit_transform(palavras_semantico["Keyword"])
-        kmeans = KMeans(n_clusters=total_grupos, n_init=10, random_state=42)  # Adicionar n_init=10
-        palavras_semantico["Grupo Semântico"] = kmeans.fit_predict(X).astype(str)  # Usar atribuição direta
-        palavras_semantico["Grupo Semântico"] = "Grupo_" + palavras_semantico["Grupo Semântico"]
+    if not AGRUPAMENTO_SEMANTICO:
+        palavras_semantico["Grupo Semântico"] = "Sem Grupo (agrupamento desativado)"
+    elif len(palavras_semantico) >= 10:
+        armazem = armazem_tfidf if armazem_tfidf is not None else ArmazemTfidf(palavras_normalizadas.textos(palavras_semantico))
+        rotulos, _ = MotorAgrupamento().agrupar(armazem.linhas(palavras_semantico), armazem.nomes, n_grupos=total_grupos)
+        palavras_semantico["Grupo Semântico"] = "Grupo_" + rotulos.astype(str)
     else:
         palavras_semantico["Grupo Semântico"] = "Sem Grupo (poucas palavras)"
     colunas_semantico = ["Grupo Semântico"] + colunas_selecao
@@ -404,88 +1475,35 @@ def criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atu
         print_status("Aviso: Nenhuma palavra informacional encontrada para blog!")
 
     # Criação da planilha
-    wb = Workbook()
+    wb = Workbook(write_only=True)
+
+    escrever_aba(wb, "Calculo de Crescimento", calculo_df)
+
+    if meses:
+        selecao_df = pd.concat([mes_df.assign(**{"Mês": f"Mês {i}"}) for i, mes_df in enumerate(meses, 1)])
+    else:
+        selecao_df = pd.DataFrame(columns=["Mês"] + colunas_selecao)
+    escrever_aba(wb, "Selecao de Palavras", selecao_df[["Mês"] + colunas_selecao], volume_col)
+
+    escrever_aba(wb, "Cauda Curta", cauda_curta, volume_col)
+    escrever_aba(wb, "Cauda Media", cauda_media, volume_col)
+    escrever_aba(wb, "Cauda Longa", cauda_longa, volume_col)
+    escrever_aba(wb, "Grupos Semanticos", palavras_semantico[colunas_semantico], volume_col)
+    escrever_aba(wb, "Palavras para Blog", palavras_blog, volume_col)
 
-    ws_calculo = wb.active
-    ws_calculo.title = "Calculo de Crescimento"
-    for r in dataframe_to_rows(calculo_df, index=False, header=True):
-        ws_calculo.append(r)
-    apply_header_style(ws_calculo)
-    apply_content_style(ws_calculo)
-    adjust_column_width(ws_calculo)
-
-    ws_selecao = wb.create_sheet("Selecao de Palavras")
-    headers = ["Mês"] + colunas_selecao
-    ws_selecao.append(headers)
-    for i, mes_df in enumerate(meses, 1):
-        for idx, row in mes_df.iterrows():
-            ws_selecao.append([f"Mês {i}"] + row.tolist())
-    volume_col_index = get_column_index(ws_selecao, volume_col)
-    if volume_col_index and not palavras_selecionadas[volume_col].dropna().empty:
-        apply_heatmap(ws_selecao, volume_col_index, palavras_selecionadas[volume_col])
-    apply_header_style(ws_selecao)
-    apply_content_style(ws_selecao)
-    adjust_column_width(ws_selecao)
-
-    ws_curta = wb.create_sheet("Cauda Curta")
-    for r in dataframe_to_rows(cauda_curta, index=False, header=True):
-        ws_curta.append(r)
-    volume_col_index = get_column_index(ws_curta, volume_col)
-    if volume_col_index and not cauda_curta[volume_col].dropna().empty:
-        apply_heatmap(ws_curta, volume_col_index, cauda_curta[volume_col])
-    apply_header_style(ws_curta)
-    apply_content_style(ws_curta)
-    adjust_column_width(ws_curta)
-
-    ws_media = wb.create_sheet("Cauda Media")
-    for r in dataframe_to_rows(cauda_media, index=False, header=True):
-        ws_media.append(r)
-    volume_col_index = get_column_index(ws_media, volume_col)
-    if volume_col_index and not cauda_media[volume_col].dropna().empty:
-        apply_heatmap(ws_media, volume_col_index, cauda_media[volume_col])
-    apply_header_style(ws_media)
-    apply_content_style(ws_media)
-    adjust_column_width(ws_media)
-
-    ws_longa = wb.create_sheet("Cauda Longa")
-    for r in dataframe_to_rows(cauda_longa, index=False, header=True):
-        ws_longa.append(r)
-    volume_col_index = get_column_index(ws_longa, volume_col)
-    if volume_col_index and not cauda_longa[volume_col].dropna().empty:
-        apply_heatmap(ws_longa, volume_col_index, cauda_longa[volume_col])
-    apply_header_style(ws_longa)
-    apply_content_style(ws_longa)
-    adjust_column_width(ws_longa)
-
-    ws_semantico = wb.create_sheet("Grupos Semanticos")
-    for r in dataframe_to_rows(palavras_semantico[colunas_semantico], index=False, header=True):
-        ws_semantico.append(r)
-    volume_col_index = get_column_index(ws_semantico, volume_col)
-    if volume_col_index and not palavras_semantico[volume_col].dropna().empty:
-        apply_heatmap(ws_semantico, volume_col_index, palavras_semantico[volume_col])
-    apply_header_style(ws_semantico)
-    apply_content_style(ws_semantico)
-    adjust_column_width(ws_semantico)
-
-    ws_blog = wb.create_sheet("Palavras para Blog")
-    for r in dataframe_to_rows(palavras_blog, index=False, header=True):
-        ws_blog.append(r)
-    volume_col_index = get_column_index(ws_blog, volume_col)
-    if volume_col_index and not palavras_blog[volume_col].dropna().empty:
-        apply_heatmap(ws_blog, volume_col_index, palavras_blog[volume_col])
-    apply_header_style(ws_blog)
-    apply_content_style(ws_blog)
-    adjust_column_width(ws_blog)
-
-    wb.save(output_path)
+    palavras_cidades = palavras_cidades.sort_values(by=volume_col, ascending=False)
+    escrever_aba(wb, "Excluidas por Cidade", palavras_cidades[["Cidade"] + colunas_selecao], volume_col)
+
+    wb.save(registrar_saida(output_path))
     print_status("Planilha 'Planejamento de Crescimento.xlsx' criada com sucesso!")
-    return calculo_df, palavras_selecionadas, cauda_curta, cauda_media, cauda_longa, palavras_semantico, palavras_blog, meses, colunas_selecao
+    return calculo_df, palavras_selecionadas, cauda_curta, cauda_media, cauda_longa, palavras_semantico, palavras_blog, meses, colunas_selecao, palavras_cidades
 
 # =============================================================================
 # Função para Top 100 Palavras-Chave por Tipo
 # =============================================================================
 
-def criar_planilha_top_palavras_por_tipo(folder_name, combined_df):
+@medir_desempenho
+def criar_planilha_top_palavras_por_tipo(folder_name, combined_df, armazem_tfidf=None):
     print_status("Criando a planilha 'Top 100 Palavras por Tipo.xlsx'...")
 
     # Identificar a coluna de volume dinamicamente
@@ -502,7 +1520,7 @@ def criar_planilha_top_palavras_por_tipo(folder_name, combined_df):
     combined_df["Keyword"] = combined_df["Keyword"].fillna("").astype(str)
 
     # Filtrar palavras com volume válido
-    df_valid = combined_df[combined_df[volume_col].notna() & (combined_df[volume_col] > 0)].copy().reset_index(drop=True)
+    df_valid = combined_df[combined_df[volume_col].notna() & (combined_df[volume_col] > 0)].copy()
     if len(df_valid) < 1:
         print_status("Erro: Nenhuma palavra com volume válido encontrada!")
         return None
@@ -524,24 +1542,21 @@ def criar_planilha_top_palavras_por_tipo(folder_name, combined_df):
                 # Garantir que o nome do tipo tenha menos de 31 caracteres (limite do Excel)
                 tipo_name = str(tipo)[:31]
                 top_palavras[tipo_name] = tipo_df.head(100)[["Keyword", volume_col, "Intent"]]
+    elif not AGRUPAMENTO_SEMANTICO:
+        print_status("Nenhuma coluna de tipo encontrada e agrupamento desativado. Agrupando todas em 'Geral'...")
+        top_palavras["Geral"] = df_valid.sort_values(by=volume_col, ascending=False).head(100)[["Keyword", volume_col, "Intent"]]
     else:
         # Fallback: usar clustering TF-IDF se não houver coluna de tipo
         print_status("Nenhuma coluna de tipo encontrada. Usando clustering automático como fallback...")
         if len(df_valid) >= 10:
-            vectorizer = TfidfVectorizer(max_features=5000, stop_words=None)
-            X = vectorizer.fit_transform(df_valid["Keyword"])
-            feature_names = vectorizer.get_feature_names_out()
-            n_clusters = min(10, max(2, len(df_valid) // 100))
-            kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=42)
-            df_valid["Cluster"] = kmeans.fit_predict(X)
-
-            for cluster_id in range(n_clusters):
+            max_grupos = min(10, max(2, len(df_valid) // 100))
+            armazem = armazem_tfidf if armazem_tfidf is not None else ArmazemTfidf(PalavrasNormalizadas(df_valid["Keyword"]).textos(df_valid))
+            rotulos, termos = MotorAgrupamento().agrupar(armazem.linhas(df_valid), armazem.nomes, max_grupos=max_grupos)
+            df_valid["Cluster"] = rotulos
+
+            for cluster_id, top_terms in enumerate(termos):
                 cluster_df = df_valid[df_valid["Cluster"] == cluster_id].sort_values(by=volume_col, ascending=False)
                 if not cluster_df.empty:
-                    cluster_indices = df_valid.index[df_valid["Cluster"] == cluster_id].tolist()
-                    cluster_tfidf = X[cluster_indices].mean(axis=0).A1
-                    top_indices = cluster_tfidf.argsort()[-2:][::-1]
-                    top_terms = [feature_names[idx] for idx in top_indices]
                     cluster_name = " ".join(top_terms).capitalize()[:31]
                     if cluster_name in top_palavras:
                         cluster_name = f"{cluster_name} {cluster_id}"[:31]
@@ -551,29 +1566,113 @@ def criar_planilha_top_palavras_por_tipo(folder_name, combined_df):
             top_palavras["Geral"] = df_valid.sort_values(by=volume_col, ascending=False).head(100)[["Keyword", volume_col, "Intent"]]
 
     # Criar a planilha com os grupos
-    wb = Workbook()
+    wb = Workbook(write_only=True)
     for tipo, df in top_palavras.items():
-        ws = wb.create_sheet(tipo)  # Nome da aba será o tipo identificado
-        for r in dataframe_to_rows(df, index=False, header=True):
-            ws.append(r)
-        volume_col_index = get_column_index(ws, volume_col)
-        if volume_col_index and not df[volume_col].dropna().empty:
-            apply_heatmap(ws, volume_col_index, df[volume_col])
-        apply_header_style(ws)
-        apply_content_style(ws)
-        adjust_column_width(ws)
-
-    if "Sheet" in wb.sheetnames:
-        wb.remove(wb["Sheet"])
-
-    wb.save(os.path.join(folder_name, "Top 100 Palavras por Tipo.xlsx"))
+        escrever_aba(wb, tipo, df, volume_col)  # Nome da aba será o tipo identificado
+
+    wb.save(registrar_saida(os.path.join(folder_name, "Top 100 Palavras por Tipo.xlsx")))
     print_status("Planilha 'Top 100 Palavras por Tipo.xlsx' criada com sucesso!")
     return top_palavras
 # =============================================================================
 # Função para Palavras para Ads Filtradas (com KW Negativas Excluídas)
 # =============================================================================
 
-def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df):
+# Lista de palavras negativas fornecida
+KW_NEGATIVAS = [
+    "joguinho", "jogar", "reclamação", "reclamacoes", "reclamaçao", "reclamaçoes", "reclamação", "reclamações",
+    "problema", "problemas", "tragedia", "olx", "tragedias", "tragédia", "reclameaqui", "acidente", "acidentes",
+    "devolucao", "devolucoes", "devoluçao", "devoluçoes", "devolução", "devoluções", "falso", "falsos",
+    "falsificado", "falsificados", "gratis", "grátis", "gratuito", "gratuitos", "de graça", "proibido",
+    "proibidos", "paraguay", "paraguai", "download", "baixar", "receita", "receitas", "ilegal", "quero ver",
+    "o que é", "destilaria", "testosterona", "mal", "mau", "vaga", "vagas", "emprego", "empregos",
+    "agência de empregos", "agência de emprego", "agencia de emprego", "agencie de empregos", "quanto ganha",
+    "curriculo", "currículo", "agência de empregos", "oferta de emprego", "mercadolivre", "mercado livre",
+    "acompanhantes", "afundar", "afundou", "aids", "boate", "crime", "drogas", "escravo", "hospital",
+    "incêndio", "incendio", "miséria", "naufragio", "naufrágio", "naufrágios", "pobreza", "pornô", "hentai",
+    "pdf", "pornozão", "pornografia", "prostituição", "sexo", "sexual", "sexy", "torrent", "violência",
+    "xvideos", "x videos", "airbnb", "tragédias", "jogo", "jogos", "defeito", "defeitos", "free", "game",
+    "games", "joguinhos", "VX case", "lente de contato", "wallpaper", "papel de parede", "Sailor", "Ramen",
+    "pior", "queixa", "fraude", "escândalo", "negativo", "lei", "legal", "legislação", "regra", "regulação",
+    "regulamento", "faq", "termos", "condições", "perguntas frequentes", "politica de privacidade", "ajuda",
+    "condições de venda", "guia de tamanhos", "estorno", "rejeição", "email", "garantia", "manual", "recolha",
+    "reembolso", "substituir", "substituição", "rma", "apoio", "amostras", "leilão", "passatempo", "revenda",
+    "segunda mão", "usado", "pode", "como", "o que", "quando", "onde", "quem", "porque", "carreira", "estágio",
+    "trabalho", "trabalhar", "recursos humanos", "gestor rh", "recrutamento", "cv", "freelancer", "aulas",
+    "cursos", "formação", "escola", "treino", "universidade", "faculdade", "especialização", "graduação",
+    "mestrado", "doutorado", "associação", "jornal", "revista", "métricas", "notícias", "investigação",
+    "review", "opinião", "estatísticas", "histórias", "tutorial", "definição", "significado", "sobre",
+    "relatorios", "especificações", "behance", "facebook", "flickr", "instagram", "linkedin", "meetup",
+    "messenger", "pinterest", "reddit", "snapchat", "soundcloud", "telegram", "tiktok", "tumblr", "twitter",
+    "vimeo", "valor", "salário", "média salarial", "o q é", "dói", "doi", "dor", "doer", "insuportável",
+    "quanto", "o que faz", "como faz", "como é", "apresentação", "presencial", "nome para", "quanto fatura",
+    "dá dinheiro", "oq faz", "0800", "de graca", "graça", "gratiz", "grátiz", "gratuita", "sem", "sem custo",
+    "sem pagar", "gratúitos", "gratúitas", "gratuítos", "gratuítas", "o que e", "oq e", "o q e", "pdf.",
+    "proposta comercial", "modelo", "frase", "frases", "foto", "fotos", "imagem", "imagens", "fotografia",
+    "fotografias", "vídeo", "video", "vídeos", "videos", "dica", "dicas", "antes", "depois", "antes e depois",
+    "www", "digulgação", "divulgacao", "divulgaçao", "divulgacão", "Custo zero", "Download gratuito",
+    "Versão gratuita", "Trial gratuito", "Demonstração gratuita", "Teste grátis", "Experimente grátis",
+    "Experimentar grátis", "catho", "cathu", "cato", "catu", "Consultora comercial", "Consultora de vendas",
+    "Consultores", "contratação", "curriculu", "curriculum", "curriculun", "entrevista", "estagios",
+    "estágios", "infojob", "infojobs", "jovem aprendis", "jovem aprendiz", "labuta", "Lista", "manager",
+    "ocupação", "oportunidade", "rio vagas", "riovagas", "Salario", "Salário", "Sandra mara", "sandramara",
+    "serviço", "servisso", "Telemarketing", "vitae", "Contrata", "Trabalhe", "Trabalhe conosco", "servico",
+    "Ganha", "Conosco", "Contratar", "auxiliar", "diretor", "supervisor", "gerente", "função", "funções",
+    "cargo", "cargos"
+]
+
+def _regex_de_trie(no):
+    # Cada nó é um dict {caractere: filho}; a chave "" marca o fim de um termo
+    fim = "" in no
+    ramos = [re.escape(c) + _regex_de_trie(filho) for c, filho in sorted(no.items()) if c != ""]
+    if not ramos:
+        return ""
+    if len(ramos) == 1 and not fim:
+        return ramos[0]
+    corpo = "(?:" + "|".join(ramos) + ")"
+    return corpo + "?" if fim else corpo
+
+def _montar_trie(termos):
+    trie = {}
+    for termo in termos:
+        no = trie
+        for c in termo:
+            no = no.setdefault(c, {})
+        no[""] = {}
+    return trie
+
+def compilar_matcher_negativas(termos):
+    """Compila os termos negativos em uma única regex montada a partir de uma trie.
+
+    Os ramos da trie são disjuntos pelo primeiro caractere, então a regex percorre
+    cada palavra-chave uma única vez em vez de testar termo a termo. Em cada posição
+    o termo mais longo vence ("antes e depois" antes de "antes").
+    """
+    trie = _montar_trie({" ".join(normalizar_texto(t).split()) for t in termos if str(t).strip()})
+    return re.compile(_regex_de_trie(trie))
+
+def aplicar_matcher_negativas(textos, matcher):
+    """Retorna (máscara, termo) para uma Series de palavras já normalizadas.
+
+    A máscara indica as palavras que contêm algum termo negativo e `termo` traz o
+    primeiro termo encontrado em cada uma (NaN quando não há correspondência).
+    Termos e palavras são comparados sem acento.
+    """
+    termo = textos.str.extract(f"({matcher.pattern})", expand=False)
+    return termo.notna(), termo
+
+@functools.lru_cache(maxsize=1)
+def negativas_compiladas():
+    """Matcher da lista KW_NEGATIVAS e a grafia de cada termo, montados uma vez por processo.
+
+    O termo encontrado vem sem acento; a planilha mostra a primeira grafia da lista.
+    """
+    grafia_negativas = {}
+    for termo in KW_NEGATIVAS:
+        grafia_negativas.setdefault(" ".join(normalizar_texto(termo).split()), str(termo).strip().lower())
+    return compilar_matcher_negativas(KW_NEGATIVAS), grafia_negativas
+
+@medir_desempenho
+def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df, textos_normalizados=None):
     print_status("Criando a planilha 'Palavras para Ads Filtradas.xlsx'...")
 
     # Identificar a coluna de volume
@@ -586,51 +1685,8 @@ def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df):
         print_status("Erro: Nenhuma coluna de volume encontrada no DataFrame!")
         return None, None
 
-    # Lista de palavras negativas fornecida
-    kw_negativas = [
-        "joguinho", "jogar", "reclamação", "reclamacoes", "reclamaçao", "reclamaçoes", "reclamação", "reclamações",
-        "problema", "problemas", "tragedia", "olx", "tragedias", "tragédia", "reclameaqui", "acidente", "acidentes",
-        "devolucao", "devolucoes", "devoluçao", "devoluçoes", "devolução", "devoluções", "falso", "falsos",
-        "falsificado", "falsificados", "gratis", "grátis", "gratuito", "gratuitos", "de graça", "proibido",
-        "proibidos", "paraguay", "paraguai", "download", "baixar", "receita", "receitas", "ilegal", "quero ver",
-        "o que é", "destilaria", "testosterona", "mal", "mau", "vaga", "vagas", "emprego", "empregos",
-        "agência de empregos", "agência de emprego", "agencia de emprego", "agencie de empregos", "quanto ganha",
-        "curriculo", "currículo", "agência de empregos", "oferta de emprego", "mercadolivre", "mercado livre",
-        "acompanhantes", "afundar", "afundou", "aids", "boate", "crime", "drogas", "escravo", "hospital",
-        "incêndio", "incendio", "miséria", "naufragio", "naufrágio", "naufrágios", "pobreza", "pornô", "hentai",
-        "pdf", "pornozão", "pornografia", "prostituição", "sexo", "sexual", "sexy", "torrent", "violência",
-        "xvideos", "x videos", "airbnb", "tragédias", "jogo", "jogos", "defeito", "defeitos", "free", "game",
-        "games", "joguinhos", "VX case", "lente de contato", "wallpaper", "papel de parede", "Sailor", "Ramen",
-        "pior", "queixa", "fraude", "escândalo", "negativo", "lei", "legal", "legislação", "regra", "regulação",
-        "regulamento", "faq", "termos", "condições", "perguntas frequentes", "politica de privacidade", "ajuda",
-        "condições de venda", "guia de tamanhos", "estorno", "rejeição", "email", "garantia", "manual", "recolha",
-        "reembolso", "substituir", "substituição", "rma", "apoio", "amostras", "leilão", "passatempo", "revenda",
-        "segunda mão", "usado", "pode", "como", "o que", "quando", "onde", "quem", "porque", "carreira", "estágio",
-        "trabalho", "trabalhar", "recursos humanos", "gestor rh", "recrutamento", "cv", "freelancer", "aulas",
-        "cursos", "formação", "escola", "treino", "universidade", "faculdade", "especialização", "graduação",
-        "mestrado", "doutorado", "associação", "jornal", "revista", "métricas", "notícias", "investigação",
-        "review", "opinião", "estatísticas", "histórias", "tutorial", "definição", "significado", "sobre",
-        "relatorios", "especificações", "behance", "facebook", "flickr", "instagram", "linkedin", "meetup",
-        "messenger", "pinterest", "reddit", "snapchat", "soundcloud", "telegram", "tiktok", "tumblr", "twitter",
-        "vimeo", "valor", "salário", "média salarial", "o q é", "dói", "doi", "dor", "doer", "insuportável",
-        "quanto", "o que faz", "como faz", "como é", "apresentação", "presencial", "nome para", "quanto fatura",
-        "dá dinheiro", "oq faz", "0800", "de graca", "graça", "gratiz", "grátiz", "gratuita", "sem", "sem custo",
-        "sem pagar", "gratúitos", "gratúitas", "gratuítos", "gratuítas", "o que e", "oq e", "o q e", "pdf.",
-        "proposta comercial", "modelo", "frase", "frases", "foto", "fotos", "imagem", "imagens", "fotografia",
-        "fotografias", "vídeo", "video", "vídeos", "videos", "dica", "dicas", "antes", "depois", "antes e depois",
-        "www", "digulgação", "divulgacao", "divulgaçao", "divulgacão", "Custo zero", "Download gratuito",
-        "Versão gratuita", "Trial gratuito", "Demonstração gratuita", "Teste grátis", "Experimente grátis",
-        "Experimentar grátis", "catho", "cathu", "cato", "catu", "Consultora comercial", "Consultora de vendas",
-        "Consultores", "contratação", "curriculu", "curriculum", "curriculun", "entrevista", "estagios",
-        "estágios", "infojob", "infojobs", "jovem aprendis", "jovem aprendiz", "labuta", "Lista", "manager",
-        "ocupação", "oportunidade", "rio vagas", "riovagas", "Salario", "Salário", "Sandra mara", "sandramara",
-        "serviço", "servisso", "Telemarketing", "vitae", "Contrata", "Trabalhe", "Trabalhe conosco", "servico",
-        "Ganha", "Conosco", "Contratar", "auxiliar", "diretor", "supervisor", "gerente", "função", "funções",
-        "cargo", "cargos"
-    ]
-    # Remover duplicatas da lista
-    kw_negativas = list(set(kw_negativas))
-    print_status(f"{len(kw_negativas)} palavras negativas carregadas da lista interna")
+    matcher_negativas, grafia_negativas = negativas_compiladas()
+    print_status(f"{len(set(KW_NEGATIVAS))} palavras negativas carregadas da lista interna")
 
     # Garantir que "Keyword" seja string e tratar valores nulos
     combined_df["Keyword"] = combined_df["Keyword"].fillna("").astype(str)
@@ -638,15 +1694,17 @@ def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df):
     # Criar uma cópia do DataFrame original para trabalhar
     df_inicial = combined_df.copy()
 
+    # Uma única passada marca as palavras com termos negativos e guarda o termo encontrado
+    if textos_normalizados is None:
+        textos_normalizados = PalavrasNormalizadas(df_inicial["Keyword"]).textos(df_inicial)
+    mascara_negativas, termo_negativo = aplicar_matcher_negativas(textos_normalizados, matcher_negativas)
+    df_inicial["Termo Negativo"] = termo_negativo.map(grafia_negativas)
+
     # Filtrar palavras que NÃO contenham termos negativos (Palavras Filtradas)
-    palavras_ads_filtradas = df_inicial[~df_inicial["Keyword"].str.lower().apply(
-        lambda x: any(negativa in x.lower() for negativa in kw_negativas)
-    )]
+    palavras_ads_filtradas = df_inicial[~mascara_negativas]
 
     # Identificar palavras excluídas da lista inicial que CONTENHAM termos negativos
-    palavras_excluidas = df_inicial[df_inicial["Keyword"].str.lower().apply(
-        lambda x: any(negativa in x.lower() for negativa in kw_negativas)
-    )]
+    palavras_excluidas = df_inicial[mascara_negativas]
 
     print_status(f"Palavras filtradas (não contêm negativas): {len(palavras_ads_filtradas)}")
     print_status(f"Palavras excluídas negativadas (excluídas da lista inicial): {len(palavras_excluidas)}")
@@ -659,7 +1717,7 @@ def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df):
     # Se não houver palavras excluídas, criar DataFrame vazio
     if palavras_excluidas.empty:
         print_status("Aviso: Nenhuma palavra excluída encontrada na lista inicial!")
-        palavras_excluidas = pd.DataFrame(columns=["Keyword", volume_col, "Intent", "SERP Features"])
+        palavras_excluidas = pd.DataFrame(columns=["Keyword", volume_col, "Intent", "SERP Features", "Termo Negativo"])
 
     # Ordenar por volume (se disponível)
     if volume_col in palavras_ads_filtradas.columns and not palavras_ads_filtradas[volume_col].dropna().empty:
@@ -676,34 +1734,17 @@ def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df):
     colunas_selecao = ["Keyword", volume_col, "Intent", "SERP Features"] if volume_col else ["Keyword", "Intent", "SERP Features"]
 
     # Criar a planilha com duas abas
-    wb = Workbook()
+    wb = Workbook(write_only=True)
 
     # Aba 1: Palavras Filtradas
-    ws_filtradas = wb.active
-    ws_filtradas.title = "Palavras Filtradas"
-    for r in dataframe_to_rows(palavras_ads_filtradas[colunas_selecao], index=False, header=True):
-        ws_filtradas.append(r)
-    volume_col_index = get_column_index(ws_filtradas, volume_col) if volume_col else None
-    if volume_col_index and not palavras_ads_filtradas[volume_col].dropna().empty:
-        apply_heatmap(ws_filtradas, volume_col_index, palavras_ads_filtradas[volume_col])
-    apply_header_style(ws_filtradas)
-    apply_content_style(ws_filtradas)
-    adjust_column_width(ws_filtradas)
+    escrever_aba(wb, "Palavras Filtradas", palavras_ads_filtradas[colunas_selecao], volume_col)
 
     # Aba 2: Palavras Excluídas Negativadas
-    ws_excluidas = wb.create_sheet("Palavras Excluidas Negativadas")
-    for r in dataframe_to_rows(palavras_excluidas[colunas_selecao], index=False, header=True):
-        ws_excluidas.append(r)
-    volume_col_index = get_column_index(ws_excluidas, volume_col) if volume_col else None
-    if volume_col_index and not palavras_excluidas[volume_col].dropna().empty:
-        apply_heatmap(ws_excluidas, volume_col_index, palavras_excluidas[volume_col])
-    apply_header_style(ws_excluidas)
-    apply_content_style(ws_excluidas)
-    adjust_column_width(ws_excluidas)
+    escrever_aba(wb, "Palavras Excluidas Negativadas", palavras_excluidas[colunas_selecao + ["Termo Negativo"]], volume_col)
 
     # Salvar a planilha
     output_path = os.path.join(folder_name, "Palavras para Ads Filtradas.xlsx")
-    wb.save(output_path)
+    wb.save(registrar_saida(output_path))
     print_status("Planilha 'Palavras para Ads Filtradas.xlsx' criada com sucesso!")
     return palavras_ads_filtradas, palavras_excluidas
 
@@ -711,8 +1752,12 @@ def criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df):
 # Função para Criar Dashboard Profissional
 # =============================================================================
 
+@medir_desempenho
 def criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_counts, jornada_counts, ctr_export_df, estrategia_df, calculo_df, meses, volume_col, objective, now, ctr_rates):
     print_status("Criando Dashboard Profissional no Excel...")
+    if GERAR_GRAFICOS:
+        from openpyxl.chart import BarChart, PieChart, LineChart, Reference
+        from openpyxl.chart.label import DataLabelList
 
     wb = Workbook()
     ws = wb.active
@@ -765,15 +1810,16 @@ def criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_c
     ws['A11'].font = Font(bold=True)
     ws['B11'].font = Font(bold=True)
 
-    pie = PieChart()
-    labels = Reference(ws, min_col=1, min_row=12, max_row=15)
-    data = Reference(ws, min_col=2, min_row=11, max_row=15)
-    pie.add_data(data, titles_from_data=True)
-    pie.set_categories(labels)
-    pie.title = "Distribuição por Intenção"
-    pie.dataLabels = DataLabelList()
-    pie.dataLabels.showPercent = True
-    ws.add_chart(pie, "D10")
+    if GERAR_GRAFICOS:
+        pie = PieChart()
+        labels = Reference(ws, min_col=1, min_row=12, max_row=15)
+        data = Reference(ws, min_col=2, min_row=11, max_row=15)
+        pie.add_data(data, titles_from_data=True)
+        pie.set_categories(labels)
+        pie.title = "Distribuição por Intenção"
+        pie.dataLabels = DataLabelList()
+        pie.dataLabels.showPercent = True
+        ws.add_chart(pie, "D10")
 
     # --- Seção 3: Principais Recursos de SERP ---
     ws['A20'] = "Principais Recursos de SERP"
@@ -789,13 +1835,14 @@ def criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_c
     ws['A21'].font = Font(bold=True)
     ws['B21'].font = Font(bold=True)
 
-    bar = BarChart()
-    data = Reference(ws, min_col=2, min_row=21, max_row=26)
-    cats = Reference(ws, min_col=1, min_row=22, max_row=26)
-    bar.add_data(data, titles_from_data=True)
-    bar.set_categories(cats)
-    bar.title = "Top 5 Recursos de SERP"
-    ws.add_chart(bar, "D20")
+    if GERAR_GRAFICOS:
+        bar = BarChart()
+        data = Reference(ws, min_col=2, min_row=21, max_row=26)
+        cats = Reference(ws, min_col=1, min_row=22, max_row=26)
+        bar.add_data(data, titles_from_data=True)
+        bar.set_categories(cats)
+        bar.title = "Top 5 Recursos de SERP"
+        ws.add_chart(bar, "D20")
 
     # --- Seção 4: Jornada do Cliente ---
     ws['A30'] = "Distribuição por Jornada"
@@ -811,15 +1858,16 @@ def criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_c
     ws['A31'].font = Font(bold=True)
     ws['B31'].font = Font(bold=True)
 
-    pie_jornada = PieChart()
-    labels_j = Reference(ws, min_col=1, min_row=32, max_row=35)
-    data_j = Reference(ws, min_col=2, min_row=31, max_row=35)
-    pie_jornada.add_data(data_j, titles_from_data=True)
-    pie_jornada.set_categories(labels_j)
-    pie_jornada.title = "Distribuição por Jornada"
-    pie_jornada.dataLabels = DataLabelList()
-    pie_jornada.dataLabels.showPercent = True
-    ws.add_chart(pie_jornada, "D30")
+    if GERAR_GRAFICOS:
+        pie_jornada = PieChart()
+        labels_j = Reference(ws, min_col=1, min_row=32, max_row=35)
+        data_j = Reference(ws, min_col=2, min_row=31, max_row=35)
+        pie_jornada.add_data(data_j, titles_from_data=True)
+        pie_jornada.set_categories(labels_j)
+        pie_jornada.title = "Distribuição por Jornada"
+        pie_jornada.dataLabels = DataLabelList()
+        pie_jornada.dataLabels.showPercent = True
+        ws.add_chart(pie_jornada, "D30")
 
     # --- Seção 5: CTR por Posição ---
     ws['A40'] = "CTR por Posição (Exemplo)"
@@ -829,25 +1877,25 @@ def criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_c
         exemplo = ctr_export_df.iloc[0]
         ws['A41'] = f"Palavra: {exemplo['Keyword']}"
         ws.append(["Posição", "Cliques Mínimos", "Cliques Máximos"])
-        for pos, (min_rate, max_rate) in ctr_rates.items():
-            min_max = exemplo[f'Posicao {pos} ({int(min_rate*100)}%-{int(max_rate*100)}%)'].split('-')
-            ws.append([f"Posição {pos}", int(min_max[0]), int(min_max[1])])
-        for row in range(41, 53):
+        for pos in ctr_rates:
+            ws.append([f"Posição {pos}", int(exemplo[f'Posicao {pos} Min']), int(exemplo[f'Posicao {pos} Max'])])
+        for row in range(41, 43 + len(ctr_rates)):
             for col in ['A', 'B', 'C']:
                 ws[f'{col}{row}'].border = thin_border
         ws['A42'].font = Font(bold=True)
         ws['B42'].font = Font(bold=True)
         ws['C42'].font = Font(bold=True)
 
-        line = LineChart()
-        data_c = Reference(ws, min_col=2, min_row=42, max_col=3, max_row=52)
-        cats_c = Reference(ws, min_col=1, min_row=43, max_row=52)
-        line.add_data(data_c, titles_from_data=True)
-        line.set_categories(cats_c)
-        line.title = f"CTR para '{exemplo['Keyword']}'"
-        line.y_axis.title = "Cliques"
-        line.x_axis.title = "Posição"
-        ws.add_chart(line, "D40")
+        if GERAR_GRAFICOS:
+            line = LineChart()
+            data_c = Reference(ws, min_col=2, min_row=42, max_col=3, max_row=42 + len(ctr_rates))
+            cats_c = Reference(ws, min_col=1, min_row=43, max_row=42 + len(ctr_rates))
+            line.add_data(data_c, titles_from_data=True)
+            line.set_categories(cats_c)
+            line.title = f"CTR para '{exemplo['Keyword']}'"
+            line.y_axis.title = "Cliques"
+            line.x_axis.title = "Posição"
+            ws.add_chart(line, "D40")
 
     # --- Seção 6: Estratégia por Objetivo ---
     ws['A55'] = "Estratégia por Objetivo (Top 5)"
@@ -879,86 +1927,141 @@ def criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_c
     ws['A66'].font = Font(bold=True)
     ws['B66'].font = Font(bold=True)
 
-    line_c = LineChart()
-    data_c = Reference(ws, min_col=2, min_row=66, max_row=66 + meses_planejamento)
-    cats_c = Reference(ws, min_col=1, min_row=67, max_row=66 + meses_planejamento)
-    line_c.add_data(data_c, titles_from_data=True)
-    line_c.set_categories(cats_c)
-    line_c.title = "Projeção de Crescimento"
-    line_c.y_axis.title = "Acessos Mensais"
-    line_c.x_axis.title = "Meses"
-    ws.add_chart(line_c, "D65")
+    if GERAR_GRAFICOS:
+        line_c = LineChart()
+        data_c = Reference(ws, min_col=2, min_row=66, max_row=66 + meses_planejamento)
+        cats_c = Reference(ws, min_col=1, min_row=67, max_row=66 + meses_planejamento)
+        line_c.add_data(data_c, titles_from_data=True)
+        line_c.set_categories(cats_c)
+        line_c.title = "Projeção de Crescimento"
+        line_c.y_axis.title = "Acessos Mensais"
+        line_c.x_axis.title = "Meses"
+        ws.add_chart(line_c, "D65")
 
-    # Ajustar largura das colunas
-    adjust_column_width(ws)
+    # Ajustar largura das colunas (o título já está nas células, então o cabeçalho fica vazio)
+    aplicar_larguras_colunas(ws, pd.DataFrame(list(ws.values), columns=[""] * ws.max_column, dtype=object))
 
     # Salvar o dashboard
-    wb.save(os.path.join(folder_name, "Dashboard.xlsx"))
+    wb.save(registrar_saida(os.path.join(folder_name, "Dashboard.xlsx")))
     print_status("Dashboard.xlsx gerado com sucesso!")
     
-def criar_planilha_entidades_e_knowledge(folder_name, combined_df):
-    print_status("Criando a planilha 'Entidades e Knowledge.xlsx'...")
+# =============================================================================
+# Classificação de Entidades
+# =============================================================================
 
-    # Encontrar a coluna de volume (ex.: "Volume" ou "Search Volume")
-    volume_col = None
-    for col in combined_df.columns:
-        if "volume" in col.lower():
-            volume_col = col
-            break
+# Entidades em ordem de prioridade: cada palavra-chave vai para a primeira
+# entidade com algum termo contido nela, ou para "Other" se nenhuma casar.
+# Pode ser substituído por um JSON {"Entidade": ["termo", ...]} (ver
+# ENTIDADES_ARQUIVO); a ordem das chaves no arquivo é a prioridade.
+ENTIDADES = {
+    "Person": ["pessoa", "autor", "escritor", "ator", "presidente", "ceo"],
+    "Organization": ["empresa", "organização", "instituição", "startup"],
+    "Location": ["cidade", "estado", "país", "região"],
+    "Event": ["evento", "festival", "conferência", "jogo"],
+    "Work of Art": ["livro", "filme", "música", "arte"],
+    "Product": ["produto", "serviço", "software", "app"],
+    "Consumer Goods": ["roupa", "eletrônico", "gadget"],
+    "Other": [],  # Para palavras que não encaixam em nada
+    "Date": ["data", "ano", "mês", "dia"],
+    "Number": ["número", "quantidade", "total"],
+    "Address": ["endereço", "rua", "avenida", "cep"],
+    "Phone Number": ["telefone", "celular", "contato"],
+    "Brand": ["marca", "fabricante", "logo"],
+    "Species": ["animal", "planta", "espécie"],
+    "Language": ["idioma", "língua", "dialeto"],
+    "Disease": ["doença", "vírus", "sintoma"],
+    "Historical Period": ["era", "século", "história"],
+    "Movie": ["filme", "cinema", "série"],
+    "Book": ["livro", "revista", "publicação"],
+    "Song": ["música", "canção", "álbum"],
+    "Sports Team": ["time", "equipe", "clube"],
+    "Government Organization": ["governo", "ministério", "agência"]
+}
+ENTIDADE_PADRAO = "Other"
+ENTIDADES_ARQUIVO = os.environ.get("ANALISE_KW_ENTIDADES", "entidades.json")
+
+def carregar_entidades(caminho=ENTIDADES_ARQUIVO):
+    """Lê o dicionário de entidades do JSON, se existir; senão usa ENTIDADES."""
+    if not caminho or not os.path.exists(caminho):
+        return ENTIDADES
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            entidades = json.load(arquivo)
+    except (OSError, ValueError) as e:
+        print_status(f"Erro ao ler o arquivo de entidades '{caminho}': {str(e)}")
+        raise
+    if not isinstance(entidades, dict) or not all(isinstance(t, list) for t in entidades.values()):
+        raise ValueError(f"'{caminho}' deve conter um objeto {{\"Entidade\": [\"termo\", ...]}}")
+    print_status(f"Dicionário de entidades carregado de '{caminho}' ({len(entidades)} entidades).")
+    return entidades
+
+class ClassificadorEntidades:
+    """Classifica palavras-chave em entidades por busca de substring.
+
+    Cada termo distinto fica com a menor prioridade entre as entidades que o
+    listam, e todos vão para uma única regex montada a partir de uma trie
+    (como em `compilar_matcher_negativas`), dentro de um lookahead para que
+    ocorrências sobrepostas também sejam vistas. Na classificação, as
+    palavras-chave são unidas num único buffer separado por NUL e percorridas
+    uma única vez; as ocorrências viram índices de linha por busca binária
+    nos offsets e cada linha fica com a entidade de menor prioridade.
+    """
+
+    def __init__(self, entidades):
+        self.entidades = list(entidades)
+        if ENTIDADE_PADRAO not in self.entidades:
+            self.entidades.append(ENTIDADE_PADRAO)
+        prioridades = {}
+        for prioridade, (entidade, termos) in enumerate(entidades.items()):
+            if entidade == ENTIDADE_PADRAO:
+                continue
+            for termo in termos:
+                termo = " ".join(normalizar_texto(termo).split())
+                if termo:
+                    prioridades.setdefault(termo, prioridade)
+        # Em cada posição a regex devolve só o termo mais longo; os mais curtos
+        # que começam ali são prefixos dele, então a prioridade de cada termo
+        # já inclui a dos seus prefixos.
+        self.prioridades = {
+            termo: min(prioridades.get(termo[:fim], prioridade) for fim in range(1, len(termo) + 1))
+            for termo, prioridade in prioridades.items()
+        }
+        self.regex = re.compile(f"(?=({_regex_de_trie(_montar_trie(prioridades))}))") if prioridades else None
+
+    def classificar(self, textos):
+        """Retorna {entidade: posições (iloc) das palavras, em ordem}.
+
+        `textos` são as palavras já normalizadas (`PalavrasNormalizadas.textos`).
+        """
+        textos = list(textos)
+        padrao = self.entidades.index(ENTIDADE_PADRAO)
+        prioridade_linha = np.full(len(textos), padrao, dtype=np.intp)
+        if textos and self.regex is not None:
+            inicios = np.cumsum([0] + [len(t) + 1 for t in textos[:-1]])
+            buffer = "\0".join(textos)
+            ocorrencias = [(m.start(), self.prioridades[m.group(1)]) for m in self.regex.finditer(buffer)]
+            if ocorrencias:
+                posicoes, prioridades = zip(*ocorrencias)
+                sem_termo = len(self.entidades)
+                melhor = np.full(len(textos), sem_termo, dtype=np.intp)
+                linhas = np.searchsorted(inicios, posicoes, side="right") - 1
+                np.minimum.at(melhor, linhas, prioridades)
+                prioridade_linha = np.where(melhor < sem_termo, melhor, padrao)
+        return {entidade: np.flatnonzero(prioridade_linha == i) for i, entidade in enumerate(self.entidades)}
+
+def _colunas_entidade(combined_df, volume_col):
+    return [c for c in ["Keyword", volume_col, "Intent", "SERP Features"] if c and c in combined_df.columns]
+
+@medir_desempenho
+def criar_planilha_entidades_e_knowledge(folder_name, combined_df, palavras_por_entidade, volume_col):
+    print_status("Criando a planilha 'Entidades e Knowledge.xlsx'...")
     if not volume_col:
         print_status("Erro: Não achei uma coluna de volume!")
         return None
 
-    # Garantir que a coluna "Keyword" não tenha valores vazios
-    combined_df["Keyword"] = combined_df["Keyword"].fillna("").astype(str)
-
-    # Lista de entidades com palavras-chave relacionadas
-    entidades = {
-        "Person": ["pessoa", "autor", "escritor", "ator", "presidente", "ceo"],
-        "Organization": ["empresa", "organização", "instituição", "startup"],
-        "Location": ["cidade", "estado", "país", "região"],
-        "Event": ["evento", "festival", "conferência", "jogo"],
-        "Work of Art": ["livro", "filme", "música", "arte"],
-        "Product": ["produto", "serviço", "software", "app"],
-        "Consumer Goods": ["roupa", "eletrônico", "gadget"],
-        "Other": [],  # Para palavras que não encaixam em nada
-        "Date": ["data", "ano", "mês", "dia"],
-        "Number": ["número", "quantidade", "total"],
-        "Address": ["endereço", "rua", "avenida", "cep"],
-        "Phone Number": ["telefone", "celular", "contato"],
-        "Brand": ["marca", "fabricante", "logo"],
-        "Species": ["animal", "planta", "espécie"],
-        "Language": ["idioma", "língua", "dialeto"],
-        "Disease": ["doença", "vírus", "sintoma"],
-        "Historical Period": ["era", "século", "história"],
-        "Movie": ["filme", "cinema", "série"],
-        "Book": ["livro", "revista", "publicação"],
-        "Song": ["música", "canção", "álbum"],
-        "Sports Team": ["time", "equipe", "clube"],
-        "Government Organization": ["governo", "ministério", "agência"]
-    }
-
-    # Criar um dicionário para guardar as palavras de cada entidade
-    palavras_por_entidade = {entidade: [] for entidade in entidades}
-
-    # Dividir as palavras entre as entidades
-    for index, row in combined_df.iterrows():
-        keyword = row["Keyword"].lower()
-        achou = False
-        for entidade, palavras_chave in entidades.items():
-            if entidade == "Other":
-                continue
-            if any(palavra in keyword for palavra in palavras_chave):
-                palavras_por_entidade[entidade].append(row)
-                achou = True
-                break
-        if not achou:
-            palavras_por_entidade["Other"].append(row)
-
     # Criar a planilha
-    wb = Workbook()
-    ws_dashboard = wb.active
-    ws_dashboard.title = "Dashboard"
+    wb = Workbook(write_only=True)
+    ws_dashboard = wb.create_sheet("Dashboard")
 
     # --- Fazendo o Dashboard ---
     # Estilos simples
@@ -966,749 +2069,1101 @@ def criar_planilha_entidades_e_knowledge(folder_name, combined_df):
     fundo_cabecalho = PatternFill(start_color="000066", end_color="000066", fill_type="solid")
     fundo_secao = PatternFill(start_color="E6F0FA", end_color="E6F0FA", fill_type="solid")
 
-    # Título do Dashboard
-    ws_dashboard['A1'] = "Dashboard de Entidades e Knowledge"
-    ws_dashboard['A1'].font = Font(size=16, bold=True, color="FFFFFF")
-    ws_dashboard['A1'].fill = fundo_cabecalho
-    ws_dashboard.merge_cells('A1:F1')
-    ws_dashboard['A1'].alignment = Alignment(horizontal="center")
-
-    # Resumo Geral
-    ws_dashboard['A3'] = "Resumo Geral"
-    ws_dashboard['A3'].font = Font(size=14, bold=True)
-    ws_dashboard['A3'].fill = fundo_secao
+    def celula(valor, **estilo):
+        cell = WriteOnlyCell(ws_dashboard, value=valor)
+        for atributo, valor_estilo in estilo.items():
+            setattr(cell, atributo, valor_estilo)
+        return cell
+
     resumo = [
         ["Total de Palavras", len(combined_df)],
-        ["Entidades com Palavras", len([e for e in palavras_por_entidade if palavras_por_entidade[e]])],
+        ["Entidades com Palavras", len([e for e in palavras_por_entidade if len(palavras_por_entidade[e])])],
         ["Volume Total", combined_df[volume_col].sum()]
     ]
-    for i, (nome, valor) in enumerate(resumo, start=4):
-        ws_dashboard[f'A{i}'] = nome
-        ws_dashboard[f'B{i}'] = valor
-        ws_dashboard[f'A{i}'].font = Font(bold=True)
-        ws_dashboard[f'B{i}'].alignment = Alignment(horizontal="center")
-        ws_dashboard[f'A{i}'].border = borda
-        ws_dashboard[f'B{i}'].border = borda
-
-    # Tabela de Distribuição por Entidade
-    ws_dashboard['A8'] = "Quantidade por Entidade"
-    ws_dashboard['A8'].font = Font(size=14, bold=True)
-    ws_dashboard['A8'].fill = fundo_secao
-    ws_dashboard.append(["Entidade", "Quantidade"])
-    linha = 10
-    for entidade, linhas in palavras_por_entidade.items():
-        if linhas:
-            ws_dashboard.append([entidade, len(linhas)])
-            ws_dashboard[f'A{linha}'].border = borda
-            ws_dashboard[f'B{linha}'].border = borda
-            linha += 1
-    ws_dashboard['A9'].font = Font(bold=True)
-    ws_dashboard['B9'].font = Font(bold=True)
+    contagens = [(entidade, len(linhas)) for entidade, linhas in palavras_por_entidade.items() if len(linhas)]
+
+    # As linhas são montadas em ordem porque a aba é gravada em fluxo
+    linhas_dashboard = [
+        [celula("Dashboard de Entidades e Knowledge", font=Font(size=16, bold=True, color="FFFFFF"),
+                fill=fundo_cabecalho, alignment=Alignment(horizontal="center"))],
+        [],
+        [celula("Resumo Geral", font=Font(size=14, bold=True), fill=fundo_secao)],
+    ]
+    for nome, valor in resumo:
+        linhas_dashboard.append([celula(nome, font=Font(bold=True), border=borda),
+                                 celula(valor, alignment=Alignment(horizontal="center"), border=borda)])
+    linhas_dashboard += [
+        [],
+        [celula("Quantidade por Entidade", font=Font(size=14, bold=True), fill=fundo_secao)],
+        [celula("Entidade", font=Font(bold=True)), celula("Quantidade", font=Font(bold=True))],
+    ]
+    for entidade, quantidade in contagens:
+        linhas_dashboard.append([celula(entidade, border=borda), celula(quantidade, border=borda)])
+
+    for col_idx in range(1, 3):
+        max_length = max((len(str(linha[col_idx - 1].value)) for linha in linhas_dashboard if len(linha) >= col_idx), default=0)
+        ws_dashboard.column_dimensions[get_column_letter(col_idx)].width = max_length + 2
+    ws_dashboard.merged_cells.add("A1:F1")
+    for linha in linhas_dashboard:
+        ws_dashboard.append(linha)
 
     # Gráfico de Pizza Simples
-    pie = PieChart()
-    labels = Reference(ws_dashboard, min_col=1, min_row=10, max_row=linha-1)
-    data = Reference(ws_dashboard, min_col=2, min_row=9, max_row=linha-1)
-    pie.add_data(data, titles_from_data=True)
-    pie.set_categories(labels)
-    pie.title = "Distribuição por Entidade"
-    pie.dataLabels = DataLabelList()
-    pie.dataLabels.showPercent = True
-    ws_dashboard.add_chart(pie, "D8")
-
-    apply_header_style(ws_dashboard)
-    apply_content_style(ws_dashboard)
-    adjust_column_width(ws_dashboard)
+    linha = 10 + len(contagens)
+    if GERAR_GRAFICOS:
+        from openpyxl.chart import PieChart, Reference
+        from openpyxl.chart.label import DataLabelList
+        pie = PieChart()
+        labels = Reference(ws_dashboard, min_col=1, min_row=10, max_row=linha-1)
+        data = Reference(ws_dashboard, min_col=2, min_row=9, max_row=linha-1)
+        pie.add_data(data, titles_from_data=True)
+        pie.set_categories(labels)
+        pie.title = "Distribuição por Entidade"
+        pie.dataLabels = DataLabelList()
+        pie.dataLabels.showPercent = True
+        ws_dashboard.add_chart(pie, "D8")
 
     # --- Abas para Cada Entidade ---
-    for entidade, linhas in palavras_por_entidade.items():
-        if not linhas:
+    for entidade, posicoes in palavras_por_entidade.items():
+        if not len(posicoes):
             continue
-        entidade_df = pd.DataFrame(linhas)
-        ws = wb.create_sheet(entidade[:31])  # Nome curto por causa do limite do Excel
-        colunas = ["Keyword", volume_col, "Intent", "SERP Features"]
-        entidade_df = entidade_df[colunas].sort_values(by=volume_col, ascending=False)
-        for r in dataframe_to_rows(entidade_df, index=False, header=True):
-            ws.append(r)
-        volume_col_index = get_column_index(ws, volume_col)
-        if volume_col_index and not entidade_df[volume_col].dropna().empty:
-            apply_heatmap(ws, volume_col_index, entidade_df[volume_col])
-        apply_header_style(ws)
-        apply_content_style(ws)
-        adjust_column_width(ws)
+        entidade_df = combined_df.take(posicoes)[_colunas_entidade(combined_df, volume_col)].sort_values(by=volume_col, ascending=False)
+        escrever_aba(wb, entidade[:31], entidade_df, volume_col)  # Nome curto por causa do limite do Excel
 
     # Salvar a planilha
     caminho = os.path.join(folder_name, "Entidades e Knowledge.xlsx")
-    wb.save(caminho)
+    wb.save(registrar_saida(caminho))
     print_status("Planilha 'Entidades e Knowledge.xlsx' criada com sucesso!")
     return palavras_por_entidade
-    
-    # Encontrar a coluna de volume (ex.: "Volume" ou "Search Volume")
-    volume_col = None
-    for col in combined_df.columns:
-        if "volume" in col.lower():
-            volume_col = col
-            break
-    if not volume_col:
-        print_status("Erro: Não achei uma coluna de volume!")
-        return None
 
-    # Garantir que a coluna "Keyword" não tenha valores vazios
-    combined_df["Keyword"] = combined_df["Keyword"].fillna("").astype(str)
+@medir_desempenho
+def criar_planilha_palavras_por_entidades(folder_name, combined_df, palavras_por_entidade, volume_col):
+    print_status("Criando a planilha 'Palavras por Entidades.xlsx'...")
+    wb = Workbook(write_only=True)
 
-    # Lista de entidades com palavras-chave relacionadas
-    entidades = {
-        "Person": ["pessoa", "autor", "escritor", "ator", "presidente", "ceo"],
-        "Organization": ["empresa", "organização", "instituição", "startup"],
-        "Location": ["cidade", "estado", "país", "região"],
-        "Event": ["evento", "festival", "conferência", "jogo"],
-        "Work of Art": ["livro", "filme", "música", "arte"],
-        "Product": ["produto", "serviço", "software", "app"],
-        "Consumer Goods": ["roupa", "eletrônico", "gadget"],
-        "Other": [],  # Para palavras que não encaixam em nada
-        "Date": ["data", "ano", "mês", "dia"],
-        "Number": ["número", "quantidade", "total"],
-        "Address": ["endereço", "rua", "avenida", "cep"],
-        "Phone Number": ["telefone", "celular", "contato"],
-        "Brand": ["marca", "fabricante", "logo"],
-        "Species": ["animal", "planta", "espécie"],
-        "Language": ["idioma", "língua", "dialeto"],
-        "Disease": ["doença", "vírus", "sintoma"],
-        "Historical Period": ["era", "século", "história"],
-        "Movie": ["filme", "cinema", "série"],
-        "Book": ["livro", "revista", "publicação"],
-        "Song": ["música", "canção", "álbum"],
-        "Sports Team": ["time", "equipe", "clube"],
-        "Government Organization": ["governo", "ministério", "agência"]
-    }
+    # Para cada entidade, criar uma aba
+    for entidade, posicoes in palavras_por_entidade.items():
+        if not len(posicoes):  # Pular se não houver palavras para a entidade
+            continue
+        entidade_df = combined_df.take(posicoes)[_colunas_entidade(combined_df, volume_col)]
+        entidade_df = entidade_df.sort_values(by=volume_col, ascending=False) if volume_col else entidade_df.sort_values(by="Keyword")
+        escrever_aba(wb, entidade[:31], entidade_df, volume_col)  # Limitar a 31 caracteres (limite do Excel)
 
-    # Criar um dicionário para guardar as palavras de cada entidade
-    palavras_por_entidade = {entidade: [] for entidade in entidades}
+    # Salvar a planilha
+    output_path = os.path.join(folder_name, "Palavras por Entidades.xlsx")
+    wb.save(registrar_saida(output_path))
+    print_status("Planilha 'Palavras por Entidades.xlsx' criada com sucesso!")
+    return palavras_por_entidade
 
-    # Dividir as palavras entre as entidades
-    for index, row in combined_df.iterrows():
-        keyword = row["Keyword"].lower()
-        achou = False
-        for entidade, palavras_chave in entidades.items():
-            if entidade == "Other":
-                continue
-            if any(palavra in keyword for palavra in palavras_chave):
-                palavras_por_entidade[entidade].append(row)
-                achou = True
-                break
-        if not achou:
-            palavras_por_entidade["Other"].append(row)
+def criar_relatorios_de_entidades(folder_name, combined_df, volume_col, classificador, textos_normalizados=None):
+    """Classifica uma vez e gera os dois relatórios de entidades a partir do resultado."""
+    if textos_normalizados is None:
+        textos_normalizados = PalavrasNormalizadas(combined_df["Keyword"]).textos(combined_df)
+    classificacao = classificador.classificar(textos_normalizados)
+    criar_planilha_entidades_e_knowledge(folder_name, combined_df, classificacao, volume_col)
+    criar_planilha_palavras_por_entidades(folder_name, combined_df, classificacao, volume_col)
+    return {entidade: len(posicoes) for entidade, posicoes in classificacao.items()}
 
-    # Criar a planilha
-    wb = Workbook()
-    ws_dashboard = wb.active
-    ws_dashboard.title = "Dashboard"
+# =============================================================================
+# Cache de Planilhas de Entrada
+# =============================================================================
 
-    # --- Fazendo o Dashboard ---
-    # Estilos simples
-    borda = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-    fundo_cabecalho = PatternFill(start_color="000066", end_color="000066", fill_type="solid")
-    fundo_secao = PatternFill(start_color="E6F0FA", end_color="E6F0FA", fill_type="solid")
+# As planilhas lidas são guardadas em Feather (Arrow IPC sem compressão, lido
+# por memory-map) e endereçadas pelo hash do conteúdo. Um arquivo de referência
+# por caminho+tamanho+mtime evita recalcular o hash de arquivos inalterados.
+CACHE_DIR = os.environ.get("ANALISE_KW_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "analise_kw"))
+CACHE_ATIVO = os.environ.get("ANALISE_KW_SEM_CACHE", "") not in ("1", "true", "sim")
+CACHE_LIMPAR = os.environ.get("ANALISE_KW_LIMPAR_CACHE", "") in ("1", "true", "sim")
+CACHE_IDADE_MAXIMA_DIAS = 30
+CACHE_TAMANHO_MAXIMO_MB = 2048
+CACHE_VERSAO = f"1-{pd.__version__}"
+
+def _hash_arquivo(caminho):
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def _gravar_atomico(destino, gravar):
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    try:
+        gravar(temporario)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def _gravar_texto(destino, texto):
+    with open(destino, "w", encoding="utf-8") as arquivo:
+        arquivo.write(texto)
+
+def _gravar_binario(destino, gravar):
+    # save_npz/np.save acrescentam extensão a caminhos; com o arquivo aberto, não.
+    with open(destino, "wb") as arquivo:
+        gravar(arquivo)
+
+def _referencia_hash(caminho):
+    info = os.stat(caminho)
+    chave_stat = f"{os.path.abspath(caminho)}|{info.st_size}|{info.st_mtime_ns}|{CACHE_VERSAO}"
+    return os.path.join(CACHE_DIR, hashlib.blake2b(chave_stat.encode("utf-8"), digest_size=20).hexdigest() + ".ref")
+
+def hash_conteudo_arquivo(caminho):
+    """Hash do conteúdo de um arquivo, sem reler arquivos cuja referência já está no cache."""
+    referencia = _referencia_hash(caminho)
+    if os.path.exists(referencia):
+        with open(referencia, encoding="utf-8") as arquivo:
+            hash_conteudo = arquivo.read().strip()
+        if hash_conteudo:
+            return hash_conteudo
+    return _hash_arquivo(caminho)
+
+def _modulo_feather():
+    """pyarrow.feather, importado só quando o cache é usado; None sem pyarrow."""
+    try:
+        import pyarrow.feather as feather
+    except ImportError:  # cache de entrada desativado
+        return None
+    return feather
+
+def _ler_feather(caminho):
+    # Sem threads do Arrow: os workers dos relatórios são criados por fork depois da leitura
+    return _modulo_feather().read_table(caminho, memory_map=True, use_threads=False).to_pandas(use_threads=False)
+
+def _ler_pickle(caminho):
+    with open(caminho, "rb") as arquivo:
+        return pickle.load(arquivo)
+
+def ler_excel_com_cache(caminho):
+    """Lê uma planilha .xlsx passando pelo cache de entrada quando ele está ativo.
+
+    O cache é gravado em Feather; colunas que o Arrow não aceita (tipos
+    misturados numa coluna de texto) fazem a planilha ir para um pickle.
+    """
+    feather = _modulo_feather() if CACHE_ATIVO else None
+    if feather is None:
+        return pd.read_excel(caminho)
+    referencia = _referencia_hash(caminho)
+    hash_conteudo = hash_conteudo_arquivo(caminho)
+    base = os.path.join(CACHE_DIR, f"{hash_conteudo}-{CACHE_VERSAO}")
+
+    for dados, ler in ((base + ".feather", _ler_feather), (base + ".pkl", _ler_pickle)):
+        if os.path.exists(dados):
+            try:
+                df = ler(dados)
+                os.utime(dados)
+                return df
+            except Exception as e:
+                print_status(f"Aviso: cache inválido para {os.path.basename(caminho)} ({e}); relendo o arquivo.")
 
-    # Título do Dashboard
-    ws_dashboard['A1'] = "Dashboard de Entidades e Knowledge"
-    ws_dashboard['A1'].font = Font(size=16, bold=True, color="FFFFFF")
-    ws_dashboard['A1'].fill = fundo_cabecalho
-    ws_dashboard.merge_cells('A1:F1')
-    ws_dashboard['A1'].alignment = Alignment(horizontal="center")
-
-    # Resumo Geral
-    ws_dashboard['A3'] = "Resumo Geral"
-    ws_dashboard['A3'].font = Font(size=14, bold=True)
-    ws_dashboard['A3'].fill = fundo_secao
-    resumo = [
-        ["Total de Palavras", len(combined_df)],
-        ["Entidades com Palavras", len([e for e in palavras_por_entidade if palavras_por_entidade[e]])],
-        ["Volume Total", combined_df[volume_col].sum()]
-    ]
-    for i, (nome, valor) in enumerate(resumo, start=4):
-        ws_dashboard[f'A{i}'] = nome
-        ws_dashboard[f'B{i}'] = valor
-        ws_dashboard[f'A{i}'].font = Font(bold=True)
-        ws_dashboard[f'B{i}'].alignment = Alignment(horizontal="center")
-        ws_dashboard[f'A{i}'].border = borda
-        ws_dashboard[f'B{i}'].border = borda
-
-    # Tabela de Distribuição por Entidade
-    ws_dashboard['A8'] = "Quantidade por Entidade"
-    ws_dashboard['A8'].font = Font(size=14, bold=True)
-    ws_dashboard['A8'].fill = fundo_secao
-    ws_dashboard.append(["Entidade", "Quantidade"])
-    linha = 10
-    for entidade, linhas in palavras_por_entidade.items():
-        if linhas:
-            ws_dashboard.append([entidade, len(linhas)])
-            ws_dashboard[f'A{linha}'].border = borda
-            ws_dashboard[f'B{linha}'].border = borda
-            linha += 1
-    ws_dashboard['A9'].font = Font(bold=True)
-    ws_dashboard['B9'].font = Font(bold=True)
+    df = pd.read_excel(caminho)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        try:
+            _gravar_atomico(base + ".feather", lambda destino: feather.write_feather(df, destino, compression="uncompressed"))
+        except Exception:
+            _gravar_atomico(base + ".pkl", lambda destino: _gravar_binario(destino, lambda f: pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)))
+        _gravar_atomico(referencia, lambda destino: _gravar_texto(destino, hash_conteudo))
+    except Exception as e:
+        print_status(f"Aviso: não foi possível gravar {os.path.basename(caminho)} no cache: {e}")
+    return df
+
+def preparar_cache(pasta, limpar=False, idade_maxima_dias=CACHE_IDADE_MAXIMA_DIAS, tamanho_maximo_mb=CACHE_TAMANHO_MAXIMO_MB):
+    """Limpa ou reduz o cache (planilhas de entrada e checkpoints das fases):
+    remove entradas antigas e, se ainda passar do tamanho máximo, as menos
+    usadas recentemente."""
+    if not os.path.isdir(pasta):
+        return
+    entradas = []
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        if os.path.isfile(caminho) and nome.endswith((".feather", ".ref", ".npz", ".npy", ".pkl", ".tmp")):
+            info = os.stat(caminho)
+            entradas.append((info.st_mtime, info.st_size, caminho))
+    limite_idade = time.time() - idade_maxima_dias * 86400
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    removidos = 0
+    for mtime, tamanho, caminho in sorted(entradas):
+        if limpar or mtime < limite_idade or total > tamanho_maximo_mb * 1024 * 1024:
+            os.remove(caminho)
+            total -= tamanho
+            removidos += 1
+    if limpar:
+        print_status(f"Cache de entrada limpo: {removidos} arquivo(s) removido(s) de {pasta}")
+    elif removidos:
+        print_status(f"Cache de entrada: {removidos} arquivo(s) antigo(s) removido(s) ({total / 1024 / 1024:.1f} MB em uso)")
 
-    # Gráfico de Pizza Simples
-    pie = PieChart()
-    labels = Reference(ws_dashboard, min_col=1, min_row=10, max_row=linha-1)
-    data = Reference(ws_dashboard, min_col=2, min_row=9, max_row=linha-1)
-    pie.add_data(data, titles_from_data=True)
-    pie.set_categories(labels)
-    pie.title = "Distribuição por Entidade"
-    pie.dataLabels = DataLabelList()
-    pie.dataLabels.showPercent = True
-    ws_dashboard.add_chart(pie, "D8")
-
-    apply_header_style(ws_dashboard)
-    apply_content_style(ws_dashboard)
-    adjust_column_width(ws_dashboard)
+# =============================================================================
+# Agendador de Fases Independentes
+# =============================================================================
 
-    # --- Abas para Cada Entidade ---
-    for entidade, linhas in palavras_por_entidade.items():
-        if not linhas:
-            continue
-        entidade_df = pd.DataFrame(linhas)
-        ws = wb.create_sheet(entidade[:31])  # Nome curto por causa do limite do Excel
-        colunas = ["Keyword", volume_col, "Intent", "SERP Features"]
-        entidade_df = entidade_df[colunas].sort_values(by=volume_col, ascending=False)
-        for r in dataframe_to_rows(entidade_df, index=False, header=True):
-            ws.append(r)
-        volume_col_index = get_column_index(ws, volume_col)
-        if volume_col_index and not entidade_df[volume_col].dropna().empty:
-            apply_heatmap(ws, volume_col_index, entidade_df[volume_col])
-        apply_header_style(ws)
-        apply_content_style(ws)
-        adjust_column_width(ws)
+# Número de processos usados para gerar as planilhas independentes. 0 usa todos
+# os núcleos disponíveis; 1 gera tudo em sequência no processo principal.
+WORKERS_RELATORIOS = int(os.environ.get("ANALISE_KW_WORKERS", "0")) or (os.cpu_count() or 1)
 
-    # Salvar a planilha
-    caminho = os.path.join(folder_name, "Entidades e Knowledge.xlsx")
-    wb.save(caminho)
-    print_status("Planilha 'Entidades e Knowledge.xlsx' criada com sucesso!")
-    return palavras_por_entidade
-    
-    # Nova função movida para cá
-def criar_planilha_palavras_por_entidades(folder_name, combined_df):
-    print_status("Criando a planilha 'Palavras por Entidades.xlsx'...")
+def _criar_pool(workers):
+    """Cria o pool de processos por `fork`, ou devolve None para rodar em sequência.
 
-    # Identificar a coluna de volume dinamicamente
-    volume_col = None
-    for col in combined_df.columns:
-        if "volume" in col.lower():
-            volume_col = col
-            break
-    if not volume_col:
-        print_status("Erro: Nenhuma coluna de volume encontrada no DataFrame!")
-        return None
+    Os workers são criados no primeiro `submit` e herdam, sem cópia, o estado
+    do processo naquele momento. Argumentos de `submit` continuam sendo
+    serializados a cada tarefa; objetos grandes devem ir por
+    `AgendadorFases.compartilhar`.
+    """
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    return None
 
-    # Garantir que "Keyword" seja string e tratar valores nulos
-    combined_df["Keyword"] = combined_df["Keyword"].fillna("").astype(str)
+# Objetos grandes e somente leitura usados pelas tarefas (DataFrames, matriz
+# SERP, TF-IDF, classificador). Ficam aqui antes do fork dos workers, que os
+# herdam por cópia-na-escrita; as tarefas recebem só o nome.
+_COMPARTILHADOS = {}
+
+class Compartilhado:
+    """Referência, por nome, a um objeto registrado com `AgendadorFases.compartilhar`."""
+
+    def __init__(self, nome):
+        self.nome = nome
+
+def _executar_tarefa(funcao, args, descricao=None, conclusao=None, em_worker=False):
+    """Executa uma função de planilha e devolve o resultado com as medições feitas."""
+    args = tuple(_COMPARTILHADOS[a.nome] if isinstance(a, Compartilhado) else a for a in args)
+    if em_worker:
+        DESEMPENHO.clear()
+        _picos_abertos.clear()
+        _medicoes_abertas.clear()
+    fase = None
+    if descricao:
+        fase = ProgressoFase(descricao)
+    resultado = funcao(*args)
+    if fase:
+        dataframes = [a for a in args if isinstance(a, pd.DataFrame)]
+        fase.concluir(conclusao or f"{descricao} concluída", len(dataframes[0]) if dataframes else None)
+    return resultado, (list(DESEMPENHO) if em_worker else [])
+
+class AgendadorFases:
+    """Distribui funções de planilha independentes entre processos.
+
+    Sem `fork` disponível, ou com um único worker, as tarefas rodam em
+    sequência no momento em que são submetidas. Os workers herdam os objetos
+    compartilhados no `fork`, então eles devem ser registrados antes da
+    primeira submissão; compartilhar algo depois disso espera o pool atual
+    terminar antes que o próximo seja criado, para nunca passar de `workers`
+    processos.
+    """
+
+    def __init__(self, workers):
+        self.paralelo = workers > 1 and "fork" in multiprocessing.get_all_start_methods()
+        self.workers = workers if self.paralelo else 1
+        self.executor = None
+        self.nomes = []
+        self.tarefas = {}
+
+    def compartilhar(self, nome, objeto):
+        """Registra `objeto` para as próximas tarefas e retorna a referência a passar nelas."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        _COMPARTILHADOS[nome] = objeto
+        self.nomes.append(nome)
+        return Compartilhado(nome)
+
+    def submeter(self, nome, funcao, *args, descricao=None, conclusao=None):
+        if self.paralelo:
+            if self.executor is None:
+                self.executor = _criar_pool(self.workers)
+            self.tarefas[nome] = self.executor.submit(_executar_tarefa, funcao, args, descricao, conclusao, True)
+        else:
+            self.tarefas[nome] = _executar_tarefa(funcao, args, descricao, conclusao)
 
-    # Lista de entidades combinada (Google Cloud Natural Language API + Knowledge Graph)
-    entidades = {
-        "Person": ["pessoa", "nome", "autor", "escritor", "ator", "presidente", "ceo"],
-        "Organization": ["empresa", "organização", "corporação", "instituição", "startup"],
-        "Location": ["cidade", "estado", "país", "local", "região", "endereço"],
-        "Event": ["evento", "festival", "conferência", "jogo", "competição"],
-        "Work of Art": ["obra", "arte", "livro", "filme", "música", "pintura"],
-        "Product": ["produto", "serviço", "item", "software", "aplicativo"],
-        "Consumer Goods": ["bem", "consumo", "roupa", "eletrônico", "gadget"],
-        "Other": [],  # Coringa, pega o que não se encaixa nas outras
-        "Date": ["data", "ano", "mês", "dia", "época"],
-        "Number": ["número", "quantidade", "total", "contagem"],
-        "Address": ["endereço", "rua", "avenida", "cep", "bairro"],
-        "Phone Number": ["telefone", "celular", "número de telefone", "contato"],
-        "Brand": ["marca", "fabricante", "logo", "empresa"],
-        "Species": ["espécie", "animal", "planta", "raça"],
-        "Language": ["idioma", "língua", "dialeto", "fala"],
-        "Disease": ["doença", "saúde", "vírus", "sintoma"],
-        "Historical Period": ["período", "era", "século", "história"],
-        "Movie": ["filme", "cinema", "documentário", "série"],
-        "Book": ["livro", "publicação", "revista", "autor"],
-        "Song": ["música", "canção", "álbum", "artista"],
-        "Sports Team": ["time", "equipe", "clube", "esporte"],
-        "Government Organization": ["governo", "ministério", "departamento", "agência"]
-    }
+    def registrar(self, nome, resultado):
+        """Inclui um resultado já pronto (ex.: de um checkpoint) sem executar nada."""
+        self.tarefas[nome] = (resultado, [])
 
-    # Criar dicionário para armazenar palavras por entidade
-    palavras_por_entidade = {entidade: [] for entidade in entidades.keys()}
+    def aguardar(self):
+        resultados = {}
+        try:
+            for nome, tarefa in self.tarefas.items():
+                resultado, registros = tarefa if isinstance(tarefa, tuple) else tarefa.result()
+                DESEMPENHO.extend(registros)
+                resultados[nome] = resultado
+        except Exception as e:
+            print_status(f"Erro ao gerar planilha '{nome}': {str(e)}")
+            self.cancelar()
+            raise
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self._liberar()
+        return resultados
+
+    def cancelar(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self._liberar()
+
+    def _liberar(self):
+        for nome in self.nomes:
+            _COMPARTILHADOS.pop(nome, None)
+        self.nomes = []
 
-    # Associar palavras-chave às entidades
-    for idx, row in combined_df.iterrows():
-        keyword = row["Keyword"].lower()
-        matched = False
-        for entidade, termos_relacionados in entidades.items():
-            if entidade == "Other":  # "Other" será preenchido depois
-                continue
-            # Verificar se algum termo relacionado aparece na palavra-chave
-            if any(termo in keyword for termo in termos_relacionados):
-                palavras_por_entidade[entidade].append(row)
-                matched = True
-                break
-        # Se não houver correspondência, vai para "Other"
-        if not matched:
-            palavras_por_entidade["Other"].append(row)
+# =============================================================================
+# Leitura Paralela das Planilhas de Entrada
+# =============================================================================
 
-    # Criar a planilha
-    wb = Workbook()
+WORKERS_LEITURA = int(os.environ.get("ANALISE_KW_WORKERS_LEITURA", "0")) or WORKERS_RELATORIOS
+# O que fazer com arquivos que não puderem ser lidos: "ignorar" segue sem eles,
+# "abortar" interrompe a execução depois de listar todos os arquivos com erro.
+POLITICA_ARQUIVOS_COM_ERRO = os.environ.get("ANALISE_KW_ARQUIVOS_COM_ERRO", "ignorar")
 
-    # Para cada entidade, criar uma aba
-    for entidade, linhas in palavras_por_entidade.items():
-        if not linhas:  # Pular se não houver palavras para a entidade
-            continue
-        entidade_df = pd.DataFrame(linhas)
-        ws = wb.create_sheet(entidade[:31])  # Limitar a 31 caracteres (limite do Excel)
-        colunas_selecao = ["Keyword", volume_col, "Intent", "SERP Features"] if volume_col in entidade_df.columns else ["Keyword", "Intent", "SERP Features"]
-        entidade_df = entidade_df[colunas_selecao].sort_values(by=volume_col, ascending=False) if volume_col in entidade_df.columns else entidade_df[colunas_selecao].sort_values(by="Keyword")
-        
-        for r in dataframe_to_rows(entidade_df, index=False, header=True):
-            ws.append(r)
-        
-        volume_col_index = get_column_index(ws, volume_col) if volume_col in entidade_df.columns else None
-        if volume_col_index and not entidade_df[volume_col].dropna().empty:
-            apply_heatmap(ws, volume_col_index, entidade_df[volume_col])
-        
-        apply_header_style(ws)
-        apply_content_style(ws)
-        adjust_column_width(ws)
+def _ler_planilha_entrada(caminho):
+    try:
+        return ler_excel_com_cache(caminho), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def ler_planilhas_entrada(pasta, arquivos, workers, fase, politica="ignorar"):
+    """Lê as planilhas em paralelo e devolve os DataFrames na ordem dos arquivos.
+
+    Retorna também o dicionário {arquivo: erro} dos arquivos que falharam.
+    """
+    if politica not in ("ignorar", "abortar"):
+        raise ValueError(f"Política de arquivos com erro inválida: {politica}")
+    caminhos = [os.path.join(pasta, filename) for filename in arquivos]
+    executor = _criar_pool(min(workers, len(caminhos)))
+    leituras = executor.map(_ler_planilha_entrada, caminhos) if executor else map(_ler_planilha_entrada, caminhos)
+    dataframes = []
+    erros = {}
+    try:
+        for filename, (df, erro) in zip(arquivos, leituras):
+            if erro:
+                erros[filename] = erro
+                print_status(f"Erro ao ler {filename}: {erro}")
+                fase.avancar(f"Arquivo com erro: {filename}")
+                continue
+            dataframes.append(df)
+            fase.avancar(f"Arquivo lido: {filename}", len(df))
+    finally:
+        if executor:
+            executor.shutdown()
+    if erros:
+        lista = ", ".join(erros)
+        if politica == "abortar":
+            print_status(f"Erro: {len(erros)} arquivo(s) não puderam ser lidos: {lista}")
+            raise ValueError(f"Falha ao ler arquivos de entrada: {lista}")
+        print_status(f"Aviso: {len(erros)} arquivo(s) ignorado(s) por erro de leitura: {lista}")
+    return dataframes, erros
 
-    # Remover a aba padrão "Sheet" se existir
-    if "Sheet" in wb.sheetnames:
-        wb.remove(wb["Sheet"])
+# =============================================================================
+# Deduplicação entre Planilhas de Entrada
+# =============================================================================
 
-    # Salvar a planilha
-    output_path = os.path.join(folder_name, "Palavras por Entidades.xlsx")
-    wb.save(output_path)
-    print_status("Planilha 'Palavras por Entidades.xlsx' criada com sucesso!")
-    return palavras_por_entidade
-    
+# A mesma palavra pode vir de vários exports. As linhas são unidas pela
+# palavra normalizada (minúsculas, sem espaços extras; acentos continuam
+# distinguindo palavras, pois são buscas com volumes próprios). Regras:
+#   volume: "max" (maior volume), "primeiro" (primeira ocorrência) ou "soma"
+#   serp:   "uniao" (todas as features, sem repetição) ou "primeiro"
+# As demais colunas ficam com a primeira ocorrência, na ordem dos arquivos.
+# Com ANALISE_KW_DEDUP=0 (ou --sem-dedup) as repetições são mantidas.
+DEDUPLICAR = os.environ.get("ANALISE_KW_DEDUP", "1") not in ("0", "false", "nao", "não")
+REGRA_DEDUP_VOLUME = os.environ.get("ANALISE_KW_DEDUP_VOLUME", "max")
+REGRA_DEDUP_SERP = os.environ.get("ANALISE_KW_DEDUP_SERP", "uniao")
+
+def _unir_serp_features(valores):
+    features = {}
+    for valor in valores.dropna():
+        for feature in str(valor).split(","):
+            feature = feature.strip()
+            if feature and feature.lower() not in features:
+                features[feature.lower()] = feature
+    return ", ".join(features.values()) if features else np.nan
+
+def deduplicar_palavras(df, volume_col, regra_volume="max", regra_serp="uniao"):
+    """Une as linhas repetidas da mesma palavra-chave.
+
+    Retorna o DataFrame sem repetições (índice 0..n-1, na ordem da primeira
+    ocorrência) e o número de linhas mescladas.
+    """
+    if regra_volume not in ("max", "primeiro", "soma"):
+        raise ValueError(f"Regra de volume inválida: {regra_volume}")
+    if regra_serp not in ("uniao", "primeiro"):
+        raise ValueError(f"Regra de SERP Features inválida: {regra_serp}")
+    chave = df["Keyword"].fillna("").astype(str).str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+    codigos, _ = pd.factorize(chave)
+    repetida = pd.Series(codigos).duplicated(keep=False).to_numpy()
+    if not repetida.any():
+        return df.reset_index(drop=True), 0
+    primeira = ~pd.Series(codigos).duplicated().to_numpy()
+    resultado = df[primeira].reset_index(drop=True)
+    codigos_resultado = codigos[primeira]
+
+    if volume_col and regra_volume != "primeiro":
+        volumes = df[volume_col].groupby(codigos)
+        agregado = volumes.max() if regra_volume == "max" else volumes.sum(min_count=1)
+        resultado[volume_col] = agregado.to_numpy()[codigos_resultado]
+    coluna_serp = encontrar_coluna_serp(df)
+    if coluna_serp and regra_serp == "uniao":
+        # Só os grupos repetidos passam pela união, que é feita em Python.
+        unidas = df.loc[repetida, coluna_serp].groupby(codigos[repetida]).agg(_unir_serp_features)
+        posicoes = np.flatnonzero(repetida[primeira])
+        resultado.loc[posicoes, coluna_serp] = unidas.loc[codigos_resultado[posicoes]].to_numpy()
+    return resultado, len(df) - len(resultado)
 
 # =============================================================================
-# Configuração Inicial e Criação da Pasta de Saída
+# Configuração da Execução (linha de comando e arquivo YAML/JSON)
 # =============================================================================
 
-print_status("Bem-vindo ao Script de Análise de Palavras-Chave para SEO!")
-project_name = input("[PERGUNTA] Qual o nome do projeto? ").strip()
-now = datetime.now()
-folder_name = f"{project_name} {now.strftime('%d-%m-%Y')} {now.strftime('%H')} horas {now.strftime('%M')} minutos {now.strftime('%S')} segundos"
-os.makedirs(folder_name, exist_ok=True)
-print_status(f"Pasta de saída criada: {folder_name}")
+# Tipo de cada parâmetro aceito na linha de comando e no arquivo de
+# configuração. Os valores da linha de comando têm prioridade sobre os do
+# arquivo, que têm prioridade sobre as variáveis de ambiente ANALISE_KW_*.
+# Os parâmetros do projeto que faltarem são perguntados no terminal, a menos
+# que `nao_interativo` esteja ativo.
+PARAMETROS_EXECUCAO = {
+    "projeto": str,
+    "usar_gpt": bool,
+    "objetivo": str,
+    "volume_atual": int,
+    "crescimento_mensal": float,
+    "meses_planejamento": int,
+    "palavras_por_mes": int,
+    "entrada": str,
+    "saida": str,
+    "nao_interativo": bool,
+    "workers": int,
+    "workers_leitura": int,
+    "arquivos_com_erro": str,
+    "cache_dir": str,
+    "sem_cache": bool,
+    "limpar_cache": bool,
+    "curva_ctr": str,
+    "entidades": str,
+    "sem_dedup": bool,
+    "dedup_volume": str,
+    "dedup_serp": str,
+    "variacoes": bool,
+    "sem_variacoes": bool,
+    "agrupamento_segundos": float,
+    "agrupamento_memoria_mb": float,
+    "medir_memoria": bool,
+    "sem_graficos": bool,
+    "sem_relatorio": bool,
+    "sem_agrupamento": bool,
+}
+# Sem estes não há análise; no modo não interativo a ausência é um erro.
+PARAMETROS_OBRIGATORIOS = ["projeto", "objetivo", "volume_atual", "crescimento_mensal", "meses_planejamento", "palavras_por_mes"]
+
+def criar_parser_argumentos():
+    parser = argparse.ArgumentParser(description="Análise de palavras-chave para SEO a partir de exports do Semrush.")
+    parser.add_argument("--config", help="arquivo YAML ou JSON com os parâmetros da execução")
+    parser.add_argument("--lote", help="manifesto YAML ou JSON com vários projetos, executados em sequência ou em paralelo")
+    projeto = parser.add_argument_group("projeto")
+    projeto.add_argument("--projeto", help="nome do projeto (prefixo da pasta de saída)")
+    projeto.add_argument("--usar-gpt", action="store_true", default=None, help="registra o uso da API do ChatGPT")
+    projeto.add_argument("--objetivo", help="1 a 6 ou a descrição do objetivo estratégico")
+    projeto.add_argument("--volume-atual", type=int, help="acessos mensais atuais do site")
+    projeto.add_argument("--crescimento-mensal", type=float, help="crescimento desejado por mês, em %%")
+    projeto.add_argument("--meses-planejamento", type=int, help="duração do planejamento em meses")
+    projeto.add_argument("--palavras-por-mes", type=int, help="palavras-chave trabalhadas por mês")
+    pastas = parser.add_argument_group("pastas")
+    pastas.add_argument("--entrada", help="pasta com os exports .xlsx, 'cidades_brasil.xlsx' e 'kw_negativas.docx' (padrão: pasta atual)")
+    pastas.add_argument("--saida", help="pasta onde a pasta do projeto será criada (padrão: pasta atual)")
+    pastas.add_argument("--nao-interativo", action="store_true", default=None, help="falha em vez de perguntar os parâmetros ausentes")
+    execucao = parser.add_argument_group("execução")
+    execucao.add_argument("--workers", type=int, help="processos para as planilhas independentes, ou projetos simultâneos com --lote (0 = todos os núcleos)")
+    execucao.add_argument("--workers-leitura", type=int, help="processos para ler as planilhas de entrada")
+    execucao.add_argument("--arquivos-com-erro", choices=["ignorar", "abortar"], help="o que fazer com planilhas ilegíveis")
+    execucao.add_argument("--cache-dir", help="pasta do cache de entrada e do TF-IDF")
+    execucao.add_argument("--sem-cache", action="store_true", default=None, help="desativa o cache")
+    execucao.add_argument("--limpar-cache", action="store_true", default=None, help="esvazia o cache antes de começar")
+    execucao.add_argument("--curva-ctr", help="CSV com a curva de CTR por posição")
+    execucao.add_argument("--entidades", help="JSON com os termos de cada entidade")
+    execucao.add_argument("--sem-dedup", action="store_true", default=None, help="mantém as linhas repetidas da mesma palavra-chave")
+    execucao.add_argument("--dedup-volume", choices=["max", "primeiro", "soma"], help="regra de volume para palavras repetidas")
+    execucao.add_argument("--dedup-serp", choices=["uniao", "primeiro"], help="regra de SERP Features para palavras repetidas")
+    execucao.add_argument("--variacoes", action="store_true", default=None, help="agrupa variações da mesma palavra (plural, acento, ordem, digitação)")
+    execucao.add_argument("--sem-variacoes", action="store_true", default=None, help="não agrupa variações da mesma palavra (padrão)")
+    execucao.add_argument("--agrupamento-segundos", type=float, help="orçamento de tempo do agrupamento semântico")
+    execucao.add_argument("--agrupamento-memoria-mb", type=float, help="orçamento de memória do agrupamento semântico")
+    execucao.add_argument("--medir-memoria", action="store_true", default=None, help="registra o pico de memória de cada fase")
+    execucao.add_argument("--sem-graficos", action="store_true", default=None, help="não gera gráficos (nem importa o matplotlib)")
+    execucao.add_argument("--sem-relatorio", action="store_true", default=None, help="não gera o relatório .docx (nem importa o python-docx)")
+    execucao.add_argument("--sem-agrupamento", action="store_true", default=None, help="não faz o agrupamento semântico (nem importa o sklearn)")
+    return parser
+
+def _converter_parametro(chave, valor):
+    tipo = PARAMETROS_EXECUCAO[chave]
+    if tipo is bool and isinstance(valor, str):
+        return valor.strip().lower() in ("1", "true", "sim", "s", "yes")
+    try:
+        return tipo(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Valor inválido para '{chave}' no arquivo de configuração: {valor!r}")
 
-if not os.path.exists("cidades_brasil.xlsx"):
-    print_status("Erro: Arquivo 'cidades_brasil.xlsx' não encontrado!")
-    raise FileNotFoundError("Arquivo 'cidades_brasil.xlsx' necessário")
-if not os.path.exists("kw_negativas.docx"):
-    print_status("Erro: Arquivo 'kw_negativas.docx' não encontrado!")
-    raise FileNotFoundError("Arquivo 'kw_negativas.docx' necessário")
+def _ler_arquivo_dados(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            if caminho.lower().endswith((".yaml", ".yml")):
+                if yaml is None:
+                    raise ValueError("PyYAML não instalado; use um arquivo .json")
+                dados = yaml.safe_load(arquivo) or {}
+            else:
+                dados = json.load(arquivo)
+    except (OSError, ValueError) as e:
+        print_status(f"Erro ao ler o arquivo '{caminho}': {str(e)}")
+        raise
+    return dados
+
+def _validar_parametros(dados, origem):
+    if not isinstance(dados, dict):
+        raise ValueError(f"{origem} deve conter um objeto chave: valor")
+    dados = {str(chave).replace("-", "_"): valor for chave, valor in dados.items()}
+    desconhecidas = sorted(set(dados) - set(PARAMETROS_EXECUCAO))
+    if desconhecidas:
+        raise ValueError(f"Parâmetros desconhecidos em {origem}: {', '.join(desconhecidas)}")
+    return {chave: _converter_parametro(chave, valor) for chave, valor in dados.items() if valor is not None}
+
+def ler_arquivo_configuracao(caminho):
+    """Lê um arquivo .yaml/.yml ou .json com os parâmetros da execução."""
+    return _validar_parametros(_ler_arquivo_dados(caminho), f"o arquivo de configuração '{caminho}'")
+
+def carregar_configuracao(argumentos=None):
+    """Junta arquivo de configuração e linha de comando num único dicionário."""
+    args = criar_parser_argumentos().parse_args(argumentos)
+    configuracao = ler_arquivo_configuracao(args.config) if args.config else {}
+    configuracao.update({chave: valor for chave, valor in vars(args).items() if chave not in ("config", "lote") and valor is not None})
+    if args.lote:
+        # No lote os parâmetros do projeto vêm do manifesto e são validados nele
+        configuracao["lote"] = args.lote
+        return configuracao
+    ausentes = [chave for chave in PARAMETROS_OBRIGATORIOS if chave not in configuracao]
+    if configuracao.get("nao_interativo") and ausentes:
+        print_status(f"Erro: parâmetros obrigatórios ausentes no modo não interativo: {', '.join(ausentes)}")
+        raise ValueError(f"Parâmetros obrigatórios ausentes: {', '.join(ausentes)}")
+    return configuracao
+
+def obter_parametro(configuracao, chave, pergunta, padrao=None):
+    """Valor da configuração ou, se ausente, a resposta do usuário no terminal.
+
+    No modo não interativo, parâmetros opcionais ausentes ficam com `padrao`.
+    """
+    if chave in configuracao:
+        return configuracao[chave]
+    if configuracao.get("nao_interativo"):
+        return padrao
+    return _converter_parametro(chave, input(pergunta))
+
+# Valores das opções na importação do módulo (variáveis ANALISE_KW_*). Cada
+# chamada de `aplicar_opcoes_execucao` parte deles, para que opções de uma
+# execução não passem para a seguinte no mesmo processo.
+_OPCOES_PADRAO = {
+    nome: globals()[nome] for nome in (
+        "WORKERS_RELATORIOS", "POLITICA_ARQUIVOS_COM_ERRO", "CACHE_DIR", "CACHE_ATIVO", "CACHE_LIMPAR",
+        "DEDUPLICAR", "REGRA_DEDUP_VOLUME", "REGRA_DEDUP_SERP", "AGRUPAR_VARIACOES", "AGRUPAMENTO_SEGUNDOS", "AGRUPAMENTO_MEMORIA_MB",
+        "MEDIR_MEMORIA", "GERAR_GRAFICOS", "GERAR_RELATORIO", "AGRUPAMENTO_SEMANTICO",
+    )
+}
 
-use_gpt = input("[PERGUNTA] Deseja conectar à API do ChatGPT para assistência? (s/n): ").lower()
-if use_gpt == 's':
-    print_status("A opção de API foi escolhida, mas este código usará o mapeamento interno para tipologia.")
-objective = input(
-    "[PERGUNTA] Qual o objetivo estratégico da análise?\n"
-    "Opções: 1) Captura de leads, 2) Vendas no e-commerce, 3) Mais acessos, 4) Monetização com Adsense, 5) Branding/Autoridade, 6) Outro\n"
-    "Digite o número ou descreva: "
-)
-volume_atual = int(input("[PERGUNTA] Qual o volume de acessos mensal atual do site? "))
-crescimento_mensal = float(input("[PERGUNTA] Qual o percentual de crescimento desejado por mês? (ex: 10 para 10%): "))
-meses_planejamento = int(input("[PERGUNTA] Quantos meses será o planejamento? "))
-palavras_por_mes = int(input("[PERGUNTA] Quantas palavras-chave serão trabalhadas por mês? "))
+def aplicar_opcoes_execucao(configuracao):
+    """Aplica as opções de execução da configuração às constantes do módulo.
+
+    Opções ausentes na configuração voltam ao valor padrão. As opções valem
+    para o processo inteiro (e para os workers criados por `fork` depois
+    disso); os parâmetros do projeto ficam no `ContextoExecucao`.
+    """
+    global WORKERS_RELATORIOS, WORKERS_LEITURA, POLITICA_ARQUIVOS_COM_ERRO, CACHE_DIR, CACHE_ATIVO, CACHE_LIMPAR
+    global DEDUPLICAR, REGRA_DEDUP_VOLUME, REGRA_DEDUP_SERP, AGRUPAR_VARIACOES, AGRUPAMENTO_SEGUNDOS, AGRUPAMENTO_MEMORIA_MB, MEDIR_MEMORIA
+    global GERAR_GRAFICOS, GERAR_RELATORIO, AGRUPAMENTO_SEMANTICO
+    padrao = _OPCOES_PADRAO
+    WORKERS_RELATORIOS = configuracao.get("workers") or padrao["WORKERS_RELATORIOS"]
+    WORKERS_LEITURA = configuracao.get("workers_leitura") or int(os.environ.get("ANALISE_KW_WORKERS_LEITURA", "0")) or WORKERS_RELATORIOS
+    POLITICA_ARQUIVOS_COM_ERRO = configuracao.get("arquivos_com_erro", padrao["POLITICA_ARQUIVOS_COM_ERRO"])
+    CACHE_DIR = configuracao.get("cache_dir", padrao["CACHE_DIR"])
+    CACHE_ATIVO = padrao["CACHE_ATIVO"] and not configuracao.get("sem_cache")
+    CACHE_LIMPAR = padrao["CACHE_LIMPAR"] or configuracao.get("limpar_cache", False)
+    DEDUPLICAR = padrao["DEDUPLICAR"] and not configuracao.get("sem_dedup")
+    REGRA_DEDUP_VOLUME = configuracao.get("dedup_volume", padrao["REGRA_DEDUP_VOLUME"])
+    REGRA_DEDUP_SERP = configuracao.get("dedup_serp", padrao["REGRA_DEDUP_SERP"])
+    AGRUPAR_VARIACOES = (padrao["AGRUPAR_VARIACOES"] or configuracao.get("variacoes", False)) and not configuracao.get("sem_variacoes")
+    AGRUPAMENTO_SEGUNDOS = configuracao.get("agrupamento_segundos", padrao["AGRUPAMENTO_SEGUNDOS"])
+    AGRUPAMENTO_MEMORIA_MB = configuracao.get("agrupamento_memoria_mb", padrao["AGRUPAMENTO_MEMORIA_MB"])
+    MEDIR_MEMORIA = configuracao.get("medir_memoria", padrao["MEDIR_MEMORIA"])
+    GERAR_GRAFICOS = padrao["GERAR_GRAFICOS"] and not configuracao.get("sem_graficos")
+    GERAR_RELATORIO = padrao["GERAR_RELATORIO"] and not configuracao.get("sem_relatorio")
+    AGRUPAMENTO_SEMANTICO = padrao["AGRUPAMENTO_SEMANTICO"] and not configuracao.get("sem_agrupamento")
 
-folder_path = os.getcwd()
-print_status(f"Usando a pasta atual como fonte das planilhas: {folder_path}")
+# =============================================================================
+# Contexto e Recursos de uma Execução
+# =============================================================================
 
-print_status("Carregando lista de cidades do Brasil do arquivo 'cidades_brasil.xlsx'...")
-cidades_brasil = carregar_cidades_brasil()
-print_status(f"{len(cidades_brasil)} cidades carregadas para exclusão.")
+class ContextoExecucao:
+    """Parâmetros e pastas de uma execução (um projeto).
+
+    Tudo o que muda de um projeto para outro fica aqui; as fases recebem o
+    contexto e os dados explicitamente. Arquivos auxiliares com caminho
+    relativo são procurados na pasta de entrada.
+    """
+
+    def __init__(self, projeto, objetivo, volume_atual, crescimento_mensal, meses_planejamento, palavras_por_mes,
+                 pasta_entrada=None, pasta_saida=None, usar_gpt=False, curva_ctr=None, entidades=None, agora=None,
+                 workers_leitura=None):
+        self.projeto = str(projeto).strip()
+        self.objetivo = str(objetivo)
+        self.volume_atual = volume_atual
+        self.crescimento_mensal = crescimento_mensal
+        self.meses_planejamento = meses_planejamento
+        self.palavras_por_mes = palavras_por_mes
+        self.usar_gpt = usar_gpt
+        # Processos de leitura das planilhas; None usa WORKERS_LEITURA
+        self.workers_leitura = workers_leitura
+        self.pasta_entrada = os.path.abspath(pasta_entrada or os.getcwd())
+        self.pasta_saida = os.path.abspath(pasta_saida or os.getcwd())
+        self.agora = agora or datetime.now()
+        self.pasta = os.path.join(self.pasta_saida, f"{self.projeto} {self.agora.strftime('%d-%m-%Y')} {self.agora.strftime('%H')} horas {self.agora.strftime('%M')} minutos {self.agora.strftime('%S')} segundos")
+        self.caminho_cidades = os.path.join(self.pasta_entrada, "cidades_brasil.xlsx")
+        self.caminho_negativas = os.path.join(self.pasta_entrada, "kw_negativas.docx")
+        self.caminho_curva_ctr = os.path.join(self.pasta_entrada, curva_ctr or CURVA_CTR_ARQUIVO)
+        self.caminho_entidades = os.path.join(self.pasta_entrada, entidades or ENTIDADES_ARQUIVO)
+
+    @property
+    def data(self):
+        return self.agora.strftime('%d-%m-%Y %H:%M:%S')
+
+    @classmethod
+    def da_configuracao(cls, configuracao):
+        """Monta o contexto, perguntando no terminal o que a configuração não trouxer."""
+        projeto = obter_parametro(configuracao, "projeto", "[PERGUNTA] Qual o nome do projeto? ")
+        agora = datetime.now()
+        usar_gpt = obter_parametro(configuracao, "usar_gpt", "[PERGUNTA] Deseja conectar à API do ChatGPT para assistência? (s/n): ", padrao=False)
+        if usar_gpt:
+            print_status("A opção de API foi escolhida, mas este código usará o mapeamento interno para tipologia.")
+        objetivo = obter_parametro(
+            configuracao, "objetivo",
+            "[PERGUNTA] Qual o objetivo estratégico da análise?\n"
+            "Opções: 1) Captura de leads, 2) Vendas no e-commerce, 3) Mais acessos, 4) Monetização com Adsense, 5) Branding/Autoridade, 6) Outro\n"
+            "Digite o número ou descreva: "
+        )
+        volume_atual = obter_parametro(configuracao, "volume_atual", "[PERGUNTA] Qual o volume de acessos mensal atual do site? ")
+        crescimento_mensal = obter_parametro(configuracao, "crescimento_mensal", "[PERGUNTA] Qual o percentual de crescimento desejado por mês? (ex: 10 para 10%): ")
+        meses_planejamento = obter_parametro(configuracao, "meses_planejamento", "[PERGUNTA] Quantos meses será o planejamento? ")
+        palavras_por_mes = obter_parametro(configuracao, "palavras_por_mes", "[PERGUNTA] Quantas palavras-chave serão trabalhadas por mês? ")
+        return cls(
+            projeto, objetivo, volume_atual, crescimento_mensal, meses_planejamento, palavras_por_mes,
+            pasta_entrada=configuracao.get("entrada"), pasta_saida=configuracao.get("saida"), usar_gpt=usar_gpt,
+            curva_ctr=configuracao.get("curva_ctr"), entidades=configuracao.get("entidades"), agora=agora,
+        )
+
+    def planilhas_entrada(self):
+        return [
+            filename for filename in sorted(os.listdir(self.pasta_entrada))
+            if filename.endswith('.xlsx') and not filename.startswith(self.projeto) and filename != "cidades_brasil.xlsx"
+        ]
+
+    def verificar_arquivos(self):
+        if not os.path.exists(self.caminho_cidades):
+            print_status("Erro: Arquivo 'cidades_brasil.xlsx' não encontrado!")
+            raise FileNotFoundError("Arquivo 'cidades_brasil.xlsx' necessário")
+        if not os.path.exists(self.caminho_negativas):
+            print_status("Erro: Arquivo 'kw_negativas.docx' não encontrado!")
+            raise FileNotFoundError("Arquivo 'kw_negativas.docx' necessário")
+
+class RecursosCompartilhados:
+    """Arquivos auxiliares que não dependem das palavras do projeto.
+
+    Carregados uma vez, podem ser reaproveitados por várias execuções seguidas
+    no mesmo processo (cidades, curva de CTR, classificador de entidades e
+    matcher das palavras negativas).
+    """
+
+    def __init__(self, caminho_cidades, caminho_curva_ctr=CURVA_CTR_ARQUIVO, caminho_entidades=ENTIDADES_ARQUIVO):
+        print_status("Carregando lista de cidades do Brasil do arquivo 'cidades_brasil.xlsx'...")
+        cidades_brasil = carregar_cidades_brasil(caminho_cidades)
+        self.indice_cidades = construir_indice_cidades(cidades_brasil)
+        print_status(f"{len(cidades_brasil)} cidades carregadas para exclusão.")
+        self.ctr_rates = carregar_curva_ctr(caminho_curva_ctr)
+        self.classificador_entidades = ClassificadorEntidades(carregar_entidades(caminho_entidades))
+        negativas_compiladas()
+
+    @classmethod
+    def do_contexto(cls, contexto):
+        return cls(contexto.caminho_cidades, contexto.caminho_curva_ctr, contexto.caminho_entidades)
+
+def preparar_cache_entrada(limpar=None):
+    if not CACHE_ATIVO:
+        return
+    # Os checkpoints das fases ficam na mesma pasta, com ou sem pyarrow
+    preparar_cache(CACHE_DIR, limpar=CACHE_LIMPAR if limpar is None else limpar)
+    if _modulo_feather() is not None:
+        print_status(f"Cache de entrada ativo em: {CACHE_DIR}")
+    else:
+        print_status("Aviso: pyarrow não instalado. Cache de entrada desativado.")
 
 # =============================================================================
 # Fase 1 – Aglutinar as Planilhas
 # =============================================================================
 
-print_status("Iniciando Fase 1: Aglutinando planilhas...")
-all_data = []
-for filename in os.listdir(folder_path):
-    if filename.endswith('.xlsx') and not filename.startswith(project_name) and filename != "cidades_brasil.xlsx":
-        print_status(f"Lendo arquivo: {filename}")
-        try:
-            df = pd.read_excel(os.path.join(folder_path, filename))
-            all_data.append(df)
-        except Exception as e:
-            print_status(f"Erro ao ler {filename}: {str(e)}")
-            raise
-if not all_data:
-    print_status("Erro: Nenhuma planilha .xlsx encontrada na pasta (exceto 'cidades_brasil.xlsx')!")
-    raise ValueError("Nenhum arquivo válido encontrado")
+def executar_fase_visao_geral(contexto):
+    """Lê, deduplica e agrupa as planilhas de entrada e grava a Visão Geral.
+
+    Retorna (combined_df, volume_col, palavras_normalizadas, matriz_serp, resumo),
+    com combined_df já restrito às palavras canônicas.
+    """
+    folder_name = contexto.pasta
+    arquivos_entrada = contexto.planilhas_entrada()
+    fase = ProgressoFase("Fase 1: Aglutinando planilhas", total_etapas=len(arquivos_entrada))
+    all_data, arquivos_com_erro = ler_planilhas_entrada(contexto.pasta_entrada, arquivos_entrada, contexto.workers_leitura or WORKERS_LEITURA, fase, POLITICA_ARQUIVOS_COM_ERRO)
+    if not all_data:
+        print_status("Erro: Nenhuma planilha .xlsx encontrada na pasta (exceto 'cidades_brasil.xlsx')!")
+        raise ValueError("Nenhum arquivo válido encontrado")
 
-try:
-    combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df = combined_df.sort_values(by=['Keyword'], ascending=True)
-except Exception as e:
-    print_status(f"Erro ao concatenar planilhas: {str(e)}")
-    raise
-
-volume_col = None
-for col in combined_df.columns:
-    if "volume" in col.lower():
-        volume_col = col
-        break
-if volume_col:
-    combined_df = combined_df.sort_values(by=[volume_col], ascending=False)
-
-wb = Workbook()
-ws = wb.active
-ws.title = "Visao Geral de Palavras"
-for r in dataframe_to_rows(combined_df, index=False, header=True):
-    ws.append(r)
-volume_col_index = get_column_index(ws, volume_col) if volume_col else None
-if volume_col_index and not combined_df[volume_col].dropna().empty:
-    apply_heatmap(ws, volume_col_index, combined_df[volume_col])
-apply_header_style(ws)
-apply_content_style(ws)
-adjust_column_width(ws)
-visao_geral_filename = os.path.join(folder_name, "Visao Geral de Palavras.xlsx")
-wb.save(visao_geral_filename)
-print_status("Fase 1 concluída: Planilha 'Visao Geral de Palavras.xlsx' gerada!")
-
-print_status("Formatando a planilha temporária 'combined_df_temp.xlsx'...")
-wb_temp = Workbook()
-ws_temp = wb_temp.active
-ws_temp.title = "Dados Combinados Temporários"
-for r in dataframe_to_rows(combined_df, index=False, header=True):
-    ws_temp.append(r)
-volume_col_index = get_column_index(ws_temp, volume_col) if volume_col else None
-if volume_col_index and not combined_df[volume_col].dropna().empty:
-    apply_heatmap(ws_temp, volume_col_index, combined_df[volume_col])
-apply_header_style(ws_temp)
-apply_content_style(ws_temp)
-adjust_column_width(ws_temp)
-wb_temp.save(os.path.join(folder_name, "combined_df_temp.xlsx"))
-print_status("Planilha 'combined_df_temp.xlsx' formatada com sucesso!")
-
-plt.figure(figsize=(8, 4))
-top_10 = combined_df.head(10)
-bars = plt.bar(top_10['Keyword'], top_10[volume_col])
-plt.title("Top 10 Palavras por Volume de Busca")
-plt.xlabel("Palavras-chave")
-plt.ylabel("Volume de Busca")
-plt.xticks(rotation=45)
-for bar in bars:
-    yval = bar.get_height()
-    plt.text(bar.get_x() + bar.get_width()/2, yval, int(yval), ha='center', va='bottom')
-plt.tight_layout()
-plt.savefig(os.path.join(folder_name, "visao_geral.png"))
-plt.close()
-
-# =============================================================================
-# Fase 2 – Separação por Intent
-# =============================================================================
-
-print_status("Iniciando Fase 2: Separando por intenção de busca...")
-intents = ['Informational', 'Transactional', 'Commercial', 'Navigational']
-wb_intent = Workbook()
-ws_overview = wb_intent.active
-ws_overview.title = "Visao Geral"
-for r in dataframe_to_rows(combined_df, index=False, header=True):
-    ws_overview.append(r)
-volume_col_index = get_column_index(ws_overview, volume_col) if volume_col else None
-if volume_col_index and not combined_df[volume_col].dropna().empty:
-    apply_heatmap(ws_overview, volume_col_index, combined_df[volume_col])
-apply_header_style(ws_overview)
-apply_content_style(ws_overview)
-adjust_column_width(ws_overview)
-
-intent_counts = {}
-for intent in intents:
-    print_status(f"Criando aba para Intent: {intent}")
     try:
-        intent_df = combined_df[combined_df['Intent'].str.contains(intent, case=False, na=False)].sort_values(by=['Keyword'], ascending=True)
-        if volume_col:
-            intent_df = intent_df.sort_values(by=[volume_col], ascending=False)
-        intent_counts[intent] = len(intent_df)
-        ws_intent = wb_intent.create_sheet(intent)
-        for r in dataframe_to_rows(intent_df, index=False, header=True):
-            ws_intent.append(r)
-        volume_col_index = get_column_index(ws_intent, volume_col) if volume_col else None
-        if volume_col_index and not intent_df[volume_col].dropna().empty:
-            apply_heatmap(ws_intent, volume_col_index, intent_df[volume_col])
-        apply_header_style(ws_intent)
-        apply_content_style(ws_intent)
-        adjust_column_width(ws_intent)
+        combined_df = pd.concat(all_data, ignore_index=True)
     except Exception as e:
-        print_status(f"Erro ao processar Intent '{intent}': {str(e)}")
+        print_status(f"Erro ao concatenar planilhas: {str(e)}")
         raise
 
-no_intent_df = combined_df[combined_df['Intent'].isna()].sort_values(by=['Keyword'], ascending=True)
-if volume_col:
-    no_intent_df = no_intent_df.sort_values(by=[volume_col], ascending=False)
-ws_no_intent = wb_intent.create_sheet("Sem Intent")
-for r in dataframe_to_rows(no_intent_df, index=False, header=True):
-    ws_no_intent.append(r)
-volume_col_index = get_column_index(ws_no_intent, volume_col) if volume_col else None
-if volume_col_index and not no_intent_df[volume_col].dropna().empty:
-    apply_heatmap(ws_no_intent, volume_col_index, no_intent_df[volume_col])
-apply_header_style(ws_no_intent)
-apply_content_style(ws_no_intent)
-adjust_column_width(ws_no_intent)
-
-intents_filename = os.path.join(folder_name, "Intents.xlsx")
-wb_intent.save(intents_filename)
-print_status("Fase 2 concluída: Planilha 'Intents.xlsx' gerada!")
-
-plt.figure(figsize=(6, 6))
-intent_values = [intent_counts.get(i, 0) for i in intents]
-plt.pie(intent_values, labels=intents, autopct='%1.1f%%', colors=['#FF9999', '#66B2FF', '#99FF99', '#FFCC99'])
-plt.title("Distribuição por Intenção de Busca")
-for i, (value, label) in enumerate(zip(intent_values, intents)):
-    angle = sum(intent_values[:i]) + value / 2
-    angle_rad = angle * 2 * np.pi / sum(intent_values)
-    x = 0.5 * np.cos(angle_rad)
-    y = 0.5 * np.sin(angle_rad)
-    plt.text(x, y, str(value), ha='center', va='center')
-plt.savefig(os.path.join(folder_name, "intents.png"))
-plt.close()
-
-# =============================================================================
-# Fase 3 – Separação por SERP Features
-# =============================================================================
-
-print_status("Iniciando Fase 3: Separando por SERP Features...")
-wb_serp = Workbook()
-ws_serp_overview = wb_serp.active
-ws_serp_overview.title = "Visao Geral"
-for r in dataframe_to_rows(combined_df, index=False, header=True):
-    ws_serp_overview.append(r)
-volume_col_index = get_column_index(ws_serp_overview, volume_col) if volume_col else None
-if volume_col_index and not combined_df[volume_col].dropna().empty:
-    apply_heatmap(ws_serp_overview, volume_col_index, combined_df[volume_col])
-apply_header_style(ws_serp_overview)
-apply_content_style(ws_serp_overview)
-adjust_column_width(ws_serp_overview)
-
-serp_col = None
-for col in combined_df.columns:
-    if col.strip().lower() == "serp features":
-        serp_col = col
-        break
-
-serp_counts = {}
-if serp_col:
-    features_set = set()
-    for val in combined_df[serp_col].dropna():
-        for token in str(val).split(','):
-            token = token.strip()
-            if token:
-                features_set.add(token)
-    for feature in features_set:
-        print_status(f"Criando aba para SERP Feature: {feature}")
-        feature_df = combined_df[combined_df[serp_col].str.contains(feature, case=False, na=False)]
-        if volume_col:
-            feature_df = feature_df.sort_values(by=[volume_col], ascending=False)
-        serp_counts[feature] = len(feature_df)
-        if not feature_df.empty:
-            ws_feature = wb_serp.create_sheet(feature)
-            for r in dataframe_to_rows(feature_df, index=False, header=True):
-                ws_feature.append(r)
-            volume_col_index = get_column_index(ws_feature, volume_col) if volume_col else None
-            if volume_col_index and not feature_df[volume_col].dropna().empty:
-                apply_heatmap(ws_feature, volume_col_index, feature_df[volume_col])
-            apply_header_style(ws_feature)
-            apply_content_style(ws_feature)
-            adjust_column_width(ws_feature)
-else:
-    print_status("Aviso: Coluna 'SERP Features' não encontrada. Pulando separação por SERP Features.")
-serp_features_filename = os.path.join(folder_name, "SERP Features.xlsx")
-wb_serp.save(serp_features_filename)
-print_status("Fase 3 concluída: Planilha 'SERP Features.xlsx' gerada!")
-
-top_serp = sorted(serp_counts.items(), key=lambda x: x[1], reverse=True)[:4]
-plt.figure(figsize=(8, 4))
-bars = plt.bar([x[0] for x in top_serp], [x[1] for x in top_serp])
-plt.title("Principais Recursos de SERP")
-plt.xlabel("Recurso")
-plt.ylabel("Quantidade")
-for bar in bars:
-    yval = bar.get_height()
-    plt.text(bar.get_x() + bar.get_width()/2, yval, int(yval), ha='center', va='bottom')
-plt.savefig(os.path.join(folder_name, "serp_features.png"))
-plt.close()
+    volume_col = None
+    for col in combined_df.columns:
+        if "volume" in col.lower():
+            volume_col = col
+            break
+
+    total_linhas_lidas = len(combined_df)
+    duplicadas_mescladas = 0
+    if DEDUPLICAR:
+        combined_df, duplicadas_mescladas = deduplicar_palavras(combined_df, volume_col, REGRA_DEDUP_VOLUME, REGRA_DEDUP_SERP)
+        print_status(f"Deduplicação: {duplicadas_mescladas} linhas repetidas mescladas "
+                     f"({total_linhas_lidas} lidas, {len(combined_df)} palavras únicas).")
+    else:
+        print_status(f"Deduplicação desativada: {total_linhas_lidas} linhas mantidas.")
+    combined_df = combined_df.sort_values(by=['Keyword'], ascending=True)
+    palavras_normalizadas = PalavrasNormalizadas(combined_df["Keyword"])
+
+    matriz_serp = MatrizSerp(combined_df)
+    print_status(f"SERP Features: {len(matriz_serp.vocabulario)} recursos distintos em {matriz_serp.matriz.nnz} ocorrências.")
+
+    if volume_col:
+        combined_df = combined_df.sort_values(by=[volume_col], ascending=False)
+
+    total_palavras_importadas = len(combined_df)
+    variacoes_df = pd.DataFrame()
+    if AGRUPAR_VARIACOES:
+        canonicos_df, keyword_canonica, variacoes_df = agrupar_variacoes(combined_df, volume_col, palavras_normalizadas)
+        visao_geral_df = combined_df.assign(**{"Keyword Canônica": keyword_canonica})
+        print_status(f"Variações agrupadas: {len(combined_df)} palavras em {len(canonicos_df)} grupos "
+                     f"({len(combined_df) - len(canonicos_df)} variações removidas das fases seguintes; "
+                     f"lista na aba 'Variações').")
+    else:
+        canonicos_df = visao_geral_df = combined_df
+
+    wb = Workbook(write_only=True)
+    escrever_aba(wb, "Visao Geral de Palavras", visao_geral_df, volume_col)
+    if not variacoes_df.empty:
+        escrever_aba(wb, "Variações", variacoes_df, volume_col)
+    wb.save(registrar_saida(os.path.join(folder_name, "Visao Geral de Palavras.xlsx")))
+    print_status("Planilha 'Visao Geral de Palavras.xlsx' gerada!")
+    combined_df = canonicos_df
+
+    print_status("Formatando a planilha temporária 'combined_df_temp.xlsx'...")
+    wb_temp = Workbook(write_only=True)
+    escrever_aba(wb_temp, "Dados Combinados Temporários", combined_df, volume_col)
+    wb_temp.save(registrar_saida(os.path.join(folder_name, "combined_df_temp.xlsx")))
+    print_status("Planilha 'combined_df_temp.xlsx' formatada com sucesso!")
+
+    if GERAR_GRAFICOS:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(8, 4))
+        top_10 = combined_df.head(10)
+        bars = plt.bar(top_10['Keyword'], top_10[volume_col])
+        plt.title("Top 10 Palavras por Volume de Busca")
+        plt.xlabel("Palavras-chave")
+        plt.ylabel("Volume de Busca")
+        plt.xticks(rotation=45)
+        for bar in bars:
+            yval = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width()/2, yval, int(yval), ha='center', va='bottom')
+        plt.tight_layout()
+        plt.savefig(registrar_saida(os.path.join(folder_name, "visao_geral.png")))
+        plt.close()
+    fase.concluir("Fase 1 concluída: Planilha 'Visao Geral de Palavras.xlsx' gerada!", len(combined_df))
+
+    resumo = {
+        "LinhasLidas": total_linhas_lidas,
+        "DuplicadasMescladas": duplicadas_mescladas,
+        "PalavrasImportadas": total_palavras_importadas,
+        "ArquivosLidos": len(all_data),
+        "ArquivosComErro": arquivos_com_erro,
+    }
+    return combined_df, volume_col, palavras_normalizadas, matriz_serp, resumo
 
 # =============================================================================
 # Fase 4 – Mapeamento por Jornada e Tipologia
 # =============================================================================
 
-print_status("Iniciando Fase 4: Mapeando por Jornada e Tipologia...")
-jornada_list = []
-tipologia_list = []
-for idx, row in combined_df.iterrows():
-    jornada_list.append(get_etapa_da_jornada(row.get('Intent', '')))
-    tipologia_list.append(get_tipologia_sugerida(row))
-combined_df['Etapa da Jornada'] = jornada_list
-combined_df['Tipologia Sugerida'] = tipologia_list
+ETAPAS_JORNADA = ["Conscientização", "Consideração", "Decisão", "Fidelização", "Sem Jornada Definida"]
 
-cols_to_drop = ["CPC (USD)", "Competitive Density", "Number of Results"]
-combined_df = combined_df.drop(columns=cols_to_drop, errors='ignore')
+def executar_fase_jornada(contexto, combined_df, volume_col, matriz_serp):
+    """Classifica jornada e tipologia e grava 'Jornada e Tipologias.xlsx'.
 
-if volume_col:
-    combined_df = combined_df.sort_values(by=[volume_col], ascending=False)
-else:
-    combined_df = combined_df.sort_values(by=['Keyword'], ascending=True)
+    Retorna (combined_df com as novas colunas, contagem por etapa).
+    """
+    folder_name = contexto.pasta
+    fase = ProgressoFase("Fase 4: Mapeando por Jornada e Tipologia")
+    jornada_list, tipologia_list = mapear_jornada_e_tipologia(combined_df, matriz_serp)
+    combined_df = combined_df.assign(**{'Etapa da Jornada': jornada_list, 'Tipologia Sugerida': tipologia_list})
+
+    cols_to_drop = ["CPC (USD)", "Competitive Density", "Number of Results"]
+    combined_df = combined_df.drop(columns=cols_to_drop, errors='ignore')
 
-wb_journey = Workbook()
-ws_journey_overview = wb_journey.active
-ws_journey_overview.title = "Visao Geral da Jornada"
-for r in dataframe_to_rows(combined_df, index=False, header=True):
-    ws_journey_overview.append(r)
-volume_col_index = get_column_index(ws_journey_overview, volume_col) if volume_col else None
-if volume_col_index and not combined_df[volume_col].dropna().empty:
-    apply_heatmap(ws_journey_overview, volume_col_index, combined_df[volume_col])
-apply_header_style(ws_journey_overview)
-apply_content_style(ws_journey_overview)
-adjust_column_width(ws_journey_overview)
-
-etapas = ["Conscientização", "Consideração", "Decisão", "Fidelização", "Sem Jornada Definida"]
-jornada_counts = {}
-for etapa in etapas:
-    print_status(f"Criando aba para Jornada: {etapa}")
-    etapa_df = combined_df[combined_df['Etapa da Jornada'] == etapa]
     if volume_col:
-        etapa_df = etapa_df.sort_values(by=[volume_col], ascending=False)
-    jornada_counts[etapa] = len(etapa_df)
-    ws_etapa = wb_journey.create_sheet(etapa)
-    for r in dataframe_to_rows(etapa_df, index=False, header=True):
-        ws_etapa.append(r)
-    volume_col_index = get_column_index(ws_etapa, volume_col) if volume_col else None
-    if volume_col_index and not etapa_df[volume_col].dropna().empty:
-        apply_heatmap(ws_etapa, volume_col_index, etapa_df[volume_col])
-    apply_header_style(ws_etapa)
-    apply_content_style(ws_etapa)
-    adjust_column_width(ws_etapa)
-
-jornada_filename = os.path.join(folder_name, "Jornada e Tipologias.xlsx")
-wb_journey.save(jornada_filename)
-print_status("Fase 4 concluída: Planilha 'Jornada e Tipologias.xlsx' gerada!")
-
-plt.figure(figsize=(6, 6))
-jornada_values = [jornada_counts[e] for e in etapas if e in jornada_counts]
-plt.pie(jornada_values, labels=[e for e in etapas if e in jornada_counts], autopct='%1.1f%%', colors=['#FF6666', '#FFCC66', '#66CCFF', '#66FF66', '#999999'])
-plt.title("Distribuição por Etapa da Jornada")
-for i, (value, label) in enumerate(zip(jornada_values, [e for e in etapas if e in jornada_counts])):
-    angle = sum(jornada_values[:i]) + value / 2
-    angle_rad = angle * 2 * np.pi / sum(jornada_values)
-    x = 0.5 * np.cos(angle_rad)
-    y = 0.5 * np.sin(angle_rad)
-    plt.text(x, y, str(value), ha='center', va='center')
-plt.savefig(os.path.join(folder_name, "jornada.png"))
-plt.close()
-
-## Fase 5 – CTR por Posição
-print_status("Iniciando Fase 5: Calculando CTR por posição...")
-ctr_rates = {
-    1: (0.25, 0.35), 2: (0.15, 0.20), 3: (0.10, 0.15), 4: (0.07, 0.10), 5: (0.05, 0.07),
-    6: (0.04, 0.06), 7: (0.03, 0.05), 8: (0.02, 0.04), 9: (0.02, 0.03), 10: (0.01, 0.02)
-}
-if volume_col:
-    ctr_df = combined_df[(combined_df[volume_col] > 0) & (combined_df[volume_col].notna())].copy()
-    for pos, (min_rate, max_rate) in ctr_rates.items():
-        ctr_df[f'Posicao {pos}'] = ctr_df[volume_col].apply(lambda x: f"{int(x * min_rate)} - {int(x * max_rate)}")
-    selected_columns = ['Keyword', volume_col, 'Intent', 'Trend'] + [f'Posicao {i}' for i in range(1, 11)]
-    ctr_export_df = ctr_df[selected_columns].copy()
-    for pos, (min_rate, max_rate) in ctr_rates.items():
-        old_col = f'Posicao {pos}'
-        new_col = f'Posicao {pos} ({int(min_rate*100)}%-{int(max_rate*100)}%)'
-        ctr_export_df.rename(columns={old_col: new_col}, inplace=True)
-    wb_ctr = Workbook()
-    ws_ctr = wb_ctr.active
-    ws_ctr.title = "CTR por Posicao"
-    for r in dataframe_to_rows(ctr_export_df, index=False, header=True):
-        ws_ctr.append(r)
-    volume_col_index = get_column_index(ws_ctr, volume_col)
-    if volume_col_index and not ctr_export_df[volume_col].dropna().empty:
-        apply_heatmap(ws_ctr, volume_col_index, ctr_export_df[volume_col])
-    apply_header_style(ws_ctr)
-    apply_content_style(ws_ctr)
-    adjust_column_width(ws_ctr)
-    ctr_filename = os.path.join(folder_name, "CTR por Posicao.xlsx")
-    wb_ctr.save(ctr_filename)
-    print_status("Fase 5 concluída: Planilha 'CTR por Posicao.xlsx' gerada!")
-else:
-    print_status("Aviso: Nenhuma coluna de volume encontrada. Pulando Fase 5.")
-    ctr_export_df = pd.DataFrame()
-
-if not ctr_export_df.empty:
-    exemplo_ctr = ctr_export_df.iloc[0]
-    plt.figure(figsize=(8, 4))
-    positions = range(1, 11)
-    ctr_min = [float(exemplo_ctr[f'Posicao {i} ({int(min_rate*100)}%-{int(max_rate*100)}%)'].split('-')[0]) for i, (min_rate, max_rate) in ctr_rates.items()]
-    ctr_max = [float(exemplo_ctr[f'Posicao {i} ({int(min_rate*100)}%-{int(max_rate*100)}%)'].split('-')[1]) for i, (min_rate, max_rate) in ctr_rates.items()]
-    plt.plot(positions, ctr_min, label="Cenário Pessimista", marker='o')
-    plt.plot(positions, ctr_max, label="Cenário Otimista", marker='o')
-    plt.title(f"Estimativa de CTR por Posição ({exemplo_ctr['Keyword']})")
-    plt.xlabel("Posição")
-    plt.ylabel("Cliques")
-    for i, (min_val, max_val) in enumerate(zip(ctr_min, ctr_max)):
-        plt.text(positions[i], min_val, int(min_val), ha='center', va='bottom')
-        plt.text(positions[i], max_val, int(max_val), ha='center', va='bottom')
-    plt.legend()
-    plt.savefig(os.path.join(folder_name, "ctr_posicao.png"))
-    plt.close()
+        combined_df = combined_df.sort_values(by=[volume_col], ascending=False)
+    else:
+        combined_df = combined_df.sort_values(by=['Keyword'], ascending=True)
+
+    wb_journey = Workbook(write_only=True)
+    escrever_aba(wb_journey, "Visao Geral da Jornada", combined_df, volume_col)
+
+    jornada_counts = {}
+    fase.total_etapas = len(ETAPAS_JORNADA)
+    for etapa in ETAPAS_JORNADA:
+        etapa_df = combined_df[combined_df['Etapa da Jornada'] == etapa]
+        if volume_col:
+            etapa_df = etapa_df.sort_values(by=[volume_col], ascending=False)
+        jornada_counts[etapa] = len(etapa_df)
+        escrever_aba(wb_journey, etapa, etapa_df, volume_col)
+        fase.avancar(f"Aba criada para Jornada: {etapa}", len(etapa_df))
+
+    wb_journey.save(registrar_saida(os.path.join(folder_name, "Jornada e Tipologias.xlsx")))
+
+    if GERAR_GRAFICOS:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(6, 6))
+        jornada_values = [jornada_counts[e] for e in ETAPAS_JORNADA if e in jornada_counts]
+        plt.pie(jornada_values, labels=[e for e in ETAPAS_JORNADA if e in jornada_counts], autopct='%1.1f%%', colors=['#FF6666', '#FFCC66', '#66CCFF', '#66FF66', '#999999'])
+        plt.title("Distribuição por Etapa da Jornada")
+        for i, (value, label) in enumerate(zip(jornada_values, [e for e in ETAPAS_JORNADA if e in jornada_counts])):
+            angle = sum(jornada_values[:i]) + value / 2
+            angle_rad = angle * 2 * np.pi / sum(jornada_values)
+            x = 0.5 * np.cos(angle_rad)
+            y = 0.5 * np.sin(angle_rad)
+            plt.text(x, y, str(value), ha='center', va='center')
+        plt.savefig(registrar_saida(os.path.join(folder_name, "jornada.png")))
+        plt.close()
+    fase.concluir("Fase 4 concluída: Planilha 'Jornada e Tipologias.xlsx' gerada!", len(combined_df))
+
+    # As funções de Top 100 e Ads normalizam a coluna Keyword; fazer isso
+    # uma única vez aqui mantém o mesmo DataFrame em todos os processos.
+    combined_df = combined_df.assign(Keyword=combined_df["Keyword"].fillna("").astype(str))
+    return combined_df, jornada_counts
 
 # =============================================================================
-# Fase 6 – Estratégia por Objetivo com Palavras-Chave
+# Fase 7 – Planejamento de Crescimento
 # =============================================================================
 
-print_status("Iniciando Fase 6: Gerando estratégias por objetivo com palavras-chave...")
-estrategia_df, objetivo_selecionado = criar_planilha_palavras_por_estrategia(folder_name, objective, combined_df)
-print_status("Fase 6 concluída: Planilha 'Palavras por Estratégia.xlsx' gerada!")
+def executar_fase_planejamento(contexto, combined_df, recursos, armazem_tfidf, palavras_normalizadas):
+    """Gera o planejamento e o gráfico de crescimento; retorna o resultado da planilha ou None."""
+    folder_name = contexto.pasta
+    fase = ProgressoFase("Fase 7: Gerando planejamento de crescimento")
+    result = criar_planilha_planejamento_crescimento(
+        folder_name, combined_df, contexto.volume_atual, contexto.crescimento_mensal, contexto.meses_planejamento,
+        contexto.palavras_por_mes, contexto.objetivo, recursos.indice_cidades, recursos.ctr_rates, armazem_tfidf, palavras_normalizadas,
+    )
+    if result is None:
+        fase.concluir("Fase 7 interrompida: planejamento não gerado", len(combined_df))
+        return None
+
+    if GERAR_GRAFICOS:
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(8, 4))
+        meses_grafico = [f'Mês {i+1}' for i in range(contexto.meses_planejamento)]
+        acessos = [contexto.volume_atual * (1 + contexto.crescimento_mensal / 100) ** i for i in range(contexto.meses_planejamento)]
+        plt.plot(meses_grafico, acessos, marker='o')
+        plt.title("Projeção de Crescimento")
+        plt.xlabel("Meses")
+        plt.ylabel("Acessos Mensais")
+        for i, val in enumerate(acessos):
+            plt.text(i, val, int(val), ha='center', va='bottom')
+        plt.savefig(registrar_saida(os.path.join(folder_name, "crescimento.png")))
+        plt.close()
+    fase.concluir("Fase 7 concluída: Planilha 'Planejamento de Crescimento.xlsx' gerada!", len(combined_df))
+    return result
 
 # =============================================================================
-# Fase 7 – Planejamento de Crescimento
+# Gráficos das Planilhas Geradas em Paralelo
 # =============================================================================
 
-print_status("Iniciando Fase 7: Gerando planejamento de crescimento...")
-result = criar_planilha_planejamento_crescimento(folder_name, combined_df, volume_atual, crescimento_mensal, meses_planejamento, palavras_por_mes, objective, cidades_brasil)
-if result is None:
-    print_status("Erro na Fase 7. Abortando execução.")
-    raise ValueError("Fase 7 falhou devido à ausência de coluna de volume ou outro erro.")
-calculo_df, palavras_selecionadas, cauda_curta, cauda_media, cauda_longa, palavras_semantico, palavras_blog, meses, colunas_selecao = result
-print_status("Fase 7 concluída: Planilha 'Planejamento de Crescimento.xlsx' gerada!")
+def gerar_graficos_fases_paralelas(contexto, intent_counts, serp_counts, ctr_export_df, ctr_rates):
+    """Gráficos de intents, SERP e CTR; retorna (top_serp, exemplo_ctr ou None).
+
+    Com os gráficos desativados, só os dados são retornados.
+    """
+    folder_name = contexto.pasta
+    top_serp = sorted(serp_counts.items(), key=lambda x: x[1], reverse=True)[:4]
+    exemplo_ctr = None if ctr_export_df.empty else ctr_export_df.iloc[0]
+    if not GERAR_GRAFICOS:
+        return top_serp, exemplo_ctr
+    import matplotlib.pyplot as plt
+    fase = ProgressoFase("Gráficos: Gerando gráficos de intents, SERP e CTR")
+
+    plt.figure(figsize=(6, 6))
+    intent_values = [intent_counts.get(i, 0) for i in INTENTS]
+    plt.pie(intent_values, labels=INTENTS, autopct='%1.1f%%', colors=['#FF9999', '#66B2FF', '#99FF99', '#FFCC99'])
+    plt.title("Distribuição por Intenção de Busca")
+    for i, (value, label) in enumerate(zip(intent_values, INTENTS)):
+        angle = sum(intent_values[:i]) + value / 2
+        angle_rad = angle * 2 * np.pi / sum(intent_values)
+        x = 0.5 * np.cos(angle_rad)
+        y = 0.5 * np.sin(angle_rad)
+        plt.text(x, y, str(value), ha='center', va='center')
+    plt.savefig(registrar_saida(os.path.join(folder_name, "intents.png")))
+    plt.close()
 
-plt.figure(figsize=(8, 4))
-meses_grafico = [f'Mês {i+1}' for i in range(meses_planejamento)]
-acessos = [volume_atual * (1 + crescimento_mensal / 100) ** i for i in range(meses_planejamento)]
-plt.plot(meses_grafico, acessos, marker='o')
-plt.title("Projeção de Crescimento")
-plt.xlabel("Meses")
-plt.ylabel("Acessos Mensais")
-for i, val in enumerate(acessos):
-    plt.text(i, val, int(val), ha='center', va='bottom')
-plt.savefig(os.path.join(folder_name, "crescimento.png"))
-plt.close()
+    plt.figure(figsize=(8, 4))
+    bars = plt.bar([x[0] for x in top_serp], [x[1] for x in top_serp])
+    plt.title("Principais Recursos de SERP")
+    plt.xlabel("Recurso")
+    plt.ylabel("Quantidade")
+    for bar in bars:
+        yval = bar.get_height()
+        plt.text(bar.get_x() + bar.get_width()/2, yval, int(yval), ha='center', va='bottom')
+    plt.savefig(registrar_saida(os.path.join(folder_name, "serp_features.png")))
+    plt.close()
+
+    if exemplo_ctr is not None:
+        plt.figure(figsize=(8, 4))
+        positions = list(ctr_rates)
+        ctr_min = [float(exemplo_ctr[f'Posicao {i} Min']) for i in ctr_rates]
+        ctr_max = [float(exemplo_ctr[f'Posicao {i} Max']) for i in ctr_rates]
+        plt.plot(positions, ctr_min, label="Cenário Pessimista", marker='o')
+        plt.plot(positions, ctr_max, label="Cenário Otimista", marker='o')
+        plt.title(f"Estimativa de CTR por Posição ({exemplo_ctr['Keyword']})")
+        plt.xlabel("Posição")
+        plt.ylabel("Cliques")
+        for i, (min_val, max_val) in enumerate(zip(ctr_min, ctr_max)):
+            plt.text(positions[i], min_val, int(min_val), ha='center', va='bottom')
+            plt.text(positions[i], max_val, int(max_val), ha='center', va='bottom')
+        plt.legend()
+        plt.savefig(registrar_saida(os.path.join(folder_name, "ctr_posicao.png")))
+        plt.close()
+    fase.concluir("Gráficos de intents, SERP e CTR gerados!")
+    return top_serp, exemplo_ctr
 
 # =============================================================================
-# Fase 8 – Top 100 Palavras por Tipo
+# Fase 9 – Geração do Dashboard Profissional
 # =============================================================================
 
-print_status("Iniciando Fase 8: Gerando top 100 palavras por tipo...")
-top_palavras_por_tipo = criar_planilha_top_palavras_por_tipo(folder_name, combined_df)
-print_status("Fase 8 concluída: Planilha 'Top 100 Palavras por Tipo.xlsx' gerada!")
+def executar_fase_dashboard(contexto, combined_df, volume_col, intent_counts, serp_counts, jornada_counts, ctr_export_df, estrategia_df, calculo_df, meses, ctr_rates):
+    fase = ProgressoFase("Fase 9: Gerando Dashboard Profissional")
+    criar_dashboard_profissional(contexto.pasta, combined_df, intent_counts, serp_counts, jornada_counts, ctr_export_df, estrategia_df, calculo_df, meses, volume_col, contexto.objetivo, contexto.agora, ctr_rates)
+    fase.concluir("Fase 9 concluída: Dashboard.xlsx gerado!", len(combined_df))
 
 # =============================================================================
-# Fase 8.5 – Palavras para Ads Filtradas
+# Geração do Relatório Analítico Detalhado
 # =============================================================================
-print_status("Iniciando Fase 8.5: Gerando palavras para Ads Filtradas...")
-palavras_ads_filtradas, palavras_excluidas = criar_planilha_palavras_para_ads_filtradas(folder_name, combined_df)
-print_status("Fase 8.5 concluída: Planilha 'Palavras para Ads Filtradas.xlsx' gerada!")
 
-# Fase 8.7 – Entidades e Knowledge
-print_status("Iniciando Fase 8.7: Gerando Entidades e Knowledge...")
-palavras_por_entidade_knowledge = criar_planilha_entidades_e_knowledge(folder_name, combined_df)
-print_status("Fase 8.7 concluída: Planilha 'Entidades e Knowledge.xlsx' gerada!")
+def gerar_relatorio_detalhado(contexto, dados):
+    """Grava 'Relatório Analítico Detalhado.docx' a partir dos dados de todas as fases."""
+    folder_name = contexto.pasta
+    project_name = contexto.projeto
+    combined_df = dados["combined_df"]
+    volume_col = dados["volume_col"]
+    resumo = dados["resumo_fase1"]
+    intent_counts = dados["intent_counts"]
+    jornada_counts = dados["jornada_counts"]
+    exemplo_ctr = dados["exemplo_ctr"]
+    estrategia_df = dados["estrategia_df"]
+    top_palavras_por_tipo = dados["top_palavras_por_tipo"]
+
+    from docx import Document
+    fase = ProgressoFase("Relatório: Gerando Relatório Analítico Detalhado.docx")
+    doc = Document()
+
+    add_title(doc, f"Relatório Analítico Detalhado - Projeto {project_name}")
+
+    add_subtitle(doc, "Introdução")
+    add_paragraph(doc, f"Este relatório apresenta uma análise detalhada e fundamentada das palavras-chave fornecidas para o projeto {project_name}, com o objetivo de otimizar a estratégia de SEO do site. Foram realizadas nove fases analíticas, cada uma com propósitos específicos para compreender o comportamento de busca, o potencial de tráfego e as oportunidades de conteúdo. Abaixo, detalhamos cada fase, os métodos utilizados, os resultados obtidos e recomendações estratégicas.")
+
+    add_subtitle(doc, "Fase 1: Visão Geral de Palavras")
+    add_paragraph(doc, "Objetivo: Consolidar todas as palavras-chave de diferentes fontes em uma única planilha para fornecer uma visão geral do volume de busca, intenção e características de SERP.")
+    add_paragraph(doc, "Método: As planilhas foram lidas, concatenadas usando pandas, deduplicadas pela palavra normalizada e ordenadas pelo volume de busca (quando disponível). Variações da mesma palavra foram agrupadas em torno de uma palavra canônica. Uma versão temporária foi salva para depuração.")
+    add_paragraph(doc, f"Resultado: Das {resumo['LinhasLidas']} linhas lidas, {resumo['DuplicadasMescladas']} eram repetições entre planilhas e {resumo['PalavrasImportadas'] - len(combined_df)} eram variações de outras palavras. Foram analisadas {len(combined_df)} palavras-chave únicas. O gráfico abaixo destaca as 10 principais por volume de busca.")
+    add_image(doc, os.path.join(folder_name, "visao_geral.png"))
+    add_paragraph(doc, "Recomendações: Priorizar palavras de alto volume para estratégias de curto prazo e explorar termos de cauda longa para ganhos sustentáveis.")
+
+    add_subtitle(doc, "Fase 2: Separação por Intenção de Busca")
+    add_paragraph(doc, "Objetivo: Classificar as palavras-chave em intenções de busca (Informacional, Transacional, Comercial, Navegacional) para alinhar o conteúdo às expectativas dos usuários.")
+    add_paragraph(doc, "Método: Filtragem baseada na coluna 'Intent' com ordenação por volume.")
+    add_paragraph(doc, f"Resultado: Distribuição das intenções: {', '.join([f'{intent}: {intent_counts.get(intent, 0)}' for intent in INTENTS])}. Veja o gráfico abaixo.")
+    add_image(doc, os.path.join(folder_name, "intents.png"))
+    add_paragraph(doc, "Recomendações: Criar conteúdo específico para cada intenção, como guias para Informacional e páginas de produto para Transacional.")
+
+    add_subtitle(doc, "Fase 3: Separação por Recursos de SERP")
+    add_paragraph(doc, "Objetivo: Identificar palavras-chave associadas a recursos de SERP para explorar oportunidades de visibilidade.")
+    add_paragraph(doc, "Método: Extração e contagem de features da coluna 'SERP Features', com separação em abas.")
+    add_paragraph(doc, f"Resultado: Principais recursos encontrados: {', '.join([f'{feat}: {count}' for feat, count in dados['top_serp']])}. Veja o gráfico.")
+    add_image(doc, os.path.join(folder_name, "serp_features.png"))
+    add_paragraph(doc, "Recomendações: Otimizar para Featured Snippets e Local Pack quando aplicável, aumentando CTR.")
+
+    add_subtitle(doc, "Fase 4: Mapeamento por Jornada e Tipologia")
+    add_paragraph(doc, "Objetivo: Mapear palavras-chave às etapas da jornada do cliente e sugerir tipologias de conteúdo.")
+    add_paragraph(doc, "Método: Uso de funções personalizadas para classificar intenções em etapas e sugerir tipologias baseadas em SERP Features.")
+    add_paragraph(doc, f"Resultado: Distribuição por etapa: {', '.join([f'{etapa}: {jornada_counts.get(etapa, 0)}' for etapa in ETAPAS_JORNADA])}. Veja o gráfico.")
+    add_image(doc, os.path.join(folder_name, "jornada.png"))
+    add_paragraph(doc, "Recomendações: Desenvolver funis de conteúdo alinhados à jornada, como blogs para Conscientização e comparativos para Consideração.")
+
+    add_subtitle(doc, "Fase 5: CTR por Posição")
+    add_paragraph(doc, "Objetivo: Estimar cliques potenciais por posição no ranking para cada palavra-chave.")
+    add_paragraph(doc, "Método: Aplicação de taxas de CTR padrão por posição ao volume de busca.")
+    if exemplo_ctr is not None:
+        add_paragraph(doc, f"Resultado: Exemplo para '{exemplo_ctr['Keyword']}' (volume {exemplo_ctr[volume_col]}). Veja a estimativa abaixo.")
+        add_image(doc, os.path.join(folder_name, "ctr_posicao.png"))
+        add_paragraph(doc, "Recomendações: Focar em alcançar as primeiras posições para palavras de alto volume.")
+    else:
+        add_paragraph(doc, "Resultado: Análise não realizada devido à ausência de dados de volume.")
+
+    add_subtitle(doc, "Fase 6: Estratégia por Objetivo com Palavras-Chave")
+    add_paragraph(doc, "Objetivo: Associar palavras-chave a estratégias específicas conforme o objetivo selecionado.")
+    add_paragraph(doc, "Método: Mapeamento de intenções a objetivos e fusão com estratégias predefinidas.")
+    add_paragraph(doc, f"Resultado: Para o objetivo '{dados['objetivo_selecionado']}', exemplo: '{estrategia_df.iloc[0]['Palavra-chave']}' (volume {estrategia_df.iloc[0]['Volume']}), Estratégia: '{estrategia_df.iloc[0]['Estratégia']}'.")
+    add_paragraph(doc, "Recomendações: Implementar as tipologias sugeridas para maximizar o impacto do objetivo escolhido.")
+
+    add_subtitle(doc, "Fase 7: Planejamento de Crescimento")
+    add_paragraph(doc, "Objetivo: Projetar o crescimento de tráfego com base em volume atual, meta de crescimento e palavras-chave selecionadas.")
+    add_paragraph(doc, "Método: Cálculo de metas com exclusão de termos geográficos e segmentação por cauda.")
+    add_paragraph(doc, f"Resultado: Projeção para {contexto.meses_planejamento} meses, volume inicial {contexto.volume_atual}, crescimento {contexto.crescimento_mensal}% ao mês. Veja o gráfico.")
+    add_image(doc, os.path.join(folder_name, "crescimento.png"))
+    add_paragraph(doc, "Recomendações: Priorizar palavras selecionadas na aba 'Seleção de Palavras' e monitorar o progresso mensal.")
+
+    add_subtitle(doc, "Fase 8: Top 100 Palavras por Tipo")
+    add_paragraph(doc, "Objetivo: Identificar as 100 melhores palavras-chave por tipo com base no volume de busca.")
+    add_paragraph(doc, "Método: Agrupamento por uma coluna de tipo (se disponível) ou clustering automático das palavras-chave.")
+    if top_palavras_por_tipo:
+        primeiro_tipo = list(top_palavras_por_tipo.keys())[0]
+        exemplo_df = top_palavras_por_tipo[primeiro_tipo]
+        add_paragraph(doc, f"Resultado: Tipos analisados: {', '.join(top_palavras_por_tipo.keys())}. Exemplo para '{primeiro_tipo}': '{exemplo_df.iloc[0]['Keyword']}' (volume {exemplo_df.iloc[0][volume_col]}).")
+        add_paragraph(doc, "Recomendações: Focar em palavras de alto volume por tipo para campanhas segmentadas.")
+    else:
+        add_paragraph(doc, "Resultado: Nenhum tipo identificado devido a dados insuficientes.")
+
+    add_subtitle(doc, "Fase 8.5: Palavras para Ads Filtradas")
+    add_paragraph(doc, "Objetivo: Filtrar palavras-chave adequadas para campanhas de anúncios, excluindo termos negativos listados em 'kw_negativas.docx'.")
+    add_paragraph(doc, "Método: Leitura de palavras negativas de um arquivo Word, exclusão de palavras contendo esses termos e separação em duas abas: 'Palavras Filtradas' e 'Palavras Excluídas'.")
+    add_paragraph(doc, f"Resultado: {len(dados['palavras_ads_filtradas'])} palavras filtradas e {len(dados['palavras_excluidas'])} excluídas.")
+    add_paragraph(doc, "Recomendações: Usar as palavras filtradas para campanhas de anúncios e revisar as excluídas para ajustes na lista de negativas.")
+
+    add_subtitle(doc, "Fase 9: Dashboard Profissional")
+    add_paragraph(doc, "Objetivo: Criar um dashboard interativo no Excel para visualização consolidada dos principais insights.")
+    add_paragraph(doc, "Método: Geração de tabelas e gráficos (pizza, barras e linhas) com dados de intenções, SERP, jornada, CTR e crescimento.")
+    add_paragraph(doc, "Resultado: Dashboard gerado em 'Dashboard.xlsx', contendo resumo geral, distribuições e projeções.")
+    add_paragraph(doc, "Recomendações: Utilizar o dashboard para apresentações e monitoramento estratégico.")
+
+    add_subtitle(doc, "Conclusão e Recomendações Finais")
+    add_paragraph(doc, f"A análise do projeto {project_name} oferece insights estratégicos para otimizar o SEO. Recomendamos: (1) Priorizar palavras de alto volume e baixa concorrência, (2) Implementar tipologias de conteúdo sugeridas, (3) Seguir o planejamento de crescimento para atingir as metas de tráfego, e (4) Monitorar os resultados regularmente com o dashboard gerado.")
+
+    doc.save(registrar_saida(os.path.join(folder_name, "Relatório Analítico Detalhado.docx")))
+    fase.concluir("Relatório Analítico Detalhado.docx gerado com sucesso na pasta " + folder_name, len(combined_df))
+
+# =============================================================================
+# Resultados Finais em XML
 # =============================================================================
-# Fase 9 – Geração do Dashboard Profissional
-print_status("Iniciando Fase 9: Gerando Dashboard Profissional...")
-criar_dashboard_profissional(folder_name, combined_df, intent_counts, serp_counts, jornada_counts, ctr_export_df, estrategia_df, calculo_df, meses, volume_col, objective, now, ctr_rates)
-print_status("Fase 9 concluída: Dashboard.xlsx gerado!")
 
 def dict_to_xml(tag, d):
     elem = ET.Element(tag)
@@ -1744,160 +3199,564 @@ def dict_to_xml(tag, d):
             child.text = safe_text if safe_text.strip() else ' '  # Garante texto não-vazio
             elem.append(child)
     return elem
-    
-def criar_planilha_palavras_por_entidades(folder_name, combined_df):
-    print_status("Criando a planilha 'Palavras por Entidades.xlsx'...")
-    # (o resto da função conforme acima)
-    print_status("Planilha 'Palavras por Entidades.xlsx' criada com sucesso!")
-    return palavras_por_entidade
 
+def montar_resultados(contexto, dados):
+    """Resumo de todas as fases, no formato gravado em 'resultados_finais.xml'."""
+    combined_df = dados["combined_df"]
+    volume_col = dados["volume_col"]
+    resumo = dados["resumo_fase1"]
+    exemplo_ctr = dados["exemplo_ctr"]
+    estrategia_df = dados["estrategia_df"]
+    return {
+        "Projeto": contexto.projeto,
+        "Data": contexto.data,
+        "Objetivo": contexto.objetivo,
+        "Fase1": {
+            "TotalPalavras": len(combined_df),
+            "LinhasLidas": resumo["LinhasLidas"],
+            "DuplicadasMescladas": resumo["DuplicadasMescladas"],
+            "PalavrasImportadas": resumo["PalavrasImportadas"],
+            "VariacoesAgrupadas": resumo["PalavrasImportadas"] - len(combined_df),
+            "ArquivosLidos": resumo["ArquivosLidos"],
+            "ArquivosComErro": [{"Arquivo": arquivo, "Erro": erro} for arquivo, erro in resumo["ArquivosComErro"].items()],
+            "VolumeMedio": round(combined_df[volume_col].mean(), 2) if volume_col and not combined_df[volume_col].dropna().empty else "N/A"
+        },
+        "Fase2": dados["intent_counts"],
+        "Fase3": dados["serp_counts"],
+        "Fase4": dados["jornada_counts"],
+        "Fase5": {
+            "ExemploCTR": {
+                "Keyword": exemplo_ctr['Keyword'],
+                "Volume": exemplo_ctr[volume_col] if volume_col else "N/A"
+            } if exemplo_ctr is not None else "Nenhum dado"
+        },
+        "Fase6": {
+            "ObjetivoSelecionado": dados["objetivo_selecionado"],
+            "Exemplo": {
+                "Palavra": estrategia_df.iloc[0]['Palavra-chave'],
+                "Volume": estrategia_df.iloc[0]['Volume'],
+                "Estrategia": estrategia_df.iloc[0]['Estratégia']
+            }
+        },
+        "Fase7": {
+            "VolumeAtual": contexto.volume_atual,
+            "CrescimentoMensal": contexto.crescimento_mensal,
+            "MesesPlanejamento": contexto.meses_planejamento
+        },
+        "Fase8": {
+            "Tipos": {tipo: len(df) for tipo, df in dados["top_palavras_por_tipo"].items()}
+        },
+        "Fase8_5": {
+            "PalavrasFiltradas": len(dados["palavras_ads_filtradas"]),
+            "PalavrasExcluidas": len(dados["palavras_excluidas"])
+        },
+        "Fase8_7": {
+            "Entidades": dados["entidade_counts"]
+        },
+        "Fase9": "Dashboard gerado",
+        "Desempenho": {"Etapa": list(DESEMPENHO)}
+    }
+
+def salvar_resultados_xml(caminho, resultados):
+    root = dict_to_xml("Resultados", resultados)
+    xml_str = ET.tostring(root, encoding='utf-8', method='xml')
+
+    try:
+        pretty_xml = minidom.parseString(xml_str).toprettyxml(indent="  ")
+    except Exception as e:
+        print_status(f"Erro ao formatar XML: {str(e)}. Salvando versão bruta.")
+        pretty_xml = xml_str.decode('utf-8')
+
+    with open(caminho, "w", encoding="utf-8") as xml_file:
+        xml_file.write(pretty_xml)
 
-# Configuração Inicial e Criação da Pasta de Saída
 # =============================================================================
-# Geração do Relatório Analítico Detalhado
+# Grafo de Fases e Checkpoints
 # =============================================================================
 
-print_status("Gerando Relatório Analítico Detalhado.docx...")
-doc = Document()
-
-add_title(doc, f"Relatório Analítico Detalhado - Projeto {project_name}")
-
-add_subtitle(doc, "Introdução")
-add_paragraph(doc, f"Este relatório apresenta uma análise detalhada e fundamentada das palavras-chave fornecidas para o projeto {project_name}, com o objetivo de otimizar a estratégia de SEO do site. Foram realizadas nove fases analíticas, cada uma com propósitos específicos para compreender o comportamento de busca, o potencial de tráfego e as oportunidades de conteúdo. Abaixo, detalhamos cada fase, os métodos utilizados, os resultados obtidos e recomendações estratégicas.")
-
-add_subtitle(doc, "Fase 1: Visão Geral de Palavras")
-add_paragraph(doc, "Objetivo: Consolidar todas as palavras-chave de diferentes fontes em uma única planilha para fornecer uma visão geral do volume de busca, intenção e características de SERP.")
-add_paragraph(doc, "Método: As planilhas foram lidas, concatenadas usando pandas e ordenadas pelo volume de busca (quando disponível). Uma versão temporária foi salva para depuração.")
-add_paragraph(doc, f"Resultado: Foram analisadas {len(combined_df)} palavras-chave únicas. O gráfico abaixo destaca as 10 principais por volume de busca.")
-add_image(doc, os.path.join(folder_name, "visao_geral.png"))
-add_paragraph(doc, "Recomendações: Priorizar palavras de alto volume para estratégias de curto prazo e explorar termos de cauda longa para ganhos sustentáveis.")
-
-add_subtitle(doc, "Fase 2: Separação por Intenção de Busca")
-add_paragraph(doc, "Objetivo: Classificar as palavras-chave em intenções de busca (Informacional, Transacional, Comercial, Navegacional) para alinhar o conteúdo às expectativas dos usuários.")
-add_paragraph(doc, "Método: Filtragem baseada na coluna 'Intent' com ordenação por volume.")
-add_paragraph(doc, f"Resultado: Distribuição das intenções: {', '.join([f'{intent}: {intent_counts.get(intent, 0)}' for intent in intents])}. Veja o gráfico abaixo.")
-add_image(doc, os.path.join(folder_name, "intents.png"))
-add_paragraph(doc, "Recomendações: Criar conteúdo específico para cada intenção, como guias para Informacional e páginas de produto para Transacional.")
-
-add_subtitle(doc, "Fase 3: Separação por Recursos de SERP")
-add_paragraph(doc, "Objetivo: Identificar palavras-chave associadas a recursos de SERP para explorar oportunidades de visibilidade.")
-add_paragraph(doc, "Método: Extração e contagem de features da coluna 'SERP Features', com separação em abas.")
-add_paragraph(doc, f"Resultado: Principais recursos encontrados: {', '.join([f'{feat}: {count}' for feat, count in top_serp])}. Veja o gráfico.")
-add_image(doc, os.path.join(folder_name, "serp_features.png"))
-add_paragraph(doc, "Recomendações: Otimizar para Featured Snippets e Local Pack quando aplicável, aumentando CTR.")
-
-add_subtitle(doc, "Fase 4: Mapeamento por Jornada e Tipologia")
-add_paragraph(doc, "Objetivo: Mapear palavras-chave às etapas da jornada do cliente e sugerir tipologias de conteúdo.")
-add_paragraph(doc, "Método: Uso de funções personalizadas para classificar intenções em etapas e sugerir tipologias baseadas em SERP Features.")
-add_paragraph(doc, f"Resultado: Distribuição por etapa: {', '.join([f'{etapa}: {jornada_counts.get(etapa, 0)}' for etapa in etapas])}. Veja o gráfico.")
-add_image(doc, os.path.join(folder_name, "jornada.png"))
-add_paragraph(doc, "Recomendações: Desenvolver funis de conteúdo alinhados à jornada, como blogs para Conscientização e comparativos para Consideração.")
-
-add_subtitle(doc, "Fase 5: CTR por Posição")
-add_paragraph(doc, "Objetivo: Estimar cliques potenciais por posição no ranking para cada palavra-chave.")
-add_paragraph(doc, "Método: Aplicação de taxas de CTR padrão por posição ao volume de busca.")
-if not ctr_export_df.empty:
-    add_paragraph(doc, f"Resultado: Exemplo para '{exemplo_ctr['Keyword']}' (volume {exemplo_ctr[volume_col]}). Veja a estimativa abaixo.")
-    add_image(doc, os.path.join(folder_name, "ctr_posicao.png"))
-    add_paragraph(doc, "Recomendações: Focar em alcançar as primeiras posições para palavras de alto volume.")
-else:
-    add_paragraph(doc, "Resultado: Análise não realizada devido à ausência de dados de volume.")
-
-add_subtitle(doc, "Fase 6: Estratégia por Objetivo com Palavras-Chave")
-add_paragraph(doc, "Objetivo: Associar palavras-chave a estratégias específicas conforme o objetivo selecionado.")
-add_paragraph(doc, "Método: Mapeamento de intenções a objetivos e fusão com estratégias predefinidas.")
-add_paragraph(doc, f"Resultado: Para o objetivo '{objetivo_selecionado}', exemplo: '{estrategia_df.iloc[0]['Palavra-chave']}' (volume {estrategia_df.iloc[0]['Volume']}), Estratégia: '{estrategia_df.iloc[0]['Estratégia']}'.")
-add_paragraph(doc, "Recomendações: Implementar as tipologias sugeridas para maximizar o impacto do objetivo escolhido.")
-
-add_subtitle(doc, "Fase 7: Planejamento de Crescimento")
-add_paragraph(doc, "Objetivo: Projetar o crescimento de tráfego com base em volume atual, meta de crescimento e palavras-chave selecionadas.")
-add_paragraph(doc, "Método: Cálculo de metas com exclusão de termos geográficos e segmentação por cauda.")
-add_paragraph(doc, f"Resultado: Projeção para {meses_planejamento} meses, volume inicial {volume_atual}, crescimento {crescimento_mensal}% ao mês. Veja o gráfico.")
-add_image(doc, os.path.join(folder_name, "crescimento.png"))
-add_paragraph(doc, "Recomendações: Priorizar palavras selecionadas na aba 'Seleção de Palavras' e monitorar o progresso mensal.")
-
-add_subtitle(doc, "Fase 8: Top 100 Palavras por Tipo")
-add_paragraph(doc, "Objetivo: Identificar as 100 melhores palavras-chave por tipo com base no volume de busca.")
-add_paragraph(doc, "Método: Agrupamento por uma coluna de tipo (se disponível) ou clustering automático das palavras-chave.")
-if top_palavras_por_tipo:
-    primeiro_tipo = list(top_palavras_por_tipo.keys())[0]
-    exemplo_df = top_palavras_por_tipo[primeiro_tipo]
-    add_paragraph(doc, f"Resultado: Tipos analisados: {', '.join(top_palavras_por_tipo.keys())}. Exemplo para '{primeiro_tipo}': '{exemplo_df.iloc[0]['Keyword']}' (volume {exemplo_df.iloc[0][volume_col]}).")
-    add_paragraph(doc, "Recomendações: Focar em palavras de alto volume por tipo para campanhas segmentadas.")
-else:
-    add_paragraph(doc, "Resultado: Nenhum tipo identificado devido a dados insuficientes.")
-
-# Adicionar a Fase 8.5 aqui
-add_subtitle(doc, "Fase 8.5: Palavras para Ads Filtradas")
-add_paragraph(doc, "Objetivo: Filtrar palavras-chave adequadas para campanhas de anúncios, excluindo termos negativos listados em 'kw_negativas.docx'.")
-add_paragraph(doc, "Método: Leitura de palavras negativas de um arquivo Word, exclusão de palavras contendo esses termos e separação em duas abas: 'Palavras Filtradas' e 'Palavras Excluídas'.")
-add_paragraph(doc, f"Resultado: {len(palavras_ads_filtradas)} palavras filtradas e {len(palavras_excluidas)} excluídas.")
-add_paragraph(doc, "Recomendações: Usar as palavras filtradas para campanhas de anúncios e revisar as excluídas para ajustes na lista de negativas.")
-
-add_subtitle(doc, "Fase 9: Dashboard Profissional")
-add_paragraph(doc, "Objetivo: Criar um dashboard interativo no Excel para visualização consolidada dos principais insights.")
-add_paragraph(doc, "Método: Geração de tabelas e gráficos (pizza, barras e linhas) com dados de intenções, SERP, jornada, CTR e crescimento.")
-add_paragraph(doc, "Resultado: Dashboard gerado em 'Dashboard.xlsx', contendo resumo geral, distribuições e projeções.")
-add_paragraph(doc, "Recomendações: Utilizar o dashboard para apresentações e monitoramento estratégico.")
-
-add_subtitle(doc, "Conclusão e Recomendações Finais")
-add_paragraph(doc, f"A análise do projeto {project_name} oferece insights estratégicos para otimizar o SEO. Recomendamos: (1) Priorizar palavras de alto volume e baixa concorrência, (2) Implementar tipologias de conteúdo sugeridas, (3) Seguir o planejamento de crescimento para atingir as metas de tráfego, e (4) Monitorar os resultados regularmente com o dashboard gerado.")
-
-doc.save(os.path.join(folder_name, "Relatório Analítico Detalhado.docx"))
-print_status("Relatório Analítico Detalhado.docx gerado com sucesso na pasta " + folder_name)
-
-# Geração do XML
-print_status("Gerando resultados_finais.xml...")
-resultados = {
-    "Projeto": project_name,
-    "Data": now.strftime('%d-%m-%Y %H:%M:%S'),
-    "Objetivo": objective,
-    "Fase1": {
-        "TotalPalavras": len(combined_df),
-        "VolumeMedio": round(combined_df[volume_col].mean(), 2) if volume_col and not combined_df[volume_col].dropna().empty else "N/A"
+# Cada fase declara as fases de que depende, os parâmetros que lê e os
+# arquivos que grava na pasta do projeto. A chave de uma fase é o hash da
+# versão do código, desses parâmetros e das chaves das dependências: mudar
+# `palavras_por_mes` só invalida o planejamento e o que vem depois dele.
+# Com o cache ativo, o resultado de cada fase concluída fica em CACHE_DIR
+# (fase-<nome>-<chave>.pkl, com o caminho e o hash dos arquivos gerados, que
+# são copiados da execução anterior); uma execução que parou no meio retoma a
+# partir da última fase gravada. Fases com
+# "falha_se_none" retornam None quando falham, e esse None não é gravado.
+FASES = {
+    "visao_geral": {
+        "depende_de": [],
+        "parametros": ["planilhas", "arquivos_com_erro", "dedup", "dedup_volume", "dedup_serp", "variacoes", "graficos"],
+        "arquivos": ["Visao Geral de Palavras.xlsx", "combined_df_temp.xlsx", "visao_geral.png"],
     },
-    "Fase2": intent_counts,
-    "Fase3": serp_counts,
-    "Fase4": jornada_counts,
-    "Fase5": {
-        "ExemploCTR": {
-            "Keyword": exemplo_ctr['Keyword'],
-            "Volume": exemplo_ctr[volume_col] if volume_col else "N/A"
-        } if not ctr_export_df.empty else "Nenhum dado"
+    "intents": {"depende_de": ["visao_geral"], "parametros": [], "arquivos": ["Intents.xlsx"]},
+    "serp": {"depende_de": ["visao_geral"], "parametros": [], "arquivos": ["SERP Features.xlsx"]},
+    "jornada": {
+        "depende_de": ["visao_geral"],
+        "parametros": ["graficos"],
+        "arquivos": ["Jornada e Tipologias.xlsx", "jornada.png"],
     },
-    "Fase6": {
-        "ObjetivoSelecionado": objetivo_selecionado,
-        "Exemplo": {
-            "Palavra": estrategia_df.iloc[0]['Palavra-chave'],
-            "Volume": estrategia_df.iloc[0]['Volume'],
-            "Estrategia": estrategia_df.iloc[0]['Estratégia']
-        }
+    "ctr": {"depende_de": ["jornada"], "parametros": ["curva_ctr"], "arquivos": ["CTR por Posicao.xlsx"]},
+    "estrategia": {"depende_de": ["jornada"], "parametros": ["objetivo"], "arquivos": ["Palavras por Estratégia.xlsx"]},
+    "top_palavras": {"depende_de": ["jornada"], "parametros": ["agrupamento"], "arquivos": ["Top 100 Palavras por Tipo.xlsx"]},
+    "ads": {"depende_de": ["jornada"], "parametros": [], "arquivos": ["Palavras para Ads Filtradas.xlsx"]},
+    "entidades": {
+        "depende_de": ["jornada"],
+        "parametros": ["entidades", "graficos"],
+        "arquivos": ["Entidades e Knowledge.xlsx", "Palavras por Entidades.xlsx"],
+    },
+    "planejamento": {
+        "depende_de": ["jornada"],
+        "parametros": ["objetivo", "volume_atual", "crescimento_mensal", "meses_planejamento", "palavras_por_mes",
+                       "cidades", "curva_ctr", "agrupamento", "graficos"],
+        "arquivos": ["Planejamento de Crescimento.xlsx", "crescimento.png"],
+        "falha_se_none": True,
     },
-    "Fase7": {
-        "VolumeAtual": volume_atual,
-        "CrescimentoMensal": crescimento_mensal,
-        "MesesPlanejamento": meses_planejamento
+    "graficos": {
+        "depende_de": ["intents", "serp", "ctr"],
+        "parametros": ["curva_ctr", "graficos"],
+        "arquivos": ["intents.png", "serp_features.png", "ctr_posicao.png"],
     },
-    "Fase8": {
-        "Tipos": {tipo: len(df) for tipo, df in top_palavras_por_tipo.items()}
+    "dashboard": {
+        "depende_de": ["jornada", "intents", "serp", "ctr", "estrategia", "planejamento"],
+        "parametros": ["objetivo", "data", "curva_ctr", "graficos"],
+        "arquivos": ["Dashboard.xlsx"],
     },
-    "Fase8_5": {
-        "PalavrasFiltradas": len(palavras_ads_filtradas),
-        "PalavrasExcluidas": len(palavras_excluidas)
+    "relatorio": {
+        "depende_de": ["visao_geral", "jornada", "graficos", "estrategia", "top_palavras", "ads", "planejamento"],
+        "parametros": ["projeto", "volume_atual", "crescimento_mensal", "meses_planejamento"],
+        "arquivos": ["Relatório Analítico Detalhado.docx"],
     },
-    "Fase9": "Dashboard gerado"
 }
 
-root = dict_to_xml("Resultados", resultados)
-xml_str = ET.tostring(root, encoding='utf-8', method='xml')
+def _versao_codigo():
+    # Qualquer alteração no script invalida todos os checkpoints
+    try:
+        return f"{_hash_arquivo(os.path.abspath(__file__))}-{CACHE_VERSAO}"
+    except (NameError, OSError):
+        return None
 
-try:
-    pretty_xml = minidom.parseString(xml_str).toprettyxml(indent="  ")
-except Exception as e:
-    print_status(f"Erro ao formatar XML: {str(e)}. Salvando versão bruta.")
-    pretty_xml = xml_str.decode('utf-8')
-
-with open(os.path.join(folder_name, "resultados_finais.xml"), "w", encoding="utf-8") as xml_file:
-    xml_file.write(pretty_xml)
-print_status("resultados_finais.xml gerado com sucesso na pasta " + folder_name)
-print_status("Obrigado por usar o script do Consultor SEO Anderson Melo!")
+VERSAO_CODIGO = _versao_codigo()
+
+def parametros_das_fases(contexto):
+    """Valores que entram nas chaves das fases, pelos nomes usados em FASES."""
+    def hash_opcional(caminho):
+        return hash_conteudo_arquivo(caminho) if os.path.exists(caminho) else None
+    return {
+        "projeto": contexto.projeto,
+        "objetivo": contexto.objetivo,
+        "data": contexto.data,  # impressa no cabeçalho do dashboard
+        "volume_atual": contexto.volume_atual,
+        "crescimento_mensal": contexto.crescimento_mensal,
+        "meses_planejamento": contexto.meses_planejamento,
+        "palavras_por_mes": contexto.palavras_por_mes,
+        "planilhas": [(nome, hash_conteudo_arquivo(os.path.join(contexto.pasta_entrada, nome))) for nome in contexto.planilhas_entrada()],
+        "cidades": hash_opcional(contexto.caminho_cidades),
+        "curva_ctr": hash_opcional(contexto.caminho_curva_ctr),
+        "entidades": hash_opcional(contexto.caminho_entidades),
+        "arquivos_com_erro": POLITICA_ARQUIVOS_COM_ERRO,
+        "dedup": DEDUPLICAR,
+        "dedup_volume": REGRA_DEDUP_VOLUME,
+        "dedup_serp": REGRA_DEDUP_SERP,
+        "variacoes": AGRUPAR_VARIACOES,
+        "agrupamento": [AGRUPAMENTO_SEMANTICO, AGRUPAMENTO_SEGUNDOS, AGRUPAMENTO_MEMORIA_MB],
+        "graficos": GERAR_GRAFICOS,
+    }
+
+def _gravar_checkpoint(caminho, pasta, arquivos, valor):
+    # Os arquivos gerados ficam na pasta do projeto; o checkpoint guarda só o
+    # caminho e o hash do conteúdo de cada um
+    conteudo = {"valor": valor, "arquivos": {}}
+    for nome in arquivos:
+        origem = os.path.abspath(os.path.join(pasta, nome))
+        if os.path.exists(origem):
+            conteudo["arquivos"][nome] = (origem, _hash_arquivo(origem))
+    try:
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        _gravar_atomico(caminho, lambda destino: _gravar_binario(destino, lambda f: pickle.dump(conteudo, f, protocol=pickle.HIGHEST_PROTOCOL)))
+    except Exception as e:
+        print_status(f"Aviso: não foi possível gravar o checkpoint {os.path.basename(caminho)}: {e}")
+
+class _ComCheckpoint:
+    """Executa uma função de planilha e grava o checkpoint da fase ao terminar.
+
+    É um objeto (e não uma closure) para poder ser enviado aos workers.
+    """
+
+    def __init__(self, funcao, caminho, arquivos):
+        self.funcao = funcao
+        self.caminho = caminho
+        self.arquivos = arquivos
+
+    def __call__(self, pasta, *args):
+        valor = self.funcao(pasta, *args)
+        _gravar_checkpoint(self.caminho, pasta, self.arquivos, valor)
+        return valor
+
+class GrafoFases:
+    """Chaves de conteúdo e checkpoints das fases de uma execução (ver FASES)."""
+
+    def __init__(self, parametros, pasta, ativo=True):
+        self.parametros = parametros
+        self.pasta = pasta
+        self.ativo = ativo and VERSAO_CODIGO is not None
+        self.chaves = {}
+        self.reaproveitadas = []
+
+    def chave(self, fase):
+        if fase not in self.chaves:
+            declaracao = FASES[fase]
+            conteudo = json.dumps({
+                "fase": fase,
+                "codigo": VERSAO_CODIGO,
+                "parametros": {nome: self.parametros[nome] for nome in declaracao["parametros"]},
+                "depende_de": {dependencia: self.chave(dependencia) for dependencia in declaracao["depende_de"]},
+            }, sort_keys=True, default=str)
+            self.chaves[fase] = hashlib.blake2b(conteudo.encode("utf-8"), digest_size=20).hexdigest()
+        return self.chaves[fase]
+
+    def _caminho(self, fase):
+        return os.path.join(CACHE_DIR, f"fase-{fase}-{self.chave(fase)}.pkl")
+
+    def pendente(self, fase):
+        return not (self.ativo and os.path.exists(self._caminho(fase)))
+
+    def restaurar(self, fase):
+        """Retorna (True, valor) e copia os arquivos da fase para a pasta, se houver checkpoint.
+
+        O checkpoint só vale enquanto os arquivos que ele aponta existirem com
+        o mesmo conteúdo; senão a fase é executada de novo.
+        """
+        if self.pendente(fase):
+            return False, None
+        caminho = self._caminho(fase)
+        try:
+            with open(caminho, "rb") as arquivo:
+                conteudo = pickle.load(arquivo)
+            arquivos = {nome: origem for nome, (origem, hash_esperado) in conteudo["arquivos"].items()
+                        if os.path.exists(origem) and _hash_arquivo(origem) == hash_esperado}
+        except Exception as e:
+            print_status(f"Aviso: checkpoint da fase '{fase}' inválido ({e}); executando de novo.")
+            return False, None
+        if len(arquivos) < len(conteudo["arquivos"]):
+            print_status(f"Aviso: arquivos do checkpoint da fase '{fase}' foram removidos ou alterados; executando de novo.")
+            return False, None
+        medicao = MedicaoDesempenho(f"{fase} (checkpoint)", tipo="checkpoint")
+        for nome, origem in arquivos.items():
+            destino = os.path.join(self.pasta, nome)
+            if os.path.abspath(destino) != origem:
+                shutil.copyfile(origem, destino)
+            registrar_saida(destino)
+        os.utime(caminho)
+        medicao.finalizar()
+        self.reaproveitadas.append(fase)
+        print_status(f"Fase '{fase}' reaproveitada do checkpoint ({len(conteudo['arquivos'])} arquivo(s)).")
+        return True, conteudo["valor"]
+
+    def executar(self, fase, funcao, *args):
+        encontrado, valor = self.restaurar(fase)
+        if encontrado:
+            return valor
+        valor = funcao(*args)
+        if self.ativo and not (valor is None and FASES[fase].get("falha_se_none")):
+            _gravar_checkpoint(self._caminho(fase), self.pasta, FASES[fase]["arquivos"], valor)
+        return valor
+
+    def submeter(self, agendador, fase, funcao, *args, descricao=None, conclusao=None):
+        """Como `AgendadorFases.submeter`, mas usa o checkpoint quando existe."""
+        encontrado, valor = self.restaurar(fase)
+        if encontrado:
+            agendador.registrar(fase, valor)
+            return
+        if self.ativo:
+            funcao = _ComCheckpoint(funcao, self._caminho(fase), FASES[fase]["arquivos"])
+        agendador.submeter(fase, funcao, *args, descricao=descricao, conclusao=conclusao)
+
+# =============================================================================
+# Pipeline de Execução
+# =============================================================================
+
+class Pipeline:
+    """Executa todas as fases de um projeto a partir de um `ContextoExecucao`.
+
+    Uma mesma instância pode rodar vários contextos em sequência; com
+    `recursos` informado, cidades, curva de CTR e entidades não são relidos
+    a cada projeto. `limpar_cache` (padrão: CACHE_LIMPAR) esvazia o cache a
+    cada `executar`. `executar` devolve o mesmo resumo gravado no XML.
+    """
+
+    def __init__(self, recursos=None, workers=None, limpar_cache=None):
+        self.recursos = recursos
+        self.workers = workers
+        self.limpar_cache = limpar_cache
+
+    def executar(self, contexto):
+        folder_name = contexto.pasta
+        DESEMPENHO.clear()
+        contexto.verificar_arquivos()
+        os.makedirs(folder_name, exist_ok=True)
+        print_status(f"Pasta de saída criada: {folder_name}")
+        if MEDIR_MEMORIA and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        print_status(f"Usando a pasta como fonte das planilhas: {contexto.pasta_entrada}")
+        preparar_cache_entrada(self.limpar_cache)
+        recursos = self.recursos or RecursosCompartilhados.do_contexto(contexto)
+        # Sem cache não há checkpoints, então as entradas não precisam ser hasheadas
+        grafo = GrafoFases(parametros_das_fases(contexto) if CACHE_ATIVO else {}, folder_name, ativo=CACHE_ATIVO)
+
+        combined_df, volume_col, palavras_normalizadas, matriz_serp, resumo_fase1 = grafo.executar("visao_geral", executar_fase_visao_geral, contexto)
+
+        combined_df_fase1 = combined_df
+        combined_df, jornada_counts = grafo.executar("jornada", executar_fase_jornada, contexto, combined_df, volume_col, matriz_serp)
+
+        # Fases 2, 3, 5, 6, 8, 8.5 e 8.7 – Planilhas independentes (em paralelo).
+        # Tudo é compartilhado antes da primeira submissão, para que um único
+        # pool seja criado.
+        textos_normalizados = palavras_normalizadas.textos(combined_df)
+        armazem_tfidf = None
+        if AGRUPAMENTO_SEMANTICO and (grafo.pendente("top_palavras") or grafo.pendente("planejamento")):
+            armazem_tfidf = ArmazemTfidf(textos_normalizados, grafia=palavras_normalizadas.grafia)
+        agendador = AgendadorFases(self.workers or WORKERS_RELATORIOS)
+        print_status(f"Planilhas independentes serão geradas com {agendador.workers} worker(s).")
+        ref_df_fase1 = agendador.compartilhar("combined_df_fase1", combined_df_fase1)
+        ref_serp = agendador.compartilhar("matriz_serp", matriz_serp)
+        ref_df = agendador.compartilhar("combined_df", combined_df)
+        ref_textos = agendador.compartilhar("textos_normalizados", textos_normalizados)
+        ref_tfidf = agendador.compartilhar("armazem_tfidf", armazem_tfidf)
+        ref_entidades = agendador.compartilhar("classificador_entidades", recursos.classificador_entidades)
+        grafo.submeter(agendador, "intents", criar_planilha_intents, folder_name, ref_df_fase1, volume_col)
+        grafo.submeter(agendador, "serp", criar_planilha_serp_features, folder_name, ref_df_fase1, volume_col, ref_serp)
+        grafo.submeter(agendador, "ctr", criar_planilha_ctr_por_posicao, folder_name, ref_df, volume_col, recursos.ctr_rates)
+        grafo.submeter(
+            agendador, "estrategia", criar_planilha_palavras_por_estrategia, folder_name, contexto.objetivo, ref_df,
+            descricao="Fase 6: Gerando estratégias por objetivo com palavras-chave",
+            conclusao="Fase 6 concluída: Planilha 'Palavras por Estratégia.xlsx' gerada!",
+        )
+        grafo.submeter(
+            agendador, "top_palavras", criar_planilha_top_palavras_por_tipo, folder_name, ref_df, ref_tfidf,
+            descricao="Fase 8: Gerando top 100 palavras por tipo",
+            conclusao="Fase 8 concluída: Planilha 'Top 100 Palavras por Tipo.xlsx' gerada!",
+        )
+        grafo.submeter(
+            agendador, "ads", criar_planilha_palavras_para_ads_filtradas, folder_name, ref_df, ref_textos,
+            descricao="Fase 8.5: Gerando palavras para Ads Filtradas",
+            conclusao="Fase 8.5 concluída: Planilha 'Palavras para Ads Filtradas.xlsx' gerada!",
+        )
+        grafo.submeter(
+            agendador, "entidades", criar_relatorios_de_entidades, folder_name, ref_df, volume_col, ref_entidades, ref_textos,
+            descricao="Fase 8.7: Gerando Entidades e Knowledge",
+            conclusao="Fase 8.7 concluída: Planilhas 'Entidades e Knowledge.xlsx' e 'Palavras por Entidades.xlsx' geradas!",
+        )
+
+        result = grafo.executar("planejamento", executar_fase_planejamento, contexto, combined_df, recursos, armazem_tfidf, palavras_normalizadas)
+        if result is None:
+            print_status("Erro na Fase 7. Abortando execução.")
+            agendador.cancelar()
+            raise ValueError("Fase 7 falhou devido à ausência de coluna de volume ou outro erro.")
+        calculo_df, meses = result[0], result[7]
+
+        resultados_fases = agendador.aguardar()
+        intent_counts = resultados_fases["intents"]
+        serp_counts = resultados_fases["serp"]
+        ctr_export_df = resultados_fases["ctr"]
+        estrategia_df, objetivo_selecionado = resultados_fases["estrategia"]
+        palavras_ads_filtradas, palavras_excluidas = resultados_fases["ads"]
+        top_serp, exemplo_ctr = grafo.executar("graficos", gerar_graficos_fases_paralelas, contexto, intent_counts, serp_counts, ctr_export_df, recursos.ctr_rates)
+
+        grafo.executar("dashboard", executar_fase_dashboard, contexto, combined_df, volume_col, intent_counts, serp_counts, jornada_counts, ctr_export_df, estrategia_df, calculo_df, meses, recursos.ctr_rates)
+
+        dados = {
+            "combined_df": combined_df,
+            "volume_col": volume_col,
+            "resumo_fase1": resumo_fase1,
+            "intent_counts": intent_counts,
+            "serp_counts": serp_counts,
+            "top_serp": top_serp,
+            "jornada_counts": jornada_counts,
+            "exemplo_ctr": exemplo_ctr,
+            "estrategia_df": estrategia_df,
+            "objetivo_selecionado": objetivo_selecionado,
+            "top_palavras_por_tipo": resultados_fases["top_palavras"],
+            "palavras_ads_filtradas": palavras_ads_filtradas,
+            "palavras_excluidas": palavras_excluidas,
+            "entidade_counts": resultados_fases["entidades"],
+        }
+        if GERAR_RELATORIO:
+            grafo.executar("relatorio", gerar_relatorio_detalhado, contexto, dados)
+        if grafo.reaproveitadas:
+            print_status(f"{len(grafo.reaproveitadas)} fase(s) reaproveitadas de checkpoints: {', '.join(grafo.reaproveitadas)}")
+
+        print_status("Gerando resultados_finais.xml...")
+        resultados = montar_resultados(contexto, dados)
+        salvar_resultados_xml(os.path.join(folder_name, "resultados_finais.xml"), resultados)
+        print_status("resultados_finais.xml gerado com sucesso na pasta " + folder_name)
+        salvar_desempenho_json(os.path.join(folder_name, "desempenho.json"), contexto.projeto, contexto.data)
+        print_status("desempenho.json gerado com sucesso na pasta " + folder_name)
+        return resultados
+
+# =============================================================================
+# Execução em Lote (vários projetos)
+# =============================================================================
+
+# O manifesto é uma lista de projetos ou {"padrao": {...}, "projetos": [...]}.
+# Cada projeto só pode trazer os parâmetros abaixo; as opções de execução
+# (workers, cache, dedup...) valem para o lote inteiro e ficam em "padrao"
+# ou na linha de comando, que também serve de padrão para os projetos.
+PARAMETROS_PROJETO = ["projeto", "usar_gpt", "objetivo", "volume_atual", "crescimento_mensal", "meses_planejamento",
+                      "palavras_por_mes", "entrada", "saida", "curva_ctr", "entidades"]
+
+def ler_manifesto_lote(caminho, padrao_extra=None):
+    """Lê o manifesto e retorna (padrão do lote, parâmetros completos de cada projeto).
+
+    Falha antes de qualquer processamento se algum projeto estiver incompleto.
+    """
+    dados = _ler_arquivo_dados(caminho)
+    if isinstance(dados, list):
+        dados = {"projetos": dados}
+    if not isinstance(dados, dict) or not isinstance(dados.get("projetos"), list) or set(dados) - {"padrao", "projetos"}:
+        raise ValueError(f"O manifesto '{caminho}' deve ser uma lista de projetos ou conter 'projetos' (e opcionalmente 'padrao')")
+    if not dados["projetos"]:
+        raise ValueError(f"O manifesto '{caminho}' não tem nenhum projeto")
+    padrao = _validar_parametros(dados.get("padrao") or {}, f"'padrao' do manifesto '{caminho}'")
+    padrao.update(padrao_extra or {})
+    projetos = []
+    destinos = set()
+    for numero, dados_projeto in enumerate(dados["projetos"], start=1):
+        origem = f"projeto {numero} do manifesto '{caminho}'"
+        parametros = _validar_parametros(dados_projeto, origem)
+        exclusivas_do_lote = sorted(set(parametros) - set(PARAMETROS_PROJETO))
+        if exclusivas_do_lote:
+            raise ValueError(f"Opções que valem para o lote inteiro no {origem}: {', '.join(exclusivas_do_lote)}")
+        parametros = {**{chave: valor for chave, valor in padrao.items() if chave in PARAMETROS_PROJETO}, **parametros}
+        ausentes = [chave for chave in PARAMETROS_OBRIGATORIOS if chave not in parametros]
+        if ausentes:
+            raise ValueError(f"Parâmetros obrigatórios ausentes no {origem}: {', '.join(ausentes)}")
+        destino = (parametros["projeto"].strip(), os.path.abspath(parametros.get("saida", os.getcwd())))
+        if destino in destinos:
+            raise ValueError(f"Projeto '{destino[0]}' repetido com a mesma pasta de saída no manifesto '{caminho}'")
+        destinos.add(destino)
+        projetos.append(parametros)
+    return padrao, projetos
+
+# Recursos de cada combinação (cidades, curva de CTR, entidades), carregados
+# no processo principal antes de abrir o pool; os workers herdam por `fork`.
+_RECURSOS_LOTE = {}
+
+def _chave_recursos(contexto):
+    return (contexto.caminho_cidades, contexto.caminho_curva_ctr, contexto.caminho_entidades)
+
+def _executar_projeto_lote(contexto):
+    """Roda um projeto do lote; um erro vira uma linha com Status "erro" no resumo."""
+    inicio = time.perf_counter()
+    linha = {"Projeto": contexto.projeto, "Status": "ok", "Erro": "", "Pasta": contexto.pasta, "Palavras": None, "Tempo_s": None}
+    try:
+        recursos = _RECURSOS_LOTE[_chave_recursos(contexto)]
+        if isinstance(recursos, Exception):
+            raise recursos
+        # O cache já foi preparado (e limpo, se pedido) uma vez para o lote
+        resultados = Pipeline(recursos=recursos, workers=1, limpar_cache=False).executar(contexto)
+        linha["Palavras"] = resultados["Fase1"]["TotalPalavras"]
+        for registro in resultados["Desempenho"]["Etapa"]:
+            if registro["Tipo"] == "fase":
+                linha[f"{registro['Etapa']} (s)"] = registro["TempoParede_s"]
+    except Exception as e:
+        print_status(f"Erro no projeto '{contexto.projeto}': {str(e)}")
+        linha.update(Status="erro", Erro=str(e))
+    linha["Tempo_s"] = round(time.perf_counter() - inicio, 3)
+    return linha
+
+def executar_lote(caminho_manifesto, configuracao=None):
+    """Executa todos os projetos do manifesto e grava 'Resumo do Lote.xlsx'.
+
+    O resumo vai para a subpasta "Resumos de Lote" da saída, e não para a
+    própria saída, que por padrão é também a pasta de entrada dos exports.
+
+    Cidades, curva de CTR, entidades e negativas são carregadas uma única vez
+    por combinação de arquivos, assim como as bibliotecas pesadas; `workers` define quantos projetos rodam ao
+    mesmo tempo. Retorna o DataFrame do resumo.
+    """
+    configuracao = configuracao or {}
+    padrao_linha_comando = {chave: valor for chave, valor in configuracao.items() if chave in PARAMETROS_EXECUCAO}
+    padrao, projetos = ler_manifesto_lote(caminho_manifesto, padrao_linha_comando)
+    aplicar_opcoes_execucao(padrao)
+    agora = datetime.now()
+    contextos = [
+        ContextoExecucao(
+            parametros["projeto"], parametros["objetivo"], parametros["volume_atual"], parametros["crescimento_mensal"],
+            parametros["meses_planejamento"], parametros["palavras_por_mes"], pasta_entrada=parametros.get("entrada"),
+            pasta_saida=parametros.get("saida"), usar_gpt=parametros.get("usar_gpt", False),
+            curva_ctr=parametros.get("curva_ctr"), entidades=parametros.get("entidades"), agora=agora,
+            # O paralelismo fica entre projetos; dentro de cada um tudo roda em sequência
+            workers_leitura=1,
+        )
+        for parametros in projetos
+    ]
+    print_status(f"Lote '{caminho_manifesto}': {len(contextos)} projeto(s).")
+    preparar_cache_entrada()
+
+    _RECURSOS_LOTE.clear()
+    for contexto in contextos:
+        chave = _chave_recursos(contexto)
+        if chave not in _RECURSOS_LOTE:
+            try:
+                _RECURSOS_LOTE[chave] = RecursosCompartilhados.do_contexto(contexto)
+            except Exception as e:
+                print_status(f"Erro ao carregar os arquivos auxiliares de '{contexto.pasta_entrada}': {str(e)}")
+                _RECURSOS_LOTE[chave] = e
+
+    # Importadas antes do fork para que cada worker não as carregue de novo
+    if GERAR_GRAFICOS:
+        import matplotlib.pyplot
+    if GERAR_RELATORIO:
+        import docx
+    if AGRUPAMENTO_SEMANTICO:
+        import sklearn.cluster, sklearn.feature_extraction.text, sklearn.metrics
+
+    inicio = time.perf_counter()
+    workers = min(WORKERS_RELATORIOS, len(contextos))
+    executor = _criar_pool(workers)
+    print_status(f"Projetos serão processados com {workers if executor else 1} worker(s).")
+    if executor:
+        tarefas = [executor.submit(_executar_projeto_lote, contexto) for contexto in contextos]
+        linhas = []
+        for contexto, tarefa in zip(contextos, tarefas):
+            try:
+                linhas.append(tarefa.result())
+            except Exception as e:
+                # Um worker que morre (falta de memória, sinal) derruba só o próprio projeto
+                print_status(f"Erro no projeto '{contexto.projeto}': {str(e)}")
+                linhas.append({"Projeto": contexto.projeto, "Status": "erro", "Erro": str(e) or type(e).__name__, "Pasta": contexto.pasta})
+        executor.shutdown()
+    else:
+        linhas = [_executar_projeto_lote(contexto) for contexto in contextos]
+
+    resumo_df = pd.DataFrame(linhas)
+    pasta_resumo = os.path.join(os.path.abspath(padrao.get("saida", os.getcwd())), "Resumos de Lote")
+    os.makedirs(pasta_resumo, exist_ok=True)
+    caminho_resumo = os.path.join(pasta_resumo, f"Resumo do Lote {agora.strftime('%d-%m-%Y')} {agora.strftime('%H')} horas {agora.strftime('%M')} minutos {agora.strftime('%S')} segundos.xlsx")
+    wb = Workbook(write_only=True)
+    escrever_aba(wb, "Resumo do Lote", resumo_df, None)
+    wb.save(caminho_resumo)
+    concluidos = int((resumo_df["Status"] == "ok").sum())
+    print_status(f"Lote concluído em {_formatar_duracao(time.perf_counter() - inicio)}: {concluidos} de {len(resumo_df)} projeto(s) sem erro. "
+                 f"Resumo em {caminho_resumo}")
+    return resumo_df
+
+# Do primeiro import até aqui: o que toda execução paga antes da primeira pergunta.
+TEMPO_IMPORTACAO = round(time.perf_counter() - _INICIO_IMPORTACAO, 3)
+
+def main(argumentos=None):
+    print_status("Bem-vindo ao Script de Análise de Palavras-Chave para SEO!")
+    configuracao = carregar_configuracao(argumentos)
+    if configuracao.get("lote"):
+        executar_lote(configuracao["lote"], configuracao)
+        print_status("Obrigado por usar o script do Consultor SEO Anderson Melo!")
+        return
+    aplicar_opcoes_execucao(configuracao)
+    contexto = ContextoExecucao.da_configuracao(configuracao)
+    Pipeline().executar(contexto)
+    print_status("Obrigado por usar o script do Consultor SEO Anderson Melo!")
+
+if __name__ == "__main__":
+    main()
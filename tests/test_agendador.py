@@ -0,0 +1,27 @@
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+def somar_devagar(a, b):
+    time.sleep(0.2)
+    return a + b
+
+
+def test_compartilhar_depois_do_pool_nao_passa_do_limite_de_workers():
+    agendador = script.AgendadorFases(2)
+    ref_a = agendador.compartilhar("a", 1)
+    agendador.submeter("primeira", somar_devagar, ref_a, 1)
+    agendador.submeter("segunda", somar_devagar, ref_a, 2)
+    ref_b = agendador.compartilhar("b", 10)
+    agendador.submeter("terceira", somar_devagar, ref_a, ref_b)
+    if agendador.paralelo:
+        assert len(multiprocessing.active_children()) <= agendador.workers
+
+    assert agendador.aguardar() == {"primeira": 2, "segunda": 3, "terceira": 11}
+    assert "a" not in script._COMPARTILHADOS and "b" not in script._COMPARTILHADOS
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+NOMES = [f"termo{i}" for i in range(200)]
+
+
+def matriz(linhas):
+    return sparse.random(linhas, len(NOMES), density=0.02, format="csr", random_state=1)
+
+
+def test_prazo_minimo_interrompe_o_kmeans_e_devolve_rotulos(caplog):
+    X = matriz(2000)
+    rotulos, termos = script.MotorAgrupamento(segundos=0).agrupar(X, NOMES, n_grupos=4)
+    assert len(rotulos) == X.shape[0]
+    assert set(rotulos) <= set(range(4))
+    assert len(termos) == 4
+    assert "após 1 inicialização" in caplog.text
+
+
+def test_prazo_minimo_interrompe_o_minibatch_e_devolve_rotulos(caplog):
+    X = matriz(script.LIMITE_KMEANS_COMPLETO + 5000)
+    rotulos, _ = script.MotorAgrupamento(segundos=0).agrupar(X, NOMES, n_grupos=4)
+    assert len(rotulos) == X.shape[0]
+    assert set(rotulos) <= set(range(4))
+    assert "usando o modelo treinado até aqui" in caplog.text
+
+
+def test_amostra_e_bloco_cabem_no_orcamento_de_memoria():
+    X = matriz(200000)
+    motor = script.MotorAgrupamento(memoria_mb=8)
+    linhas_treino, linhas_bloco = motor._dimensionar(X, 10)
+    por_linha = 12 * X.nnz / X.shape[0] + 8 + 8 * 10
+    fixo = 4 * 8 * 10 * X.shape[1] + motor.TAMANHO_LOTE * por_linha
+    assert linhas_treino < X.shape[0]
+    assert fixo + max(linhas_treino, linhas_bloco) * por_linha <= 8 * 1024 * 1024
@@ -0,0 +1,39 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+# Intents depende da Visão Geral, então a chave usa os parâmetros dela
+PARAMETROS = {nome: None for nome in script.FASES["visao_geral"]["parametros"]}
+
+
+def gerar_intents(pasta):
+    with open(os.path.join(pasta, "Intents.xlsx"), "wb") as arquivo:
+        arquivo.write(b"planilha")
+    return {"Informational": 3}
+
+
+def test_checkpoint_guarda_hash_e_copia_o_arquivo_da_execucao_anterior(tmp_path, monkeypatch):
+    monkeypatch.setattr(script, "CACHE_DIR", str(tmp_path / "cache"))
+    primeira, segunda, terceira = (tmp_path / nome for nome in ("primeira", "segunda", "terceira"))
+    for pasta in (primeira, segunda, terceira):
+        pasta.mkdir()
+
+    grafo = script.GrafoFases(PARAMETROS, str(primeira))
+    assert grafo.executar("intents", gerar_intents, str(primeira)) == {"Informational": 3}
+    with open(grafo._caminho("intents"), "rb") as arquivo:
+        assert b"planilha" not in arquivo.read()
+
+    grafo = script.GrafoFases(PARAMETROS, str(segunda))
+    assert grafo.restaurar("intents") == (True, {"Informational": 3})
+    assert (segunda / "Intents.xlsx").read_bytes() == b"planilha"
+
+    (primeira / "Intents.xlsx").write_bytes(b"alterada")
+    with open(grafo._caminho("intents"), "rb") as arquivo:
+        origem, _ = pickle.load(arquivo)["arquivos"]["Intents.xlsx"]
+    assert origem == str(primeira / "Intents.xlsx")
+    assert script.GrafoFases(PARAMETROS, str(terceira)).restaurar("intents") == (False, None)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+def test_maiusculas_e_espacos_sao_unidos_e_acentos_nao():
+    df = pd.DataFrame({"Keyword": ["Tênis  Corrida", "tênis corrida", "tenis corrida"], "Volume": [10, 30, 20]})
+    resultado, mescladas = script.deduplicar_palavras(df, "Volume")
+    assert mescladas == 1
+    assert resultado["Keyword"].tolist() == ["Tênis  Corrida", "tenis corrida"]
+    assert resultado["Volume"].tolist() == [30, 20]
+
+
+def test_sem_dedup_desliga_e_a_proxima_execucao_volta_ao_padrao():
+    try:
+        script.aplicar_opcoes_execucao({"sem_dedup": True})
+        assert not script.DEDUPLICAR
+        script.aplicar_opcoes_execucao({})
+        assert script.DEDUPLICAR
+    finally:
+        script.aplicar_opcoes_execucao({})
@@ -0,0 +1,45 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+def classificar(entidades, keywords):
+    textos = [" ".join(script.normalizar_texto(k).split()) for k in keywords]
+    posicoes = script.ClassificadorEntidades(entidades).classificar(textos)
+    return {keywords[i]: entidade for entidade, linhas in posicoes.items() for i in linhas}
+
+
+def test_primeira_entidade_com_termo_contido_vence():
+    entidades = {"Marca": ["nike"], "Cidade": ["são paulo", "rio"], "Esporte": ["corrida", "rio de janeiro"], "Other": []}
+    resultado = classificar(entidades, ["tenis nike sao paulo", "corrida rio de janeiro", "maratona", "Corrida em São Paulo"])
+    assert resultado == {
+        "tenis nike sao paulo": "Marca",
+        "corrida rio de janeiro": "Cidade",  # "rio" é prefixo de "rio de janeiro" e tem prioridade
+        "maratona": "Other",
+        "Corrida em São Paulo": "Cidade",
+    }
+
+
+def test_termos_sobrepostos_e_fronteira_entre_palavras():
+    entidades = {"Date": ["ano"], "Other": [], "Person": ["piano", "autor"]}
+    resultado = classificar(entidades, ["aula de piano", "pian", "o autor", "autores do ano"])
+    # "ano" está dentro de "piano"; entidades depois de "Other" também são atribuídas
+    assert resultado == {"aula de piano": "Date", "pian": "Other", "o autor": "Person", "autores do ano": "Date"}
+
+
+def test_dicionario_padrao_igual_a_busca_termo_a_termo():
+    keywords = ["melhor filme do ano", "rua augusta", "time de futebol", "app de música", "receita de bolo", "ceo da empresa"]
+    classificador = script.ClassificadorEntidades(script.ENTIDADES)
+    textos = [" ".join(script.normalizar_texto(k).split()) for k in keywords]
+    esperado = {}
+    for keyword, texto in zip(keywords, textos):
+        esperado[keyword] = next(
+            (entidade for entidade, termos in script.ENTIDADES.items()
+             if any(" ".join(script.normalizar_texto(t).split()) in texto for t in termos)),
+            script.ENTIDADE_PADRAO,
+        )
+    posicoes = classificador.classificar(textos)
+    assert {keywords[i]: entidade for entidade, linhas in posicoes.items() for i in linhas} == esperado
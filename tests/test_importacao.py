@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Orçamento de importação do script (tempo acumulado do `-X importtime`, que
+# inclui pandas, numpy e openpyxl); hoje fica perto de 0,6 s.
+LIMITE_IMPORTACAO_S = 2.0
+
+# Importadas só nas funções que as usam. O pandas 3 carrega o pyarrow para as
+# colunas de texto, então o que se verifica é o pyarrow.feather do cache.
+LAZY = ("matplotlib", "sklearn", "docx", "scipy", "pyarrow.feather")
+
+CODIGO = f"""
+import json, sys
+import script
+print(json.dumps(sorted(m for m in {LAZY!r} if m in sys.modules)))
+"""
+
+
+def tempo_acumulado_s(stderr, modulo):
+    # Linhas do -X importtime: "import time: <próprio> | <acumulado> | <módulo>"
+    for linha in stderr.splitlines():
+        partes = linha.split("|")
+        if linha.startswith("import time:") and len(partes) == 3 and partes[2].strip() == modulo:
+            return int(partes[1]) / 1e6
+    raise AssertionError(f"{modulo} não aparece na saída do -X importtime")
+
+
+def test_importar_script_nao_carrega_bibliotecas_pesadas():
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CODIGO], cwd=RAIZ, capture_output=True, text=True, timeout=120,
+    )
+
+    assert resultado.returncode == 0, resultado.stderr
+    assert json.loads(resultado.stdout.strip().splitlines()[-1]) == []
+    assert tempo_acumulado_s(resultado.stderr, "script") < LIMITE_IMPORTACAO_S
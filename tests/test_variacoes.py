@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import script
+
+
+def agrupar(keywords):
+    df = pd.DataFrame({"Keyword": keywords, "Volume": range(len(keywords) * 10, 0, -10)})
+    _, canonica, _ = script.agrupar_variacoes(df, "Volume", script.PalavrasNormalizadas(df["Keyword"]))
+    return dict(zip(df["Keyword"], canonica))
+
+
+def test_plural_acento_e_ordem_sao_variacoes():
+    grupos = agrupar(["tenis de corrida", "tênis corrida", "corrida tenis", "sapato social", "sapatos sociais"])
+    assert grupos["tênis corrida"] == grupos["corrida tenis"] == "tenis de corrida"
+    assert grupos["sapatos sociais"] == "sapato social"
+
+
+def test_erro_de_digitacao_e_variacao():
+    grupos = agrupar(["tenis de corrida", "sapato social", "bolo de cenoura", "tenis de corida", "sapato sociall", "bolo de cenora"])
+    assert grupos["tenis de corida"] == "tenis de corrida"
+    assert grupos["sapato sociall"] == "sapato social"
+    assert grupos["bolo de cenora"] == "bolo de cenoura"
+
+
+def test_palavras_distintas_nao_sao_agrupadas():
+    keywords = [
+        "iphone 15 pro max", "iphone 14 pro max", "dentista 24 horas", "dentista 24 horas sp",
+        "curso de marketing digital online", "curso de marketing digital",
+        "melhor notebook para programação", "notebook para programação", "bolo", "bola",
+    ]
+    grupos = agrupar(keywords)
+    assert all(grupos[keyword] == keyword for keyword in keywords)
+
+
+def test_canonica_mantem_o_proprio_volume():
+    df = pd.DataFrame({"Keyword": ["tenis de corrida", "tenis de corida", "tênis corrida"], "Volume": [100, 50, 55]})
+    canonicos_df, _, variacoes_df = script.agrupar_variacoes(df, "Volume", script.PalavrasNormalizadas(df["Keyword"]))
+    assert canonicos_df["Volume"].tolist() == [100]
+    assert set(variacoes_df["Volume do Grupo"]) == {205}
+
+
+def test_linhas_fora_das_palavras_normalizadas_dao_keyerror():
+    palavras = script.PalavrasNormalizadas(pd.Series(["tenis de corrida", "sapato social"]))
+    assert palavras.textos(pd.DataFrame(index=[1])).tolist() == ["sapato social"]
+    with pytest.raises(KeyError):
+        palavras.textos(pd.DataFrame(index=[0, 7]))